@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Load job outputs into a DuckDB database as the sources of dbt/models/experiments.
+
+Reads:
+- <silver>/int_experiment_exposure_validation/dt=YYYY-MM-DD
+- <silver>/int_experiment_exposures_deduped/dt=YYYY-MM-DD
+- <raw>/fact_event/dt=YYYY-MM-DD
+
+Writes (schema main_silver of --db, replacing the seeds of the local demo):
+- int_experiment_exposure_validation
+- int_experiment_exposures_deduped
+- stg_conversion_events (user_id, event_ts, event_name, revenue from fact_event)
+
+Used by run_scale_ladder.py so the dbt models run on generated data instead of the seeds.
+"""
+
+import argparse
+
+import duckdb
+
+SCHEMA = "main_silver"
+
+
+def parse_args() -> argparse.Namespace:
+    p = argparse.ArgumentParser()
+    p.add_argument("--dt", required=True, help="Partition date, e.g. 2026-02-01")
+    p.add_argument("--db", required=True, help="DuckDB database file used by the dbt profile")
+    p.add_argument("--raw", dest="raw_path", default="data/raw", help="Base raw path (default: data/raw)")
+    p.add_argument("--silver", dest="silver_path", default="data/silver", help="Base silver path (default: data/silver)")
+    return p.parse_args()
+
+
+def load_sources(con: duckdb.DuckDBPyConnection, dt: str, raw_base: str, silver_base: str) -> dict:
+    """Create the source tables; returns {table: rows}."""
+    tables = {
+        "int_experiment_exposure_validation": f"""
+            select * from read_parquet(
+                '{silver_base}/int_experiment_exposure_validation/dt={dt}/**/*.parquet', hive_partitioning = false
+            )
+        """,
+        "int_experiment_exposures_deduped": f"""
+            select
+                experiment_id
+                , user_id
+                , variant_id
+                , exposure_time_utc as first_exposure_at
+            from read_parquet(
+                '{silver_base}/int_experiment_exposures_deduped/dt={dt}/**/*.parquet', hive_partitioning = false
+            )
+        """,
+        "stg_conversion_events": f"""
+            select
+                user_id
+                , event_time_utc as event_ts
+                , event_type as event_name
+                , revenue
+            from read_parquet('{raw_base}/fact_event/dt={dt}/**/*.parquet', hive_partitioning = false)
+        """,
+    }
+
+    con.execute(f"create schema if not exists {SCHEMA}")
+    rows = {}
+    for name, sql in tables.items():
+        con.execute(f"create or replace table {SCHEMA}.{name} as {sql}")
+        rows[name] = con.execute(f"select count(*) from {SCHEMA}.{name}").fetchone()[0]
+    return rows
+
+
+def main() -> None:
+    args = parse_args()
+    con = duckdb.connect(args.db)
+    con.execute("SET TimeZone = 'UTC'")
+    rows = load_sources(con, args.dt, args.raw_path.rstrip("/"), args.silver_path.rstrip("/"))
+    con.close()
+
+    print("✅ Loaded dbt sources")
+    print(f"db: {args.db}")
+    print(" ".join(f"{name}={n}" for name, n in rows.items()))
+
+
+if __name__ == "__main__":
+    main()
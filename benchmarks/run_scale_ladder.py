@@ -0,0 +1,397 @@
+#!/usr/bin/env python3
+"""
+Scale-ladder benchmark of the full pipeline on the single-node (DuckDB) engine.
+
+For every rung of --ladder (users per day) the harness runs, each stage as its own process:
+- generate:          jobs/00_generate_data.py --users N --experiments E (Spark)
+- build_assignments: jobs/10_build_assignments.py --engine duckdb
+- build_validation:  jobs/20_build_exposure_validation.py --engine duckdb
+- load_dbt_sources:  benchmarks/load_dbt_sources.py (job outputs -> DuckDB sources)
+- dbt_experiments:   dbt run --full-refresh --select path:dbt/models/experiments against
+                     that DuckDB file
+
+The dbt stage measures model builds only: `dbt run`, not `dbt build`, so data tests are
+not timed. The rung's DuckDB file is deleted before its sources are loaded and the run
+passes --full-refresh, so every incremental model takes its full-build path and repeated
+harness runs measure the same thing (recorded as params.dbt_mode in the history).
+
+and records per stage:
+- wall_seconds
+- rows (input rows of the stage, from parquet footers / loaded tables) and rows_per_second
+- peak_rss_bytes: the larger of ru_maxrss from wait4() (the process and the descendants
+  it waited for) and the peak summed RSS of its process tree, sampled from /proc while
+  it runs; the sampling covers children that are never reaped, like the PySpark JVM
+
+Results are appended to a JSON history file (--history), one entry per harness run with
+the git commit, host and per-rung/per-stage results. Each result is compared with the
+median of the last `baseline_runs` successful results of the same (users, experiments,
+stage) on a host with the same CPU count; regressions beyond the thresholds in
+--thresholds (benchmarks/thresholds.json) are listed in the entry and fail the run.
+
+Rung data lives in --work/<users>; add --reuse_data to skip generation when a rung's raw
+data already exists. dbt packages must be installed (make deps).
+"""
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from datetime import UTC, datetime
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+JOBS_DIR = os.path.join(REPO_ROOT, "jobs")
+sys.path.insert(0, JOBS_DIR)
+
+import spark_session
+
+DEFAULT_LADDER = "50000,1000000,10000000,50000000"
+DEFAULT_THRESHOLDS = os.path.join(REPO_ROOT, "benchmarks", "thresholds.json")
+DEFAULT_HISTORY = os.path.join(REPO_ROOT, "benchmarks", "results", "history.json")
+
+RAW_TABLES = ["dim_experiment", "dim_experiment_variant", "fact_assignment", "fact_exposure", "fact_event"]
+DBT_VARS = {"exp_source_schema_silver": "main_silver", "exp_source_schema_gold": "main_gold"}
+DBT_MODE = "run --full-refresh"
+RSS_SAMPLE_SECONDS = 0.2
+
+
+def parse_args() -> argparse.Namespace:
+    p = argparse.ArgumentParser()
+    p.add_argument("--ladder", default=DEFAULT_LADDER, help=f"Comma-separated users per rung (default: {DEFAULT_LADDER})")
+    p.add_argument("--experiments", type=int, default=3, help="Experiments per rung (default: 3)")
+    p.add_argument("--dt", default="2026-02-01", help="Partition date to generate and process")
+    p.add_argument("--profile", default="uniform", help="Generator load profile (see 00_generate_data.py)")
+    p.add_argument("--work", default="bench_data", help="Scratch directory for rung data (default: bench_data)")
+    p.add_argument("--reuse_data", action="store_true", help="Skip generation for rungs whose raw data exists")
+    p.add_argument("--skip_dbt", action="store_true", help="Stop after job 20 (no dbt stages)")
+    p.add_argument("--history", default=DEFAULT_HISTORY, help="JSON history file to append to")
+    p.add_argument("--thresholds", default=DEFAULT_THRESHOLDS, help="Regression thresholds JSON")
+    p.add_argument(
+        "--no_fail_on_regression",
+        action="store_true",
+        help="Record regressions in the history but exit 0",
+    )
+    return p.parse_args()
+
+
+def tree_rss_bytes(root_pid: int) -> int:
+    """Summed RSS of root_pid and its descendants (0 where /proc is not available)."""
+    page = os.sysconf("SC_PAGE_SIZE")
+    parents, rss = {}, {}
+    for name in os.listdir("/proc"):
+        if not name.isdigit():
+            continue
+        try:
+            with open(f"/proc/{name}/stat") as f:
+                # pid (comm) state ppid ...; comm may contain spaces
+                fields = f.read().rsplit(")", 1)[1].split()
+            with open(f"/proc/{name}/statm") as f:
+                rss[int(name)] = int(f.read().split()[1]) * page
+            parents[int(name)] = int(fields[1])
+        except (OSError, IndexError, ValueError):
+            continue
+
+    tree, frontier = {root_pid}, [root_pid]
+    while frontier:
+        pid = frontier.pop()
+        children = [child for child, parent in parents.items() if parent == pid and child not in tree]
+        tree.update(children)
+        frontier.extend(children)
+    return sum(rss.get(pid, 0) for pid in tree)
+
+
+def run_stage(cmd: list[str], log_path: str, cwd: str = REPO_ROOT) -> dict:
+    """Run cmd to completion; returns wall time, exit code and peak RSS (see module docstring)."""
+    sampled = {"peak": 0}
+    done = threading.Event()
+
+    def sample(pid: int) -> None:
+        if not os.path.isdir("/proc"):
+            return
+        while not done.wait(RSS_SAMPLE_SECONDS):
+            sampled["peak"] = max(sampled["peak"], tree_rss_bytes(pid))
+
+    with open(log_path, "w") as log:
+        t0 = time.perf_counter()
+        proc = subprocess.Popen(cmd, cwd=cwd, stdout=log, stderr=subprocess.STDOUT)
+        sampler = threading.Thread(target=sample, args=(proc.pid,), daemon=True)
+        sampler.start()
+        _, status, rusage = os.wait4(proc.pid, 0)
+        wall = time.perf_counter() - t0
+        done.set()
+        sampler.join()
+    proc.returncode = os.waitstatus_to_exitcode(status)
+
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    max_rss = rusage.ru_maxrss if sys.platform == "darwin" else rusage.ru_maxrss * 1024
+    return {
+        "wall_seconds": round(wall, 3),
+        "exit_code": proc.returncode,
+        "peak_rss_bytes": max(max_rss, sampled["peak"]),
+    }
+
+
+def parquet_rows(paths: list[str]) -> int:
+    return spark_session.input_stats(paths)["rows"]
+
+
+def rung_stages(args: argparse.Namespace, users: int) -> list[dict]:
+    """Commands and row counters of one rung, in execution order."""
+    dt = args.dt
+    rung = os.path.abspath(os.path.join(args.work, str(users)))
+    raw, silver, gold = f"{rung}/raw", f"{rung}/silver", f"{rung}/gold"
+    db = f"{rung}/dbt.duckdb"
+    py = sys.executable
+
+    def raw_rows(*tables):
+        return lambda: parquet_rows([f"{raw}/{t}/dt={dt}" for t in tables])
+
+    stages = [
+        {
+            "stage": "generate",
+            "cmd": [
+                py, f"{JOBS_DIR}/00_generate_data.py", "--dt", dt, "--out", raw,
+                "--users", str(users), "--experiments", str(args.experiments), "--profile", args.profile,
+                "--no_run_metrics",
+            ],
+            "rows": raw_rows(*RAW_TABLES),
+            "skip": args.reuse_data and os.path.isdir(f"{raw}/fact_exposure/dt={dt}"),
+        },
+        {
+            "stage": "build_assignments",
+            "cmd": [
+                py, f"{JOBS_DIR}/10_build_assignments.py", "--dt", dt, "--in", raw, "--out", silver,
+                "--engine", "duckdb", "--no_run_metrics",
+            ],
+            "rows": raw_rows("fact_assignment"),
+        },
+        {
+            "stage": "build_validation",
+            "cmd": [
+                py, f"{JOBS_DIR}/20_build_exposure_validation.py", "--dt", dt, "--in", raw,
+                "--silver", silver, "--gold", gold, "--engine", "duckdb", "--no_run_metrics",
+            ],
+            "rows": lambda: parquet_rows(
+                [f"{raw}/fact_exposure/dt={dt}", f"{silver}/fact_assignment_canonical/dt={dt}"]
+            ),
+        },
+    ]
+    if args.skip_dbt:
+        return stages
+
+    def source_rows():
+        return parquet_rows(
+            [
+                f"{silver}/int_experiment_exposure_validation/dt={dt}",
+                f"{silver}/int_experiment_exposures_deduped/dt={dt}",
+                f"{raw}/fact_event/dt={dt}",
+            ]
+        )
+
+    dbt = shutil.which("dbt") or os.path.join(os.path.dirname(py), "dbt")
+    stages += [
+        {
+            "stage": "load_dbt_sources",
+            "cmd": [
+                py, f"{REPO_ROOT}/benchmarks/load_dbt_sources.py", "--dt", dt, "--db", db,
+                "--raw", raw, "--silver", silver,
+            ],
+            "rows": source_rows,
+            "setup": lambda: remove_db(db),
+        },
+        {
+            "stage": "dbt_experiments",
+            "cmd": [
+                dbt, *DBT_MODE.split(), "--select", "path:dbt/models/experiments",
+                "--profiles-dir", rung, "--target-path", f"{rung}/dbt_target",
+                "--log-path", f"{rung}/dbt_logs", "--vars", json.dumps(DBT_VARS),
+            ],
+            "rows": lambda: parquet_rows(
+                [f"{silver}/int_experiment_exposure_validation/dt={dt}", f"{raw}/fact_event/dt={dt}"]
+            ),
+            "setup": lambda: write_dbt_profile(rung, db),
+        },
+    ]
+    return stages
+
+
+def remove_db(db: str) -> None:
+    """Start the rung from an empty DuckDB file, so no model has a previous incremental state."""
+    for path in [db, f"{db}.wal"]:
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def write_dbt_profile(rung: str, db: str) -> None:
+    with open(os.path.join(rung, "profiles.yml"), "w") as f:
+        f.write(
+            "experimentation_analytics_platform:\n"
+            "  target: bench\n"
+            "  outputs:\n"
+            "    bench:\n"
+            "      type: duckdb\n"
+            f"      path: {db}\n"
+            f"      threads: {os.cpu_count() or 1}\n"
+            f"      module_paths: [{os.path.join(REPO_ROOT, 'scripts')}]\n"
+            "      plugins:\n"
+            "        - module: experiment_stats_plugin\n"
+        )
+
+
+def git_commit() -> str | None:
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT, capture_output=True, text=True, check=True
+        )
+        return out.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def host_info() -> dict:
+    try:
+        memory = os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES")
+    except (ValueError, OSError, AttributeError):
+        memory = None
+    return {"node": platform.node(), "platform": platform.platform(), "cpus": os.cpu_count(), "memory_bytes": memory}
+
+
+def load_history(path: str) -> list[dict]:
+    if not os.path.isfile(path):
+        return []
+    with open(path) as f:
+        return json.load(f)
+
+
+def thresholds_for(thresholds: dict, stage: str) -> dict:
+    return {**thresholds["default"], **thresholds.get("stages", {}).get(stage, {})}
+
+
+def find_regressions(result: dict, history: list[dict], host: dict, thresholds: dict) -> list[dict]:
+    """Compare one result with the median of its baseline runs (see module docstring)."""
+    baseline = [
+        r
+        for entry in history
+        if entry["host"].get("cpus") == host["cpus"]
+        for r in entry["results"]
+        if r["status"] == "ok"
+        and (r["users"], r["experiments"], r["stage"]) == (result["users"], result["experiments"], result["stage"])
+    ][-thresholds["baseline_runs"]:]
+    if not baseline:
+        return []
+
+    limits = thresholds_for(thresholds, result["stage"])
+    checks = [
+        # metric, change that counts as worse, allowed relative change
+        ("wall_seconds", 1, limits["max_wall_seconds_increase"]),
+        ("rows_per_second", -1, limits["max_rows_per_second_decrease"]),
+        ("peak_rss_bytes", 1, limits["max_peak_rss_increase"]),
+    ]
+    regressions = []
+    for metric, direction, allowed in checks:
+        values = [r[metric] for r in baseline if r.get(metric)]
+        if not values or not result.get(metric):
+            continue
+        base = statistics.median(values)
+        if metric == "wall_seconds" and base < limits["min_wall_seconds"]:
+            continue  # too short to compare reliably
+        change = (result[metric] - base) / base
+        if change * direction > allowed:
+            regressions.append(
+                {
+                    "users": result["users"],
+                    "stage": result["stage"],
+                    "metric": metric,
+                    "baseline": base,
+                    "value": result[metric],
+                    "change": round(change, 4),
+                    "allowed": allowed,
+                }
+            )
+    return regressions
+
+
+def main() -> None:
+    args = parse_args()
+    ladder = [int(u) for u in args.ladder.split(",")]
+    with open(args.thresholds) as f:
+        thresholds = json.load(f)
+    history = load_history(args.history)
+    host = host_info()
+
+    entry = {
+        "run_started_at_utc": datetime.now(UTC).isoformat(timespec="seconds"),
+        "git_commit": git_commit(),
+        "host": host,
+        "params": {
+            "ladder": ladder,
+            "experiments": args.experiments,
+            "dt": args.dt,
+            "profile": args.profile,
+            "dbt_mode": None if args.skip_dbt else DBT_MODE,
+        },
+        "results": [],
+        "regressions": [],
+    }
+
+    for users in ladder:
+        rung = os.path.abspath(os.path.join(args.work, str(users)))
+        os.makedirs(f"{rung}/logs", exist_ok=True)
+
+        for stage in rung_stages(args, users):
+            name = stage["stage"]
+            if stage.get("skip"):
+                print(f"users={users:>10,} {name:<18} skipped (--reuse_data)")
+                continue
+            if "setup" in stage:
+                stage["setup"]()
+
+            run = run_stage(stage["cmd"], f"{rung}/logs/{name}.log")
+            ok = run["exit_code"] == 0
+            rows = stage["rows"]() if ok else None
+            result = {
+                "users": users,
+                "experiments": args.experiments,
+                "stage": name,
+                "status": "ok" if ok else "failed",
+                "rows": rows,
+                "wall_seconds": run["wall_seconds"],
+                "rows_per_second": round(rows / run["wall_seconds"], 1) if rows and run["wall_seconds"] else None,
+                "peak_rss_bytes": run["peak_rss_bytes"],
+            }
+            entry["results"].append(result)
+            if ok:
+                entry["regressions"] += find_regressions(result, history, host, thresholds)
+
+            print(
+                f"users={users:>10,} {name:<18} {result['status']:<6} wall={run['wall_seconds']:>8.1f}s "
+                f"rows={rows or 0:>12,} rows/s={result['rows_per_second'] or 0:>12,.0f} "
+                f"peak_rss={run['peak_rss_bytes'] / 1024 / 1024:>8.0f}MB"
+            )
+            if not ok:
+                print(f"  see {rung}/logs/{name}.log")
+                break
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.history)), exist_ok=True)
+    with open(args.history, "w") as f:
+        json.dump(history + [entry], f, indent=2)
+
+    failed = [r for r in entry["results"] if r["status"] != "ok"]
+    print(f"history: {args.history} ({len(history) + 1} runs)")
+    for r in entry["regressions"]:
+        print(
+            f"❌ regression users={r['users']} stage={r['stage']} {r['metric']}: "
+            f"{r['baseline']:.1f} -> {r['value']:.1f} ({r['change']:+.0%}, allowed {r['allowed']:.0%})"
+        )
+    if failed or (entry["regressions"] and not args.no_fail_on_regression):
+        raise SystemExit(1)
+    print("✅ Benchmark ladder finished without regressions")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,27 @@
+{#-
+    Lookback for incremental experiment models.
+
+    An incremental run rebuilds every row whose anchor timestamp is at or after
+    incremental_lookback_start(): the latest anchor already in the model minus the
+    lookback. Rows older than that can no longer change once their windows closed,
+    so daily runs process the last window's worth of data instead of all history.
+-#}
+
+{% macro exposure_lookback_days() %}
+    {{ return(var('exp_exposure_max_days_after_assignment', 7) | int) }}
+{% endmacro %}
+
+{% macro conversion_lookback_days() %}
+    {#- a conversion outcome can change while its cohort row (exposure window) or its conversion window is open -#}
+    {{ return(exposure_lookback_days() + var('exp_conversion_window_days', 7) | int) }}
+{% endmacro %}
+
+{% macro incremental_lookback_start(this_column, lookback_days) %}
+    (
+        select coalesce(
+            {{ dbt.dateadd('day', -1 * lookback_days, 'max(' ~ this_column ~ ')') }},
+            cast('1900-01-01' as timestamp)
+        )
+        from {{ this }}
+    )
+{% endmacro %}
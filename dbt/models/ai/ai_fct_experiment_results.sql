@@ -1,14 +1,41 @@
 {{ config(materialized='view') }}
 
+with sequential as (
+
+    -- latest look of the always-valid sequential test, per treatment variation
+    select
+        experiment_id
+      , metric_id
+      , variation_id
+      , always_valid_p_value
+      , cs_low
+      , cs_high
+    from {{ ref('fct_experiment_sequential_results') }}
+    qualify row_number() over (
+        partition by experiment_id, metric_id, variation_id
+        order by date_day desc
+    ) = 1
+
+)
+
 select
-    experiment_id
-  , n_control
-  , cr_control
-  , n_treatment
-  , cr_treatment
-  , uplift_abs
-  , z_score
-  , p_value_two_sided as p_value
-  , ci_low
-  , ci_high
-from {{ ref('fct_experiment_results') }}
+    r.experiment_id
+  , r.variation_id
+  , r.n_control
+  , r.cr_control
+  , r.n_treatment
+  , r.cr_treatment
+  , r.uplift_abs
+  , r.z_score
+  , r.p_value_two_sided as p_value
+  , r.ci_low
+  , r.ci_high
+  , s.always_valid_p_value
+  , s.cs_low
+  , s.cs_high
+from {{ ref('fct_experiment_results') }} r
+left join sequential s
+    on r.experiment_id = s.experiment_id
+   and r.metric_id = s.metric_id
+   and r.variation_id = s.variation_id
+where r.metric_id = '{{ var("exp_primary_metric_id") }}'
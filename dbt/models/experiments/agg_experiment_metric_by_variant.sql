@@ -1,19 +1,100 @@
-with outcomes as (
+-- Per-variant totals merged from the daily cube. Set exp_results_start_date /
+-- exp_results_end_date (inclusive assignment days) to get results for a date range,
+-- e.g. --vars '{exp_results_end_date: 2026-02-10}' for results as of that day.
+-- Day accumulators combine with Chan's parallel formula:
+--   M2 = sum(M2_d) + sum(n_d * (mean_d - mean)^2)
+--   C  = sum(C_d)  + sum(n_d * (mean_d - mean) * (mean_pre_d - mean_pre))
+-- which needs only the cube rows, not another pass over users.
+
+with cube as (
+
+    select
+        experiment_id
+        , metric_id
+        , metric_type
+        , variation_id
+        , n_users
+        , sum_value
+        , m2_value
+        , sum_pre_value
+        , m2_pre_value
+        , comoment_value_pre
+    from {{ ref('agg_experiment_metric_daily') }}
+    where 1 = 1
+    {% if var('exp_results_start_date', none) %}
+      and date_day >= cast('{{ var("exp_results_start_date") }}' as date)
+    {% endif %}
+    {% if var('exp_results_end_date', none) %}
+      and date_day <= cast('{{ var("exp_results_end_date") }}' as date)
+    {% endif %}
+
+)
+
+, totals as (
 
     select
         experiment_id
-        , user_id
-        , assigned_variant_id
-        , is_converted_7d
-    from {{ ref('int_experiment_metric_outcomes__conversion') }}
+        , metric_id
+        , metric_type
+        , variation_id
+        , sum(n_users) as n_users
+        , sum(sum_value) as sum_value
+        , sum(sum_pre_value) as sum_pre_value
+    from cube
+    group by 1,2,3,4
+
+)
+
+, merged as (
+
+    select
+        t.experiment_id
+        , t.metric_id
+        , t.metric_type
+        , t.variation_id
+        , t.n_users
+        , t.sum_value
+        , t.sum_pre_value
+        , sum(
+            c.m2_value
+            + c.n_users * power(c.sum_value / c.n_users - t.sum_value / t.n_users, 2)
+        ) as m2_value
+        , sum(
+            c.m2_pre_value
+            + c.n_users * power(c.sum_pre_value / c.n_users - t.sum_pre_value / t.n_users, 2)
+        ) as m2_pre_value
+        , sum(
+            c.comoment_value_pre
+            + c.n_users
+            * (c.sum_value / c.n_users - t.sum_value / t.n_users)
+            * (c.sum_pre_value / c.n_users - t.sum_pre_value / t.n_users)
+        ) as comoment_value_pre
+    from totals t
+    join cube c
+        on t.experiment_id = c.experiment_id
+       and t.metric_id = c.metric_id
+       and t.variation_id = c.variation_id
+    group by 1,2,3,4,5,6,7
 
 )
 
 select
     experiment_id
-    , assigned_variant_id as variation_id
-    , count(*) as n_users
-    , sum(is_converted_7d) as n_converted
-    , round(sum(is_converted_7d) * 1.0 / count(*), 4) as conversion_rate
-from outcomes
-group by 1,2
+    , metric_id
+    , metric_type
+    , variation_id
+    , cast(n_users as bigint) as n_users
+
+    -- binary metrics
+    , case when metric_type = 'binary' then cast(sum_value as bigint) end as n_converted
+    , case when metric_type = 'binary' then round(sum_value * 1.0 / n_users, 4) end as conversion_rate
+
+    -- all metrics: mean and sample variance of the user-level value
+    , sum_value / n_users as mean_value
+    , m2_value / nullif(n_users - 1, 0) as variance_value
+
+    -- pre-assignment covariate (CUPED): mean, sample variance, sample covariance with the value
+    , sum_pre_value / n_users as mean_pre_value
+    , m2_pre_value / nullif(n_users - 1, 0) as variance_pre_value
+    , comoment_value_pre / nullif(n_users - 1, 0) as covariance_value_pre
+from merged
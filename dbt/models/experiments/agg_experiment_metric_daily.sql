@@ -0,0 +1,69 @@
+{{
+    config(
+        materialized='incremental',
+        unique_key=['experiment_id', 'metric_id', 'variation_id', 'date_day'],
+        incremental_strategy='delete+insert',
+        on_schema_change='sync_all_columns'
+    )
+}}
+
+-- Daily sufficient statistics per experiment x metric x variation x assignment day.
+-- Each row is a mergeable moment accumulator of the user-level metric value: count,
+-- sum and M2 (sum of squared deviations from the day's mean). Counts and sums add up
+-- across days; M2s combine with Chan's parallel formula (agg_experiment_metric_by_variant),
+-- so results for any date range come from cube rows instead of a scan over users.
+-- The same moments of the pre-assignment covariate (sum, M2) and the co-moment of
+-- value and covariate feed CUPED.
+-- Incremental runs rebuild the days whose outcomes can still change (see incremental_lookback.sql).
+
+with outcomes as (
+
+    select
+        experiment_id
+        , '{{ var("exp_primary_metric_id") }}' as metric_id
+        , 'binary' as metric_type
+        , assigned_variant_id as variation_id
+        , cast(date_trunc('day', assigned_at) as date) as date_day
+        , cast(is_converted_7d as double) as metric_value
+        , cast(is_converted_pre as double) as pre_value
+    from {{ ref('int_experiment_metric_outcomes__conversion') }}
+    {% if is_incremental() %}
+    where cast(date_trunc('day', assigned_at) as date)
+        >= {{ incremental_lookback_start('date_day', conversion_lookback_days()) }}
+    {% endif %}
+
+    union all
+
+    select
+        experiment_id
+        , '{{ var("exp_revenue_metric_id") }}' as metric_id
+        , 'continuous' as metric_type
+        , assigned_variant_id as variation_id
+        , cast(date_trunc('day', assigned_at) as date) as date_day
+        , revenue_7d as metric_value
+        , revenue_pre as pre_value
+    from {{ ref('int_experiment_metric_outcomes__revenue') }}
+    {% if is_incremental() %}
+    where cast(date_trunc('day', assigned_at) as date)
+        >= {{ incremental_lookback_start('date_day', conversion_lookback_days()) }}
+    {% endif %}
+
+)
+
+select
+    experiment_id
+    , metric_id
+    , metric_type
+    , variation_id
+    , date_day
+    , count(*) as n_users
+    , sum(metric_value) as sum_value
+    -- var_pop is computed with Welford updates, so M2 = n * var_pop avoids the
+    -- cancellation of sum(x^2) - sum(x)^2 / n
+    , var_pop(metric_value) * count(*) as m2_value
+    , sum(pre_value) as sum_pre_value
+    , var_pop(pre_value) * count(*) as m2_pre_value
+    -- sum((value - mean) * (pre_value - mean_pre))
+    , covar_pop(metric_value, pre_value) * count(*) as comoment_value_pre
+from outcomes
+group by 1,2,3,4,5
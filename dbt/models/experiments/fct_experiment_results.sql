@@ -1,3 +1,7 @@
+-- Materialized as a table: proportion_ztest(), welch_ttest() and cuped_ttest() are Python UDFs
+-- registered on dbt connections by scripts/experiment_stats_plugin.py, not on ad-hoc DuckDB sessions.
+{{ config(materialized='table') }}
+
 with agg as (
 
     select *
@@ -25,113 +29,95 @@ with agg as (
 
     select
         t.experiment_id
+        , t.metric_id
+        , t.metric_type
+        , t.variation_id
 
         , c.n_users as n_control
         , c.n_converted as conv_control
         , c.conversion_rate as cr_control
+        , c.mean_value as mean_control
+        , c.variance_value as var_control
+        , c.mean_pre_value as mean_pre_control
+        , c.variance_pre_value as var_pre_control
+        , c.covariance_value_pre as cov_control
 
         , t.n_users as n_treatment
         , t.n_converted as conv_treatment
         , t.conversion_rate as cr_treatment
-
-        , (t.conversion_rate - c.conversion_rate) as uplift_abs
+        , t.mean_value as mean_treatment
+        , t.variance_value as var_treatment
+        , t.mean_pre_value as mean_pre_treatment
+        , t.variance_pre_value as var_pre_treatment
+        , t.covariance_value_pre as cov_treatment
 
     from treatment t
     join control c
         on t.experiment_id = c.experiment_id
+       and t.metric_id = c.metric_id
 
 )
 
-, stats as (
+, tested as (
 
     select
         *
-
-        -- pooled proportion
-        , (conv_control + conv_treatment) * 1.0
-          / (n_control + n_treatment) as p_pool
+        -- one vectorized call per test (scripts/experiment_stats.py):
+        -- pooled z-test for binary metrics, Welch t-test for continuous ones
+        , case
+            when metric_type = 'binary'
+                then proportion_ztest(n_control, conv_control, n_treatment, conv_treatment)
+          end as ztest
+        , case
+            when metric_type = 'continuous'
+                then welch_ttest(n_control, mean_control, var_control, n_treatment, mean_treatment, var_treatment)
+          end as ttest
+        -- CUPED on the pre-assignment covariate, from the per-arm moments only
+        , cuped_ttest(
+            n_control, mean_control, var_control, mean_pre_control, var_pre_control, cov_control,
+            n_treatment, mean_treatment, var_treatment, mean_pre_treatment, var_pre_treatment, cov_treatment
+          ) as cuped
 
     from joined
 
 )
 
-, final as (
-
-    select
-        *
-        -- standard error
-        , sqrt(
-            p_pool * (1 - p_pool)
-            * (1.0 / n_control + 1.0 / n_treatment)
-          ) as se
-
-        , uplift_abs
-          / nullif(
-                sqrt(
-                    p_pool * (1 - p_pool)
-                    * (1.0 / n_control + 1.0 / n_treatment)
-                ),
-                0
-            ) as z_score
-
-        , abs(
-            uplift_abs
-            / nullif(
-                sqrt(
-                    p_pool * (1 - p_pool)
-                    * (1.0 / n_control + 1.0 / n_treatment)
-                ),
-                0
-            )
-          ) as z_abs
-
-        , (1.0 / (1.0 + 0.2316419 * abs(
-            uplift_abs
-            / nullif(
-                sqrt(
-                    p_pool * (1 - p_pool)
-                    * (1.0 / n_control + 1.0 / n_treatment)
-                ),
-                0
-            )
-          ))) as t
-
-    from stats
-
-)
-
 select
     experiment_id
+    , metric_id
+    , metric_type
+    , variation_id
 
     , n_control
     , cr_control
+    , mean_control
 
     , n_treatment
     , cr_treatment
-
-    , uplift_abs
-
-    , z_score
-
-    -- two-sided p-value (normal approx; DuckDB-safe, no erf())
-    , 2
-      * (exp(-0.5 * z_abs * z_abs) / sqrt(2 * pi()))
-      * (t * (
-            0.319381530
-            + t * (
-                -0.356563782
-                + t * (
-                    1.781477937
-                    + t * (
-                        -1.821255978
-                        + t * 1.330274429
-                    )
-                )
-            )
-        )) as p_value_two_sided
-
-    -- 95% CI for absolute uplift
-    , uplift_abs - 1.96 * se as ci_low
-    , uplift_abs + 1.96 * se as ci_high
-
-from final
+    , mean_treatment
+
+    , coalesce(ztest.uplift_abs, ttest.uplift_abs) as uplift_abs
+    , coalesce(ztest.uplift_rel, ttest.uplift_rel) as uplift_rel
+
+    , ztest.z_score as z_score
+    , ttest.t_stat as t_stat
+    , ttest.df as df
+    , coalesce(ztest.p_value_two_sided, ttest.p_value_two_sided) as p_value_two_sided
+
+    -- 95% CI for the absolute uplift (binary: unpooled Wald; continuous: Welch)
+    , coalesce(ztest.ci_low, ttest.ci_low) as ci_low
+    , coalesce(ztest.ci_high, ttest.ci_high) as ci_high
+
+    -- optional CUPED-adjusted estimate (null without covariate variance)
+    , cuped.theta as cuped_theta
+    , cuped.uplift_abs as cuped_uplift_abs
+    , cuped.uplift_rel as cuped_uplift_rel
+    , cuped.se as cuped_se
+    , cuped.t_stat as cuped_t_stat
+    , cuped.df as cuped_df
+    , cuped.p_value_two_sided as cuped_p_value_two_sided
+    , cuped.ci_low as cuped_ci_low
+    , cuped.ci_high as cuped_ci_high
+    , cuped.variance_reduction as cuped_variance_reduction
+
+from tested
@@ -0,0 +1,188 @@
+{{ config(materialized='table') }}
+
+-- Cumulative experiment results per assignment day, for every metric. Running sums over
+-- the daily cube give each variation's totals as of every day in one pass, so the row for
+-- day d equals fct_experiment_results built with exp_results_end_date = d (without the
+-- CUPED columns). Binary metrics get the pooled z-test, continuous ones the Welch t-test;
+-- the running M2 follows from running sums of the day accumulators:
+--   M2 = sum(M2_d) + sum(sum_d^2 / n_d) - sum^2 / n
+-- Days are those with at least one assignment in the experiment.
+
+with cube as (
+
+    select
+        experiment_id
+        , metric_id
+        , metric_type
+        , variation_id
+        , date_day
+        , n_users
+        , sum_value
+        , m2_value
+    from {{ ref('agg_experiment_metric_daily') }}
+
+)
+
+, days as (
+
+    select distinct
+        experiment_id
+        , metric_id
+        , metric_type
+        , date_day
+    from cube
+
+)
+
+, variations as (
+
+    select distinct
+        experiment_id
+        , metric_id
+        , variation_id
+    from cube
+
+)
+
+, cumulative as (
+
+    select
+        d.experiment_id
+        , d.metric_id
+        , d.metric_type
+        , v.variation_id
+        , d.date_day
+        , cast(sum(coalesce(c.n_users, 0)) over w as bigint) as n_users
+        , sum(coalesce(c.sum_value, 0)) over w as sum_value
+        , sum(coalesce(c.m2_value, 0)) over w as sum_m2_value
+        , sum(coalesce(c.sum_value * c.sum_value / c.n_users, 0)) over w as sum_day_square_value
+    from days d
+    join variations v
+        on d.experiment_id = v.experiment_id
+       and d.metric_id = v.metric_id
+    left join cube c
+        on d.experiment_id = c.experiment_id
+       and d.metric_id = c.metric_id
+       and v.variation_id = c.variation_id
+       and d.date_day = c.date_day
+    window w as (
+        partition by d.experiment_id, d.metric_id, v.variation_id
+        order by d.date_day
+        rows between unbounded preceding and current row
+    )
+
+)
+
+, agg as (
+
+    select
+        experiment_id
+        , metric_id
+        , metric_type
+        , variation_id
+        , date_day
+        , n_users
+
+        -- binary metrics
+        , case when metric_type = 'binary' then cast(sum_value as bigint) end as n_converted
+        , case when metric_type = 'binary' then round(sum_value * 1.0 / nullif(n_users, 0), 4) end as conversion_rate
+
+        -- all metrics: mean and sample variance of the user-level value
+        , sum_value / nullif(n_users, 0) as mean_value
+        , (sum_m2_value + sum_day_square_value - sum_value * sum_value / nullif(n_users, 0))
+            / nullif(n_users - 1, 0) as variance_value
+    from cumulative
+
+)
+
+, control as (
+
+    select *
+    from agg
+    where variation_id = '{{ var("exp_control_variation_id") }}'
+
+)
+
+, treatment as (
+
+    select *
+    from agg
+    where variation_id != '{{ var("exp_control_variation_id") }}'
+
+)
+
+, joined as (
+
+    select
+        t.experiment_id
+        , t.metric_id
+        , t.metric_type
+        , t.variation_id
+        , t.date_day
+
+        , c.n_users as n_control
+        , c.n_converted as conv_control
+        , c.conversion_rate as cr_control
+        , c.mean_value as mean_control
+        , c.variance_value as var_control
+
+        , t.n_users as n_treatment
+        , t.n_converted as conv_treatment
+        , t.conversion_rate as cr_treatment
+        , t.mean_value as mean_treatment
+        , t.variance_value as var_treatment
+
+    from treatment t
+    join control c
+        on t.experiment_id = c.experiment_id
+       and t.metric_id = c.metric_id
+       and t.date_day = c.date_day
+
+)
+
+, tested as (
+
+    select
+        *
+        -- same tests as fct_experiment_results (scripts/experiment_stats.py)
+        , case
+            when metric_type = 'binary'
+                then proportion_ztest(n_control, conv_control, n_treatment, conv_treatment)
+          end as ztest
+        , case
+            when metric_type = 'continuous'
+                then welch_ttest(n_control, mean_control, var_control, n_treatment, mean_treatment, var_treatment)
+          end as ttest
+
+    from joined
+
+)
+
+select
+    experiment_id
+    , metric_id
+    , metric_type
+    , variation_id
+    , date_day
+
+    , n_control
+    , cr_control
+    , mean_control
+
+    , n_treatment
+    , cr_treatment
+    , mean_treatment
+
+    , coalesce(ztest.uplift_abs, ttest.uplift_abs) as uplift_abs
+    , coalesce(ztest.uplift_rel, ttest.uplift_rel) as uplift_rel
+
+    , ztest.z_score as z_score
+    , ttest.t_stat as t_stat
+    , ttest.df as df
+    , coalesce(ztest.p_value_two_sided, ttest.p_value_two_sided) as p_value_two_sided
+
+    -- 95% CI for the absolute uplift (binary: unpooled Wald; continuous: Welch)
+    , coalesce(ztest.ci_low, ttest.ci_low) as ci_low
+    , coalesce(ztest.ci_high, ttest.ci_high) as ci_high
+
+from tested
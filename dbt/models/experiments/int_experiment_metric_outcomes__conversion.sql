@@ -1,3 +1,22 @@
+{{
+    config(
+        materialized='incremental',
+        unique_key=['experiment_id', 'user_id'],
+        incremental_strategy='delete+insert',
+        on_schema_change='append_new_columns'
+    )
+}}
+
+-- First conversion in [assigned_at, assigned_at + window) per experiment x user.
+-- The as-of join matches each assignment to the user's earliest conversion at or after
+-- assigned_at (sort-merge over per-user event times), so every assignment yields at most
+-- one row instead of one per conversion event; the window is checked on that one match.
+-- A second as-of join finds the latest conversion before assigned_at: converting in the
+-- pre-period (exp_cuped_pre_period_days) is the CUPED covariate.
+-- Incremental runs rebuild assignments from the last exposure + conversion windows
+-- (see incremental_lookback.sql) and read conversion events from that start minus the
+-- pre-period only.
+
 with exposure_validation as (
 
     select
@@ -6,6 +25,9 @@ with exposure_validation as (
         , assigned_variant_id
         , assigned_at
     from {{ source('silver', 'int_experiment_exposure_validation') }}
+    {% if is_incremental() %}
+    where assigned_at >= {{ incremental_lookback_start('assigned_at', conversion_lookback_days()) }}
+    {% endif %}
 
 )
 
@@ -16,27 +38,30 @@ with exposure_validation as (
         , cast(event_ts as timestamp) as event_ts
     from {{ ref('stg_conversion_events') }}
     where event_name = '{{ var("exp_conversion_event_name") }}'
+      and event_ts is not null
+    {% if is_incremental() %}
+      -- rebuilt assignments only look back as far as their pre-period
+      and event_ts >= {{ incremental_lookback_start('assigned_at', conversion_lookback_days() + var('exp_cuped_pre_period_days') | int) }}
+    {% endif %}
 
 )
 
-, joined as (
+, first_conversion as (
 
     select
         ev.experiment_id
         , ev.user_id
         , ev.assigned_variant_id
         , ev.assigned_at
-        , ce.event_ts
-        , case
-            when ce.event_ts is not null
-                 and ce.event_ts >= ev.assigned_at
-                 and ce.event_ts < ev.assigned_at + interval '{{ var("exp_conversion_window_days") }} days'
-                then 1
-            else 0
-        end as is_converted_7d
+        , ce.event_ts as first_conversion_at
+        , pe.event_ts as last_pre_conversion_at
     from exposure_validation ev
-    left join conversion_events ce
+    asof left join conversion_events ce
         on ev.user_id = ce.user_id
+       and ce.event_ts >= ev.assigned_at
+    asof left join conversion_events pe
+        on ev.user_id = pe.user_id
+       and pe.event_ts < ev.assigned_at
 
 )
 
@@ -44,6 +69,20 @@ select
     experiment_id
     , user_id
     , assigned_variant_id
-    , max(is_converted_7d) as is_converted_7d
-from joined
+    , min(assigned_at) as assigned_at
+    , max(
+        case
+            when first_conversion_at < assigned_at + interval '{{ var("exp_conversion_window_days") }} days'
+                then 1
+            else 0
+        end
+    ) as is_converted_7d
+    , max(
+        case
+            when last_pre_conversion_at >= assigned_at - interval '{{ var("exp_cuped_pre_period_days") }} days'
+                then 1
+            else 0
+        end
+    ) as is_converted_pre
+from first_conversion
 group by 1,2,3
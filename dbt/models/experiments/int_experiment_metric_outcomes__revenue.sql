@@ -0,0 +1,61 @@
+{{
+    config(
+        materialized='incremental',
+        unique_key=['experiment_id', 'user_id'],
+        incremental_strategy='delete+insert',
+        on_schema_change='append_new_columns'
+    )
+}}
+
+-- Revenue of conversion events in [assigned_at, assigned_at + window) per experiment x user;
+-- 0 for users without conversions, so the metric is defined for every assigned user.
+-- The range join matches only events inside each assignment's window, widened back by
+-- exp_cuped_pre_period_days: pre-assignment revenue (revenue_pre) is the CUPED covariate,
+-- read in the same join.
+-- Incremental runs rebuild assignments from the last exposure + conversion windows
+-- (see incremental_lookback.sql) and read conversion events from that start minus the
+-- pre-period only.
+
+with exposure_validation as (
+
+    select
+        experiment_id
+        , user_id
+        , assigned_variant_id
+        , assigned_at
+    from {{ source('silver', 'int_experiment_exposure_validation') }}
+    {% if is_incremental() %}
+    where assigned_at >= {{ incremental_lookback_start('assigned_at', conversion_lookback_days()) }}
+    {% endif %}
+
+)
+
+, conversion_events as (
+
+    select
+        user_id
+        , cast(event_ts as timestamp) as event_ts
+        , cast(revenue as double) as revenue
+    from {{ ref('stg_conversion_events') }}
+    where event_name = '{{ var("exp_conversion_event_name") }}'
+      and event_ts is not null
+    {% if is_incremental() %}
+      -- rebuilt assignments only look back as far as their pre-period
+      and event_ts >= {{ incremental_lookback_start('assigned_at', conversion_lookback_days() + var('exp_cuped_pre_period_days') | int) }}
+    {% endif %}
+
+)
+
+select
+    ev.experiment_id
+    , ev.user_id
+    , ev.assigned_variant_id
+    , min(ev.assigned_at) as assigned_at
+    , coalesce(sum(case when ce.event_ts >= ev.assigned_at then ce.revenue end), 0) as revenue_7d
+    , coalesce(sum(case when ce.event_ts < ev.assigned_at then ce.revenue end), 0) as revenue_pre
+from exposure_validation ev
+left join conversion_events ce
+    on ev.user_id = ce.user_id
+   and ce.event_ts >= ev.assigned_at - interval '{{ var("exp_cuped_pre_period_days") }} days'
+   and ce.event_ts < ev.assigned_at + interval '{{ var("exp_conversion_window_days") }} days'
+group by 1,2,3
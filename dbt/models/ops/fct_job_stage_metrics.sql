@@ -0,0 +1,54 @@
+{{ config(materialized='table') }}
+
+-- One row per job run x stage, compared with the previous runs of the same stage.
+-- wall_seconds_vs_trailing > 1 means the stage got slower than its trailing average.
+
+with stages as (
+
+    select
+        run_id
+        , job
+        , engine
+        , cast(dt as date) as dt
+        , stage
+        , stage_order
+        , status
+        , started_at_utc
+        , wall_seconds
+        , executor_run_seconds
+        , input_rows
+        , input_bytes
+        , output_rows
+        , output_bytes
+        , shuffle_read_bytes
+        , shuffle_write_bytes
+        , memory_spill_bytes + disk_spill_bytes as spill_bytes
+        , peak_executor_memory_bytes
+    from {{ source('silver', 'run_metrics') }}
+
+)
+
+, with_trailing as (
+
+    select
+        *
+        , avg(wall_seconds) over (
+            partition by job, engine, stage
+            order by started_at_utc
+            rows between {{ var('ops_trailing_runs', 7) }} preceding and 1 preceding
+        ) as trailing_avg_wall_seconds
+        , avg(shuffle_write_bytes) over (
+            partition by job, engine, stage
+            order by started_at_utc
+            rows between {{ var('ops_trailing_runs', 7) }} preceding and 1 preceding
+        ) as trailing_avg_shuffle_write_bytes
+    from stages
+    where status = 'succeeded'
+
+)
+
+select
+    *
+    , round(wall_seconds / nullif(trailing_avg_wall_seconds, 0), 3) as wall_seconds_vs_trailing
+    , round(shuffle_write_bytes / nullif(trailing_avg_shuffle_write_bytes, 0), 3) as shuffle_write_vs_trailing
+from with_trailing
@@ -32,6 +32,6 @@ select
     , 'experiment_id'
     , 'experiment_id'
     , true
-    , 'AI-safe view of experiment outcome stats at experiment grain (control vs treatment conversion rate, uplift, z-score, p-value, CI). Use to answer whether treatment won.'
+    , 'AI-safe view of experiment outcome stats, one row per treatment variation (control vs treatment conversion rate, uplift, z-score, p-value, CI; always-valid p-value and confidence sequence). Use to answer whether treatment won; use always_valid_p_value / cs_low / cs_high when checking results repeatedly while the experiment runs.'
 
 
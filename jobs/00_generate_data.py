@@ -1,6 +1,7 @@
 #!/usr/bin/env python3
 """
-Generate synthetic experimentation data (assignments, exposures, events) for a given dt.
+Generate synthetic experimentation data (assignments, exposures, events) for a given dt
+or an inclusive dt range.
 
 Outputs (Parquet):
 - data/raw/dim_experiment/dt=YYYY-MM-DD/
@@ -9,26 +10,108 @@ Outputs (Parquet):
 - data/raw/fact_exposure/dt=YYYY-MM-DD/
 - data/raw/fact_event/dt=YYYY-MM-DD/
 
+Stage metrics (one write_<table> stage per table and day) go to
+data/silver/run_metrics/dt=YYYY-MM-DD (see run_metrics.py).
+
 Design goals:
 - deterministic (seeded) generation
 - user-level experiments
 - explicit assignment vs exposure separation
 - ability to intentionally "break" SRM for demo purposes
+- membership sampled per (experiment, user block) by default, so only assigned rows
+  are produced instead of the full users x experiments candidate space
+- named load profiles (--profile) for benchmark data: hot experiments, Zipf-distributed
+  heavy users (engagement events, purchases and retried assignment/exposure rows per
+  key), hot keys (bot-like users with tens of thousands of exposures per key),
+  assignment/exposure retries (duplicate rows) and late-arriving ingest
+- partition-invariant draws: every random value is a hash of
+  (seed, dt, stream, experiment_id, user_id[, seq]), never of row position, so any
+  user-range shard (--shard i/N) can be generated independently and the union of
+  all shards is identical to a single full run
+
+Sharded runs write fact-table files straight into .../dt=YYYY-MM-DD/ with a
+shard-<i>-of-<N>- file name prefix, so readers of the dt directory (Spark and DuckDB)
+see every shard, and re-running one shard only replaces that shard's files.
+Dimension tables are written by shard 0 only.
 """
 
 import argparse
+import math
+import os
+import shutil
 from datetime import datetime, timedelta
 
-from pyspark.sql import SparkSession
+import numpy as np
+import pandas as pd
+import run_metrics
+import spark_session
+from pyspark.sql import Column, DataFrame, SparkSession
 from pyspark.sql import functions as F
 from pyspark.sql.window import Window
 
-
-def parse_args() -> argparse.Namespace:
-    p = argparse.ArgumentParser()
-    p.add_argument("--dt", required=True, help="Partition date, e.g. 2026-02-01")
-    p.add_argument("--out", default="data/raw", help="Base output path (default: data/raw)")
-
+RAW_TABLES = [
+    "dim_experiment",
+    "dim_experiment_variant",
+    "fact_assignment",
+    "fact_exposure",
+    "fact_event",
+]
+
+# Load profiles: skew and dirty-data knobs layered on top of the base rates.
+# Keys missing from a profile fall back to PROFILE_DEFAULTS (= clean, uniform data).
+PROFILE_DEFAULTS = {
+    # the first hot_experiments experiments use hot_assignment_rate instead of --assignment_rate
+    "hot_experiments": 0,
+    "hot_assignment_rate": 0.95,
+    # engagement and purchase events per exposed user: uniform (1..5 engagement events, at
+    # most one purchase), or zipf (P(n >= x) = x^-zipf_alpha, drawn per user, capped at
+    # max_events_per_user; converting users make 1..n purchases)
+    "event_counts": "uniform",
+    "zipf_alpha": 1.1,
+    "max_events_per_user": 5_000,
+    # share of rows re-sent 1..max_retries times, up to retry_delay_seconds later; retry
+    # counts are uniform per key, or zipf per user (the same users retry in every experiment)
+    "assignment_dup_rate": 0.0,
+    "exposure_dup_rate": 0.0,
+    "retry_counts": "uniform",
+    "max_retries": 3,
+    "retry_delay_seconds": 300,
+    # share of events ingested up to max_ingest_lag_hours late (default lag is < 10 minutes)
+    "late_ingest_rate": 0.0,
+    "max_ingest_lag_hours": 72,
+    # bot-like users: the first hot_keys user ids (u_0, u_1, ...) re-send every exposure
+    # hot_key_exposures times within six hours, so each of their exposed keys is a heavy
+    # hitter well above job 20's default --skew_threshold_rows
+    "hot_keys": 0,
+    "hot_key_exposures": 50_000,
+}
+
+LOAD_PROFILES = {
+    "uniform": {},
+    "hot_experiments": {"hot_experiments": 1},
+    "heavy_users": {
+        "event_counts": "zipf",
+        "retry_counts": "zipf",
+        "assignment_dup_rate": 0.05,
+        "exposure_dup_rate": 0.20,
+        "max_retries": 5_000,
+    },
+    "retries": {"assignment_dup_rate": 0.05, "exposure_dup_rate": 0.20},
+    "late_arrivals": {"late_ingest_rate": 0.05},
+    "hot_keys": {"hot_keys": 10},
+    "production_like": {
+        "hot_experiments": 1,
+        "event_counts": "zipf",
+        "retry_counts": "zipf",
+        "assignment_dup_rate": 0.05,
+        "exposure_dup_rate": 0.20,
+        "max_retries": 5_000,
+        "late_ingest_rate": 0.05,
+    },
+}
+
+
+def add_generation_args(p: argparse.ArgumentParser) -> None:
     p.add_argument("--users", type=int, default=50_000, help="Number of users to simulate")
     p.add_argument("--experiments", type=int, default=3, help="Number of experiments to simulate")
 
@@ -38,6 +121,21 @@ def parse_args() -> argparse.Namespace:
     p.add_argument("--conversion_rate", type=float, default=0.03, help="Base conversion probability (0..1)")
     p.add_argument("--treatment_lift", type=float, default=0.15, help="Relative lift for treatment (e.g. 0.15 = +15%)")
 
+    # membership sampling
+    p.add_argument(
+        "--membership",
+        choices=["block_sample", "cross_join"],
+        default="block_sample",
+        help="block_sample draws assigned users per (experiment, user block); "
+             "cross_join filters every user x experiment pair (reference, O(users*experiments))",
+    )
+    p.add_argument(
+        "--membership_block_size",
+        type=int,
+        default=65_536,
+        help="Users per sampling block in block_sample mode",
+    )
+
     # SRM demo
     p.add_argument(
         "--srm_break",
@@ -46,7 +144,68 @@ def parse_args() -> argparse.Namespace:
     )
 
     p.add_argument("--seed", type=int, default=42, help="Random seed for deterministic runs")
-    return p.parse_args()
+
+    # load profile (skew / duplicates / late data)
+    p.add_argument("--profile", choices=list(LOAD_PROFILES), default="uniform", help="Named load profile")
+    p.add_argument("--assignment_dup_rate", type=float, default=None, help="Override the profile's assignment retry rate")
+    p.add_argument("--exposure_dup_rate", type=float, default=None, help="Override the profile's exposure retry rate")
+    p.add_argument("--late_ingest_rate", type=float, default=None, help="Override the profile's late-ingest rate")
+    p.add_argument("--max_retries", type=int, default=None, help="Override the profile's cap on copies per retried row")
+
+
+def parse_args() -> argparse.Namespace:
+    p = argparse.ArgumentParser()
+    days = p.add_mutually_exclusive_group(required=True)
+    days.add_argument("--dt", help="Partition date, e.g. 2026-02-01")
+    days.add_argument("--start_dt", help="First partition date of an inclusive range (requires --end_dt)")
+    p.add_argument("--end_dt", help="Last partition date of an inclusive range")
+    p.add_argument("--out", default="data/raw", help="Base output path (default: data/raw)")
+    p.add_argument(
+        "--shard",
+        default="0/1",
+        help="Generate only user shard i of N, e.g. 3/16 (default: 0/1 = all users)",
+    )
+    add_generation_args(p)
+    run_metrics.add_run_metrics_args(p)
+    args = p.parse_args()
+    if args.start_dt and not args.end_dt:
+        p.error("--start_dt requires --end_dt")
+    if args.end_dt and not args.start_dt:
+        p.error("--end_dt requires --start_dt")
+    return args
+
+
+def resolve_profile(args: argparse.Namespace) -> dict:
+    profile = {**PROFILE_DEFAULTS, **LOAD_PROFILES[args.profile]}
+    for name in ["assignment_dup_rate", "exposure_dup_rate", "late_ingest_rate", "max_retries"]:
+        if getattr(args, name) is not None:
+            profile[name] = getattr(args, name)
+    return profile
+
+
+def membership_rates(args: argparse.Namespace, profile: dict) -> list[float]:
+    """Assignment rate per experiment index; hot experiments come first."""
+    return [
+        float(profile["hot_assignment_rate"]) if i < profile["hot_experiments"] else float(args.assignment_rate)
+        for i in range(args.experiments)
+    ]
+
+
+def parse_shard(shard: str) -> tuple[int, int]:
+    try:
+        index, count = (int(x) for x in shard.split("/"))
+    except ValueError:
+        raise ValueError(f"--shard must look like i/N, got: {shard}")
+    if count < 1 or not 0 <= index < count:
+        raise ValueError(f"--shard index must satisfy 0 <= i < N, got: {shard}")
+    return index, count
+
+
+def iter_dts(start_dt: str, end_dt: str) -> list[str]:
+    start, end = dt_to_ts(start_dt), dt_to_ts(end_dt)
+    if end < start:
+        raise ValueError(f"--end_dt {end_dt} is before --start_dt {start_dt}")
+    return [(start + timedelta(days=i)).strftime("%Y-%m-%d") for i in range((end - start).days + 1)]
 
 
 def dt_to_ts(dt_str: str) -> datetime:
@@ -54,6 +213,188 @@ def dt_to_ts(dt_str: str) -> datetime:
     return datetime.strptime(dt_str, "%Y-%m-%d")
 
 
+# rough uncompressed bytes per generated row, for session sizing
+BYTES_PER_ROW = 120
+
+
+def estimate_rows(args: argparse.Namespace) -> int:
+    """Expected raw rows per day: assignments, exposures and ~3 events per exposure."""
+    assignments = args.users * args.experiments * args.assignment_rate
+    return int(assignments * (1 + args.exposure_rate * 4))
+
+
+def hash_uniform(seed: int, dt_str: str, stream: str, *cols) -> Column:
+    """
+    Uniform draw in [0, 1) from xxhash64(seed, dt, stream, *cols).
+
+    The top 53 bits of the hash become the double's mantissa, so draws depend only
+    on the row's key values and not on partitioning or row order.
+    """
+    h = F.xxhash64(F.lit(seed), F.lit(dt_str), F.lit(stream), *cols)
+    return F.shiftrightunsigned(h, 11).cast("double") / F.lit(float(1 << 53))
+
+
+def hash_normal(seed: int, dt_str: str, stream: str, *cols) -> Column:
+    # Box-Muller on two independent hash streams; 1 - u keeps log() away from 0
+    u1 = F.lit(1.0) - hash_uniform(seed, dt_str, f"{stream}_u1", *cols)
+    u2 = hash_uniform(seed, dt_str, f"{stream}_u2", *cols)
+    return F.sqrt(F.lit(-2.0) * F.log(u1)) * F.cos(F.lit(2.0 * math.pi) * u2)
+
+
+def hash_event_id(seed: int, dt_str: str, *cols) -> Column:
+    # uuid-shaped, but reproducible: sha256 over the event's generating key
+    h = F.sha2(F.concat_ws("|", F.lit(str(seed)), F.lit(dt_str), *cols), 256)
+    return F.concat_ws("-", h.substr(1, 8), h.substr(9, 4), h.substr(13, 4), h.substr(17, 4), h.substr(21, 12))
+
+
+def zipf_count(u: Column, alpha: float, cap: int) -> Column:
+    """Count in 1..cap with P(n >= x) = x^-alpha, from a uniform draw u."""
+    return F.least(F.floor(F.pow(F.lit(1.0) - u, F.lit(-1.0 / alpha))), F.lit(cap))
+
+
+def seconds_after(ts: Column, u: Column, max_seconds: int) -> Column:
+    offset = (u * F.lit(max_seconds)).cast("int")
+    return F.timestamp_seconds(F.unix_timestamp(ts) + offset)
+
+
+def sample_members_cross_join(
+    spark: SparkSession, args: argparse.Namespace, users: DataFrame, rates: list[float]
+) -> DataFrame:
+    exp_df = spark.createDataFrame(
+        [(f"exp_{i}", rate) for i, rate in enumerate(rates)], ["experiment_id", "assignment_rate"]
+    )
+
+    # Candidate rows: user x experiment
+    candidates = users.crossJoin(exp_df)
+
+    return candidates.withColumn(
+        "is_assigned",
+        (
+            hash_uniform(args.seed, args.dt, "membership", F.col("experiment_id"), F.col("user_id"))
+            < F.col("assignment_rate")
+        ).cast("boolean")
+    ).filter(F.col("is_assigned") == F.lit(True)).drop("is_assigned", "assignment_rate")
+
+
+def sample_members_block(
+    spark: SparkSession, args: argparse.Namespace, rates: list[float], user_lo: int, user_hi: int
+) -> DataFrame:
+    """
+    Assigned (experiment_id, user_id) pairs without materializing users x experiments.
+
+    User ids are cut into global blocks of --membership_block_size. For each
+    (experiment, block) a task draws k ~ Binomial(block_len, assignment_rate) and then k
+    distinct offsets, so every user is still a member with probability assignment_rate,
+    independently per experiment, but only member rows are produced.
+
+    Each draw is seeded by (seed, dt, experiment, block), never by shard, so a shard keeps
+    exactly the members that fall into its user range.
+    """
+    block_size = args.membership_block_size
+    n_users = args.users
+    day = dt_to_ts(args.dt).toordinal()
+    seed = args.seed
+
+    def draw(batches):
+        # one frame per (experiment, block): a task holds at most block_size members at a time
+        for pdf in batches:
+            for exp_index, block in zip(pdf["exp_index"], pdf["block"]):
+                start = int(block) * block_size
+                block_len = min(block_size, n_users - start)
+                rng = np.random.default_rng([seed, day, int(exp_index), int(block)])
+                k = rng.binomial(block_len, rates[exp_index])
+                ids = start + rng.choice(block_len, size=k, replace=False)
+                ids = np.sort(ids[(ids >= user_lo) & (ids < user_hi)])
+                if len(ids) == 0:
+                    continue
+                yield pd.DataFrame(
+                    {
+                        "experiment_id": np.full(len(ids), f"exp_{exp_index}", dtype=object),
+                        "user_id": np.char.add("u_", ids.astype(str)).astype(object),
+                    }
+                )
+
+    blocks = (
+        spark.range(0, args.experiments).withColumnRenamed("id", "exp_index")
+        .crossJoin(
+            spark.range(user_lo // block_size, -(-user_hi // block_size)).withColumnRenamed("id", "block")
+        )
+    )
+    return blocks.mapInPandas(draw, schema="experiment_id string, user_id string")
+
+
+def add_retries(
+    df: DataFrame,
+    seed: int,
+    dt_str: str,
+    stream: str,
+    time_col: str,
+    rate: float,
+    profile: dict,
+) -> DataFrame:
+    """
+    Append retried copies of a share of rows, like a client re-sending an event.
+
+    Copies keep every column but time_col, which moves 0..retry_delay_seconds later, so
+    some copies are exact duplicates and the original row stays the earliest. A retried
+    key gets 1..max_retries copies: uniform per key, or zipf per user with
+    retry_counts=zipf, so a few users carry thousands of copies per key.
+    """
+    if rate <= 0:
+        return df
+
+    key = [F.col("experiment_id"), F.col("user_id")]
+    if profile["retry_counts"] == "zipf":
+        u = hash_uniform(seed, dt_str, f"{stream}_retries", F.col("user_id"))
+        n_retries = zipf_count(u, profile["zipf_alpha"], profile["max_retries"])
+    else:
+        n_retries = F.floor(hash_uniform(seed, dt_str, f"{stream}_retries", *key) * profile["max_retries"]) + F.lit(1)
+    copies = (
+        df
+        .filter(hash_uniform(seed, dt_str, f"{stream}_retried", *key) < F.lit(float(rate)))
+        .withColumn("retry", F.explode(F.sequence(F.lit(1), n_retries.cast("int"))))
+        .withColumn(
+            time_col,
+            seconds_after(
+                F.col(time_col),
+                hash_uniform(seed, dt_str, f"{stream}_retry_delay", *key, F.col("retry")),
+                profile["retry_delay_seconds"] + 1,
+            )
+        )
+        .drop("retry")
+    )
+    return df.unionByName(copies)
+
+
+def add_hot_key_exposures(df: DataFrame, seed: int, dt_str: str, profile: dict) -> DataFrame:
+    """
+    Append hot_key_exposures copies of every exposure of the first hot_keys users.
+
+    Hot users are picked by user number, not by a draw, so they are the same in every
+    shard layout and experiment; copies move 0..6 hours after the original exposure.
+    """
+    if profile["hot_keys"] <= 0:
+        return df
+
+    key = [F.col("experiment_id"), F.col("user_id")]
+    user_number = F.substring(F.col("user_id"), 3, 20).cast("long")
+    copies = (
+        df
+        .filter(user_number < F.lit(profile["hot_keys"]))
+        .withColumn("seq", F.explode(F.sequence(F.lit(1), F.lit(profile["hot_key_exposures"]))))
+        .withColumn(
+            "exposure_time_utc",
+            seconds_after(
+                F.col("exposure_time_utc"),
+                hash_uniform(seed, dt_str, "hot_key_exposure", *key, F.col("seq")),
+                21600,
+            )
+        )
+        .drop("seq")
+    )
+    return df.unionByName(copies)
+
+
 def write_parquet(df, path: str) -> None:
     (
         df.write.mode("overwrite")
@@ -61,28 +402,57 @@ def write_parquet(df, path: str) -> None:
     )
 
 
-def main() -> None:
-    args = parse_args()
+def write_parquet_shard(df, path: str, shard: tuple[int, int]) -> None:
+    """
+    Write one shard's part files into path, replacing only that shard's earlier files.
+
+    Spark does not read nested non-partition directories, so the shard is staged under
+    an underscore-prefixed directory (hidden from readers) and its files are moved up.
+    """
+    shard_index, shard_count = shard
+    prefix = f"shard-{shard_index:05d}-of-{shard_count:05d}-"
+    staging = os.path.join(path, f"_staging-{prefix.rstrip('-')}")
+    write_parquet(df, staging)
+
+    for name in os.listdir(path):
+        if name.startswith((prefix, f".{prefix}")):
+            os.remove(os.path.join(path, name))
+    for name in os.listdir(staging):
+        if name.endswith(".parquet"):
+            os.replace(os.path.join(staging, name), os.path.join(path, prefix + name))
+    shutil.rmtree(staging)
+    open(os.path.join(path, "_SUCCESS"), "w").close()
+
+
+def generate(
+    spark: SparkSession,
+    args: argparse.Namespace,
+    shard: tuple[int, int] = (0, 1),
+) -> dict[str, DataFrame]:
+    """
+    Build all raw tables for args.dt without writing them.
+
+    shard=(i, N) restricts users to the i-th of N contiguous user-id ranges; the
+    rows produced for those users are the same as in an unsharded run.
+
+    Returns a dict keyed by table name (see RAW_TABLES).
+    """
     dt_str = args.dt
-    base_out = args.out.rstrip("/")
-
     dt_start = dt_to_ts(dt_str)
     dt_end = dt_start + timedelta(days=1)
+    seed = args.seed
+    profile = resolve_profile(args)
 
-    spark = (
-        SparkSession.builder
-        .appName("experimentation-analytics-platform-generate-data")
-        .master("local[*]")
-        .getOrCreate()
-    )
-    spark.sparkContext.setLogLevel("WARN")
+    shard_index, shard_count = shard
+    user_lo = args.users * shard_index // shard_count
+    user_hi = args.users * (shard_index + 1) // shard_count
 
     # -----------------------------
     # 1) Users
     # -----------------------------
     # user_id as stable string keys
     users = (
-        spark.range(0, args.users)
+        spark.range(user_lo, user_hi)
         .select(F.concat(F.lit("u_"), F.col("id").cast("string")).alias("user_id"))
     )
 
@@ -99,7 +469,7 @@ def main() -> None:
             F.lit(dt_start.isoformat()).alias("start_time_utc"),
             F.lit(None).cast("string").alias("end_time_utc"),
             F.lit("running").alias("status"),
-            F.current_timestamp().alias("created_at_utc"),
+            F.lit(dt_start).cast("timestamp").alias("created_at_utc"),
             F.lit(dt_str).alias("dt"),
         )
     )
@@ -129,37 +499,36 @@ def main() -> None:
     # -----------------------------
     # Decide experiment membership: each user has probability assignment_rate per experiment
     # Then assign variant. If --srm_break, bias allocation ~60/40 for demo.
-    exp_ids = [f"exp_{i}" for i in range(args.experiments)]
-    exp_df = spark.createDataFrame([(e,) for e in exp_ids], ["experiment_id"])
-
-    # Candidate rows: user x experiment
-    candidates = users.crossJoin(exp_df)
+    # Hot experiments (--profile) get a higher rate.
+    rates = membership_rates(args, profile)
 
     # Membership
-    candidates = candidates.withColumn(
-        "is_assigned",
-        (F.rand(args.seed) < F.lit(float(args.assignment_rate))).cast("boolean")
-    ).filter(F.col("is_assigned") == F.lit(True)).drop("is_assigned")
+    if args.membership == "cross_join":
+        candidates = sample_members_cross_join(spark, args, users, rates)
+    else:
+        candidates = sample_members_block(spark, args, rates, user_lo, user_hi)
+
+    key = [F.col("experiment_id"), F.col("user_id")]
 
     # Variant assignment
     if args.srm_break:
         # ~60/40 split: control 60%, treatment 40% (intentionally wrong vs expected 50/50)
         candidates = candidates.withColumn(
             "variant_id",
-            F.when(F.rand(args.seed + 1) < F.lit(0.60), F.lit("control")).otherwise(F.lit("treatment"))
+            F.when(hash_uniform(seed, dt_str, "variant", *key) < F.lit(0.60), F.lit("control")).otherwise(F.lit("treatment"))
         )
     else:
         # 50/50 split
         candidates = candidates.withColumn(
             "variant_id",
-            F.when(F.rand(args.seed + 1) < F.lit(0.50), F.lit("control")).otherwise(F.lit("treatment"))
+            F.when(hash_uniform(seed, dt_str, "variant", *key) < F.lit(0.50), F.lit("control")).otherwise(F.lit("treatment"))
         )
 
     # Assignment time within the day
     # Note: use seconds offset into the day for realism
     candidates = candidates.withColumn(
         "assignment_time_utc",
-        F.expr(f"timestampadd(SECOND, cast(rand({args.seed + 2}) * 86399 as int), timestamp'{dt_start.isoformat()}')")
+        seconds_after(F.lit(dt_start).cast("timestamp"), hash_uniform(seed, dt_str, "assignment_time", *key), 86399)
     )
 
     fact_assignment = (
@@ -189,13 +558,16 @@ def main() -> None:
     # Only some assigned users get exposed
     fact_exposure = (
         fact_assignment
-        .withColumn("is_exposed", (F.rand(args.seed + 3) < F.lit(float(args.exposure_rate))).cast("boolean"))
+        .withColumn(
+            "is_exposed",
+            (hash_uniform(seed, dt_str, "exposed", *key) < F.lit(float(args.exposure_rate))).cast("boolean")
+        )
         .filter(F.col("is_exposed") == F.lit(True))
         .drop("is_exposed")
         # Exposure occurs after assignment, up to +6 hours
         .withColumn(
             "exposure_time_utc",
-            F.expr(f"timestampadd(SECOND, cast(rand({args.seed + 4}) * 21600 as int), assignment_time_utc)")
+            seconds_after(F.col("assignment_time_utc"), hash_uniform(seed, dt_str, "exposure_time", *key), 21600)
         )
         .withColumn("exposure_event_type", F.lit("feature_rendered"))
         .withColumn("dt", F.lit(dt_str))
@@ -229,53 +601,88 @@ def main() -> None:
         ).otherwise(F.lit(float(args.conversion_rate)))
     )
 
-    # One conversion per user max (for clarity)
+    # Whether the user converts; heavy users (zipf) then make several purchases
     base = base.withColumn(
         "did_convert",
-        (F.rand(args.seed + 5) < F.col("p_convert")).cast("boolean")
+        (hash_uniform(seed, dt_str, "convert", *key) < F.col("p_convert")).cast("boolean")
     )
 
     # Create some generic engagement events (e.g., click/page_view)
-    # 1..5 events per exposed user
+    # 1..5 events per exposed user, or a Zipf tail drawn per user (same heavy users in every experiment)
+    if profile["event_counts"] == "zipf":
+        u = hash_uniform(seed, dt_str, "n_events", F.col("user_id"))
+        n_events = zipf_count(u, profile["zipf_alpha"], profile["max_events_per_user"])
+        u = hash_uniform(seed, dt_str, "n_purchases", F.col("user_id"))
+        n_purchases = zipf_count(u, profile["zipf_alpha"], profile["max_events_per_user"])
+    else:
+        n_events = F.floor(hash_uniform(seed, dt_str, "n_events", *key) * 5) + F.lit(1)
+        n_purchases = F.lit(1)
+
     engagement = (
         base
-        .withColumn("n_events", (F.floor(F.rand(args.seed + 6) * 5) + F.lit(1)).cast("int"))
+        .withColumn("n_events", n_events.cast("int"))
         .select("experiment_id", "user_id", "variant_id", "analysis_start_time_utc", "n_events", "dt")
         .withColumn("seq", F.explode(F.sequence(F.lit(1), F.col("n_events"))))
         .withColumn(
             "event_time_utc",
-            F.expr(f"timestampadd(SECOND, cast(rand({args.seed + 7}) * 14400 as int), analysis_start_time_utc)")
+            seconds_after(
+                F.col("analysis_start_time_utc"),
+                hash_uniform(seed, dt_str, "event_time", *key, F.col("seq")),
+                14400,
+            )
         )
         .withColumn(
             "event_type",
             F.when(F.col("seq") % 2 == 0, F.lit("page_view")).otherwise(F.lit("click"))
         )
         .withColumn("revenue", F.lit(None).cast("double"))
-        .drop("n_events", "seq")
+        .drop("n_events")
     )
 
-    # Conversion events (optional, only if did_convert)
+    # Conversion events (optional, only if did_convert): purchase seq 0 is the first
+    # conversion; later purchases (seq >= 1) draw time and revenue from their own seq
+    purchase_key = [*key, F.col("seq")]
     conversions = (
         base
         .filter(F.col("did_convert") == F.lit(True))
+        .withColumn("seq", F.explode(F.sequence(F.lit(0), n_purchases.cast("int") - F.lit(1))))
         .withColumn(
             "event_time_utc",
-            F.expr(f"timestampadd(SECOND, cast(rand({args.seed + 8}) * 14400 as int), analysis_start_time_utc)")
+            seconds_after(
+                F.col("analysis_start_time_utc"),
+                F.when(F.col("seq") == 0, hash_uniform(seed, dt_str, "conversion_time", *key))
+                .otherwise(hash_uniform(seed, dt_str, "conversion_time", *purchase_key)),
+                14400,
+            )
         )
         .withColumn("event_type", F.lit("purchase"))
         # revenue: lognormal-ish approximation via exp(randn)
-        .withColumn("revenue", F.round(F.exp(F.randn(args.seed + 9)) * F.lit(30.0), 2))
-        .select("experiment_id", "user_id", "variant_id", "event_time_utc", "event_type", "revenue", "dt")
+        .withColumn(
+            "revenue",
+            F.round(
+                F.exp(
+                    F.when(F.col("seq") == 0, hash_normal(seed, dt_str, "revenue", *key))
+                    .otherwise(hash_normal(seed, dt_str, "revenue", *purchase_key))
+                ) * F.lit(30.0),
+                2,
+            ),
+        )
+        .select("experiment_id", "user_id", "variant_id", "event_time_utc", "event_type", "revenue", "seq", "dt")
     )
 
+    event_key = [*key, F.col("event_type"), F.col("seq")]
+    ingest_u = hash_uniform(seed, dt_str, "ingest_time", *event_key)
     fact_event = (
         engagement
         .unionByName(conversions, allowMissingColumns=True)
-        .withColumn("event_id", F.expr("uuid()"))
-        # ingest_time slightly after event_time
+        .withColumn("event_id", hash_event_id(seed, dt_str, *event_key))
+        # ingest_time slightly after event_time; late arrivals (--profile) up to max_ingest_lag_hours
         .withColumn(
             "ingest_time_utc",
-            F.expr(f"timestampadd(SECOND, cast(rand({args.seed + 10}) * 600 as int), event_time_utc)")
+            F.when(
+                hash_uniform(seed, dt_str, "late_ingest", *event_key) < F.lit(float(profile["late_ingest_rate"])),
+                seconds_after(F.col("event_time_utc"), ingest_u, profile["max_ingest_lag_hours"] * 3600),
+            ).otherwise(seconds_after(F.col("event_time_utc"), ingest_u, 600))
         )
         .select(
             "event_id",
@@ -290,21 +697,70 @@ def main() -> None:
         )
     )
 
-    # -----------------------------
-    # 6) Write outputs
-    # -----------------------------
-    write_parquet(dim_experiment, f"{base_out}/dim_experiment/dt={dt_str}")
-    write_parquet(dim_experiment_variant, f"{base_out}/dim_experiment_variant/dt={dt_str}")
-    write_parquet(fact_assignment, f"{base_out}/fact_assignment/dt={dt_str}")
-    write_parquet(fact_exposure, f"{base_out}/fact_exposure/dt={dt_str}")
-    write_parquet(fact_event, f"{base_out}/fact_event/dt={dt_str}")
+    # Retries are added last so exposures and events are still derived from one row per key
+    fact_assignment = add_retries(
+        fact_assignment, seed, dt_str, "assignment", "assignment_time_utc", profile["assignment_dup_rate"], profile
+    )
+    fact_exposure = add_retries(
+        fact_exposure, seed, dt_str, "exposure", "exposure_time_utc", profile["exposure_dup_rate"], profile
+    )
+    fact_exposure = add_hot_key_exposures(fact_exposure, seed, dt_str, profile)
+
+    return {
+        "dim_experiment": dim_experiment,
+        "dim_experiment_variant": dim_experiment_variant,
+        "fact_assignment": fact_assignment,
+        "fact_exposure": fact_exposure,
+        "fact_event": fact_event,
+    }
+
+
+def main() -> None:
+    args = parse_args()
+    base_out = args.out.rstrip("/")
+    dts = [args.dt] if args.dt else iter_dts(args.start_dt, args.end_dt)
+    shard = parse_shard(args.shard)
+
+    rows = estimate_rows(args) * len(dts)
+    spark = spark_session.build_session(
+        "experimentation-analytics-platform-generate-data",
+        estimated_rows=rows,
+        estimated_bytes=rows * BYTES_PER_ROW,
+    )
+    recorder = run_metrics.RunMetrics("00_generate_data", dts[0])
+    recorder.attach(spark)
+
+    try:
+        for dt_str in dts:
+            day_args = argparse.Namespace(**{**vars(args), "dt": dt_str})
+            tables = generate(spark, day_args, shard=shard)
+
+            # -----------------------------
+            # 6) Write outputs (generation is lazy and runs inside each write)
+            # -----------------------------
+            for name in RAW_TABLES:
+                # dimensions are identical in every shard; only shard 0 writes them
+                if name.startswith("dim_") and shard[0] != 0:
+                    continue
+                path = f"{base_out}/{name}/dt={dt_str}"
+                with recorder.stage(f"write_{name}", dt=dt_str):
+                    if shard[1] > 1 and not name.startswith("dim_"):
+                        write_parquet_shard(tables[name], path, shard)
+                    else:
+                        write_parquet(tables[name], path)
+    finally:
+        if not args.no_run_metrics:
+            recorder.write(args.run_metrics_path)
 
     print("✅ Generated synthetic experimentation data")
-    print(f"dt: {dt_str}")
+    print(f"dt: {dts[0]}" if len(dts) == 1 else f"dt: {dts[0]}..{dts[-1]} ({len(dts)} days)")
+    print(f"shard: {shard[0]}/{shard[1]}")
     print(f"out: {base_out}")
     print(f"users: {args.users}")
     print(f"experiments: {args.experiments}")
     print(f"srm_break: {args.srm_break}")
+    print(f"profile: {args.profile}")
+    print(f"stages: {recorder.summary()}")
 
     spark.stop()
 
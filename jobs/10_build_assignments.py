@@ -8,11 +8,52 @@ Reads:
 Writes:
 - data/silver/fact_assignment_canonical/dt=YYYY-MM-DD
 - data/silver/metrics_assignment_quality/dt=YYYY-MM-DD
+- with --incremental:
+  - data/silver/metrics_assignment_merge/dt=YYYY-MM-DD
+  - data/silver/_state/assignment_key_index/dt=YYYY-MM-DD (state delta, periodic
+    snapshots under _compacted/, see assignment_key_index.py)
+  - superseded rows are removed from earlier fact_assignment_canonical partitions
+- data/silver/run_metrics/dt=YYYY-MM-DD (stage metrics, see run_metrics.py)
 
 Key guarantees:
 - exactly one row per (experiment_id, user_id)
 - deterministic choice when duplicates exist (earliest assignment_time_utc wins)
 
+Modes:
+- single_pass (default): one groupBy over (experiment_id, user_id) yields both the
+  duplicate diagnostics and the canonical row (min over a struct ordered by
+  assignment_time_utc, variant_id). Uniqueness holds by construction, so the raw
+  partition is scanned and shuffled exactly once.
+- legacy: row_number() window plus separate count actions and a post-hoc
+  uniqueness check. Kept for comparison and debugging.
+
+Incremental (--incremental, spark engine):
+- dedupes across days, not just within dt. A key index holds the earliest
+  (experiment_id, user_id) -> (assignment_time_utc, variant_id) seen so far, stored
+  as a log of per-dt deltas that only contain keys that were new or improved that day,
+  compacted into a snapshot every --compact_after deltas so a run reads one snapshot
+  and at most that many deltas.
+- the day's canonical rows are merged against the index entries for the day's keys
+  only (semi-join on the key columns). fact_assignment_canonical/dt then holds only new
+  keys and keys whose canonical row moved earlier; unchanged re-assignments are dropped.
+  Merge counts go to metrics_assignment_merge.
+- a key whose canonical row moved earlier is removed from the partition that held its
+  previous row (the index records that partition), so fact_assignment_canonical keeps
+  exactly one row per key across all dt partitions. Each touched partition is rewritten
+  in a staging directory and swapped in; the delta records it as superseded_dt.
+- deltas of dt >= the run date are ignored, so re-running the latest day is safe;
+  after re-running an earlier day, re-run the days after it in order.
+
+Layout:
+- --layout bucketed (spark engine) writes fact_assignment_canonical bucketed and sorted
+  by (experiment_id, user_id) with a _layout.json manifest (see silver_layout.py), so
+  job 20 joins it without shuffling the assignment side.
+
+Engines:
+- spark (default): the modes above.
+- duckdb: same canonicalization rule and metrics in-process, for single-node days,
+  backfills and CI. Output schemas match the Spark engine (see duckdb_engine.py).
+
 Why this job exists:
 - In real systems, assignment logs are often duplicated due to retries, fan-out, or bugs.
 - Canonicalization makes downstream analysis safe and reproducible.
@@ -20,61 +61,87 @@ Why this job exists:
 
 import argparse
 
-from pyspark.sql import SparkSession
+import assignment_key_index
+import duckdb_engine
+import run_metrics
+import silver_layout
+import spark_session
+from pyspark import StorageLevel
+from pyspark.sql import DataFrame, SparkSession
 from pyspark.sql import functions as F
 from pyspark.sql.window import Window
 
+KEY_COLS = ["experiment_id", "user_id"]
+
+EXPECTED_COLS = {
+    "experiment_id",
+    "user_id",
+    "variant_id",
+    "assignment_time_utc",
+    "assignment_source",
+    "dt",
+}
+
 
 def parse_args() -> argparse.Namespace:
     p = argparse.ArgumentParser()
     p.add_argument("--dt", required=True, help="Partition date, e.g. 2026-02-01")
     p.add_argument("--in", dest="in_path", default="data/raw", help="Base input path (default: data/raw)")
     p.add_argument("--out", dest="out_path", default="data/silver", help="Base output path (default: data/silver)")
-    return p.parse_args()
+    p.add_argument(
+        "--mode",
+        choices=["single_pass", "legacy"],
+        default="single_pass",
+        help="single_pass: one grouped shuffle for diagnostics + canonical rows; legacy: window + separate counts",
+    )
+    p.add_argument("--engine", choices=["spark", "duckdb"], default="spark", help="Execution engine (default: spark)")
+    p.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Dedupe across days against the key index and emit only new or changed keys (spark engine)",
+    )
+    p.add_argument(
+        "--state",
+        dest="state_path",
+        default=None,
+        help="Key index root (default: <out>/_state/assignment_key_index)",
+    )
+    p.add_argument(
+        "--compact_after",
+        type=int,
+        default=assignment_key_index.DEFAULT_COMPACT_AFTER,
+        help="Snapshot the key index once this many deltas follow the last snapshot; 0 never compacts "
+        f"(default: {assignment_key_index.DEFAULT_COMPACT_AFTER})",
+    )
+    silver_layout.add_layout_args(p)
+    run_metrics.add_run_metrics_args(p)
+    args = p.parse_args()
+    if args.incremental and args.engine != "spark":
+        p.error("--incremental requires --engine spark")
+    if args.layout == "bucketed" and args.engine != "spark":
+        p.error("--layout bucketed requires --engine spark")
+    return args
 
 
 def write_parquet(df, path: str) -> None:
     df.write.mode("overwrite").parquet(path)
 
 
-def main() -> None:
-    args = parse_args()
-    dt = args.dt
-    in_base = args.in_path.rstrip("/")
-    out_base = args.out_path.rstrip("/")
-
-    spark = (
-        SparkSession.builder
-        .appName("experimentation-analytics-platform-build-assignments")
-        .master("local[*]")
-        .getOrCreate()
-    )
-    spark.sparkContext.setLogLevel("WARN")
-
-    in_path = f"{in_base}/fact_assignment/dt={dt}"
-    raw = spark.read.parquet(in_path)
-
-    # -----------------------------
-    # 1) Basic validation of expected columns
-    # -----------------------------
-    expected_cols = {
-        "experiment_id",
-        "user_id",
-        "variant_id",
-        "assignment_time_utc",
-        "assignment_source",
-        "dt",
-    }
-    missing = sorted(list(expected_cols - set(raw.columns)))
+def require_columns(raw: DataFrame) -> None:
+    missing = sorted(list(EXPECTED_COLS - set(raw.columns)))
     if missing:
         raise ValueError(f"Missing required columns in raw assignments: {missing}")
 
-    # -----------------------------
-    # 2) Compute duplicate diagnostics BEFORE canonicalization
-    # -----------------------------
+
+def canonicalize_legacy(raw: DataFrame) -> tuple[DataFrame, dict]:
+    """
+    Window-based canonicalization with separate diagnostic actions.
+
+    Triggers one Spark action per diagnostic plus a post-hoc uniqueness check.
+    """
     # duplicates = count(*) - 1 for each (experiment_id, user_id) where count(*) > 1
     per_key = (
-        raw.groupBy("experiment_id", "user_id")
+        raw.groupBy(*KEY_COLS)
         .agg(F.count(F.lit(1)).alias("rows_per_key"))
     )
 
@@ -90,13 +157,10 @@ def main() -> None:
     if duplicate_rows_excess is None:
         duplicate_rows_excess = 0
 
-    # -----------------------------
-    # 3) Canonicalization rule (deterministic)
-    # -----------------------------
     # Keep the earliest assignment_time_utc per (experiment_id, user_id).
     # If tie exists, use variant_id as a deterministic tie-breaker.
     w = (
-        Window.partitionBy("experiment_id", "user_id")
+        Window.partitionBy(*KEY_COLS)
         .orderBy(F.col("assignment_time_utc").asc(), F.col("variant_id").asc())
     )
 
@@ -108,26 +172,89 @@ def main() -> None:
     )
 
     # Sanity check: canonical must have exactly one row per key
-    canonical_keys = canonical.groupBy("experiment_id", "user_id").agg(F.count(F.lit(1)).alias("c"))
+    canonical_keys = canonical.groupBy(*KEY_COLS).agg(F.count(F.lit(1)).alias("c"))
     bad = canonical_keys.filter(F.col("c") != F.lit(1)).count()
     if bad != 0:
         raise RuntimeError("Canonicalization failed: found keys with count != 1")
 
-    # -----------------------------
-    # 4) Write outputs
-    # -----------------------------
-    out_canonical = f"{out_base}/fact_assignment_canonical/dt={dt}"
-    write_parquet(canonical, out_canonical)
+    stats = {
+        "raw_rows": int(total_rows),
+        "unique_keys": int(total_keys),
+        "duplicate_keys_count": int(duplicate_keys_count),
+        "duplicate_rows_excess": int(duplicate_rows_excess),
+    }
+    return canonical, stats
+
+
+def canonicalize_single_pass(raw: DataFrame) -> tuple[DataFrame, dict]:
+    """
+    Canonicalization and duplicate diagnostics from a single grouped pass.
+
+    The canonical row is min(struct(assignment_time_utc, variant_id, ...)) per key,
+    which matches the legacy window ordering and falls back to the remaining
+    columns for full ties instead of an arbitrary row. The grouped result is
+    persisted so the diagnostics and the canonical write share one shuffle.
+    """
+    payload_cols = ["assignment_time_utc", "variant_id"] + [
+        c for c in raw.columns if c not in KEY_COLS and c not in ("assignment_time_utc", "variant_id")
+    ]
+
+    per_key = (
+        raw.groupBy(*KEY_COLS)
+        .agg(
+            F.count(F.lit(1)).alias("rows_per_key"),
+            F.min(F.struct(*payload_cols)).alias("canonical"),
+        )
+        .persist(StorageLevel.MEMORY_AND_DISK)
+    )
+
+    row = (
+        per_key.agg(
+            F.sum("rows_per_key").alias("raw_rows"),
+            F.count(F.lit(1)).alias("unique_keys"),
+            F.sum(F.when(F.col("rows_per_key") > F.lit(1), F.lit(1)).otherwise(F.lit(0))).alias("duplicate_keys_count"),
+            F.sum(F.col("rows_per_key") - F.lit(1)).alias("duplicate_rows_excess"),
+        )
+        .collect()[0]
+    )
 
+    # Grouping by the key guarantees one row per (experiment_id, user_id);
+    # no second groupBy is needed to prove uniqueness.
+    canonical = (
+        per_key
+        .select(*KEY_COLS, "canonical.*")
+        .select(*raw.columns)
+    )
+
+    stats = {
+        "raw_rows": int(row["raw_rows"] or 0),
+        "unique_keys": int(row["unique_keys"] or 0),
+        "duplicate_keys_count": int(row["duplicate_keys_count"] or 0),
+        "duplicate_rows_excess": int(row["duplicate_rows_excess"] or 0),
+    }
+    return canonical, stats
+
+
+def canonicalize(raw: DataFrame, mode: str) -> tuple[DataFrame, dict]:
+    require_columns(raw)
+
+    # Canonicalization rule (deterministic): earliest assignment_time_utc per
+    # (experiment_id, user_id), variant_id as tie-breaker.
+    if mode == "legacy":
+        return canonicalize_legacy(raw)
+    return canonicalize_single_pass(raw)
+
+
+def build_metrics(spark: SparkSession, dt: str, stats: dict) -> DataFrame:
     # A small metrics table that later feeds rpt_experiment_quality
-    metrics = spark.createDataFrame(
+    return spark.createDataFrame(
         [
             (
                 dt,
-                total_rows,
-                total_keys,
-                int(duplicate_keys_count),
-                int(duplicate_rows_excess),
+                stats["raw_rows"],
+                stats["unique_keys"],
+                stats["duplicate_keys_count"],
+                stats["duplicate_rows_excess"],
             )
         ],
         [
@@ -139,19 +266,262 @@ def main() -> None:
         ],
     ).withColumn("generated_at_utc", F.current_timestamp())
 
+
+def merge_incremental(
+    spark: SparkSession, canonical: DataFrame, state_path: str, dt: str
+) -> tuple[DataFrame, DataFrame, dict]:
+    """
+    Merge the day's canonical rows into the key index.
+
+    Returns (rows to emit, index delta for dt, merge stats). A key is emitted when it
+    is new or when the day's (assignment_time_utc, variant_id) is earlier than the
+    indexed one; the earliest-wins rule is the same as within a day. The delta carries
+    superseded_dt, the partition holding a changed key's previous canonical row.
+    """
+    canonical = canonical.persist(StorageLevel.MEMORY_AND_DISK)
+    known = assignment_key_index.read_index(spark, state_path, dt, canonical.select(*KEY_COLS))
+
+    if known is None:
+        merged = (
+            canonical.withColumn("merge_status", F.lit("new"))
+            .withColumn("superseded_dt", F.lit(None).cast("string"))
+        )
+    else:
+        day_row = F.struct("assignment_time_utc", "variant_id")
+        known_row = F.struct(
+            F.col("known_time").alias("assignment_time_utc"), F.col("known_variant").alias("variant_id")
+        )
+        merged = (
+            canonical.join(
+                known.select(
+                    *KEY_COLS,
+                    F.col("assignment_time_utc").alias("known_time"),
+                    F.col("variant_id").alias("known_variant"),
+                    "canonical_dt",
+                ),
+                KEY_COLS,
+                "left",
+            )
+            .withColumn(
+                "merge_status",
+                F.when(F.col("known_time").isNull(), F.lit("new"))
+                .when(day_row < known_row, F.lit("changed"))
+                .otherwise(F.lit("unchanged")),
+            )
+            .withColumn(
+                "superseded_dt",
+                F.when(F.col("merge_status") == F.lit("changed"), F.col("canonical_dt")),
+            )
+            .drop("known_time", "known_variant", "canonical_dt")
+        )
+    merged = merged.persist(StorageLevel.MEMORY_AND_DISK)
+
+    row = (
+        merged.agg(
+            F.count(F.lit(1)).alias("day_keys"),
+            F.sum(F.when(F.col("merge_status") == F.lit("new"), F.lit(1)).otherwise(F.lit(0))).alias("new_keys"),
+            F.sum(F.when(F.col("merge_status") == F.lit("changed"), F.lit(1)).otherwise(F.lit(0))).alias("changed_keys"),
+        )
+        .collect()[0]
+    )
+    day_keys = int(row["day_keys"] or 0)
+    new_keys = int(row["new_keys"] or 0)
+    changed_keys = int(row["changed_keys"] or 0)
+    merge_stats = {
+        "day_keys": day_keys,
+        "new_keys": new_keys,
+        "changed_keys": changed_keys,
+        "unchanged_keys": day_keys - new_keys - changed_keys,
+    }
+
+    emitted = merged.filter(F.col("merge_status") != F.lit("unchanged"))
+    delta = emitted.select(*KEY_COLS, "assignment_time_utc", "variant_id", "superseded_dt")
+    return emitted.select(*canonical.columns), delta, merge_stats
+
+
+def drop_superseded(spark: SparkSession, delta: DataFrame, canonical_root: str) -> list[str]:
+    """
+    Remove changed keys from the partitions that held their previous canonical row.
+
+    Each touched partition keeps its layout and is rewritten in a staging directory, then
+    swapped in. Returns the partitions rewritten.
+    """
+    superseded = delta.filter(F.col("superseded_dt").isNotNull()).select(*KEY_COLS, "superseded_dt")
+    days = sorted(r["superseded_dt"] for r in superseded.select("superseded_dt").distinct().collect())
+    for day in days:
+        path = f"{canonical_root}/dt={day}"
+        layout = silver_layout.read_layout(path) or {"layout": "plain", "bucket_count": silver_layout.DEFAULT_BUCKETS}
+        keys = superseded.filter(F.col("superseded_dt") == F.lit(day)).select(*KEY_COLS)
+        kept = spark.read.parquet(path).join(keys, KEY_COLS, "left_anti")
+        staged = silver_layout.staging_path(path, "superseded")
+        silver_layout.write_table(kept, staged, layout["layout"], layout["bucket_count"])
+        silver_layout.swap_in(staged, path)
+    return days
+
+
+def build_merge_metrics(spark: SparkSession, dt: str, merge_stats: dict) -> DataFrame:
+    return spark.createDataFrame(
+        [
+            (
+                dt,
+                merge_stats["day_keys"],
+                merge_stats["new_keys"],
+                merge_stats["changed_keys"],
+                merge_stats["unchanged_keys"],
+            )
+        ],
+        ["dt", "day_keys", "new_keys", "changed_keys", "unchanged_keys"],
+    ).withColumn("generated_at_utc", F.current_timestamp())
+
+
+def run_duckdb(dt: str, in_path: str, out_canonical: str, out_metrics: str) -> dict:
+    """
+    DuckDB engine: same rule as single_pass (earliest assignment_time_utc, then
+    variant_id, remaining columns for full ties; nulls first like Spark's struct min).
+    """
+    con = duckdb_engine.connect()
+    duckdb_engine.register_parquet(con, in_path, "raw_assignments")
+
+    raw_cols = [r[0] for r in con.execute("describe raw_assignments").fetchall()]
+    missing = sorted(EXPECTED_COLS - set(raw_cols))
+    if missing:
+        raise ValueError(f"Missing required columns in raw assignments: {missing}")
+
+    payload_cols = ["assignment_time_utc", "variant_id"] + [
+        c for c in raw_cols if c not in KEY_COLS and c not in ("assignment_time_utc", "variant_id")
+    ]
+    order_by = ", ".join(f"{c} asc nulls first" for c in payload_cols)
+
+    con.execute(f"""
+        create temp table canonical as
+        select
+            * replace (cast(assignment_time_utc as timestamptz) as assignment_time_utc)
+            , count(*) over (partition by experiment_id, user_id) as rows_per_key
+        from raw_assignments
+        qualify row_number() over (partition by experiment_id, user_id order by {order_by}) = 1
+    """)
+
+    raw_rows, unique_keys, duplicate_keys_count, duplicate_rows_excess = con.execute("""
+        select
+            coalesce(sum(rows_per_key), 0)
+            , count(*)
+            , count(*) filter (where rows_per_key > 1)
+            , coalesce(sum(rows_per_key - 1), 0)
+        from canonical
+    """).fetchone()
+    stats = {
+        "raw_rows": int(raw_rows),
+        "unique_keys": int(unique_keys),
+        "duplicate_keys_count": int(duplicate_keys_count),
+        "duplicate_rows_excess": int(duplicate_rows_excess),
+    }
+
+    duckdb_engine.write_parquet(con, f"select {', '.join(raw_cols)} from canonical", out_canonical)
+    duckdb_engine.write_parquet(
+        con,
+        f"""
+        select
+            '{dt}' as dt
+            , cast({stats['raw_rows']} as bigint) as raw_rows
+            , cast({stats['unique_keys']} as bigint) as unique_keys
+            , cast({stats['duplicate_keys_count']} as bigint) as duplicate_keys_count
+            , cast({stats['duplicate_rows_excess']} as bigint) as duplicate_rows_excess
+            , current_timestamp as generated_at_utc
+        """,
+        out_metrics,
+    )
+    con.close()
+    return stats
+
+
+def run_spark(args: argparse.Namespace, in_path: str, out_canonical: str, out_metrics: str) -> dict:
+    spark = spark_session.build_session("experimentation-analytics-platform-build-assignments", [in_path])
+    recorder = args.run_metrics
+    recorder.attach(spark)
+
+    raw = spark.read.parquet(in_path)
+
+    # Column validation, duplicate diagnostics + canonicalization
+    with recorder.stage("dedupe"):
+        canonical, stats = canonicalize(raw, args.mode)
+
+    if args.incremental:
+        with recorder.stage("merge"):
+            canonical, delta, merge_stats = merge_incremental(spark, canonical, args.state_path, args.dt)
+        stats = {**stats, **merge_stats}
+
+    with recorder.stage("write_canonical"):
+        silver_layout.write_table(canonical, out_canonical, args.layout, args.buckets)
+        if args.incremental:
+            delta = delta.persist(StorageLevel.MEMORY_AND_DISK)
+            stats["superseded_partitions"] = drop_superseded(spark, delta, out_canonical.rsplit("/dt=", 1)[0])
+    with recorder.stage("write_metrics"):
+        write_parquet(build_metrics(spark, args.dt, stats), out_metrics)
+
+        if args.incremental:
+            write_parquet(build_merge_metrics(spark, args.dt, merge_stats), args.out_merge_metrics)
+            # The index delta goes last: a failed run leaves the index as it was, and the
+            # re-run finds the same changed keys (their superseded rows are already gone)
+            assignment_key_index.write_delta(delta, args.state_path, args.dt)
+    if args.incremental:
+        with recorder.stage("compact_index"):
+            stats["index_compacted"] = assignment_key_index.compact(
+                spark, args.state_path, args.dt, args.compact_after
+            )
+
+    spark.stop()
+    return stats
+
+
+def main() -> None:
+    args = parse_args()
+    dt = args.dt
+    in_base = args.in_path.rstrip("/")
+    out_base = args.out_path.rstrip("/")
+
+    in_path = f"{in_base}/fact_assignment/dt={dt}"
+    out_canonical = f"{out_base}/fact_assignment_canonical/dt={dt}"
     out_metrics = f"{out_base}/metrics_assignment_quality/dt={dt}"
-    write_parquet(metrics, out_metrics)
+    args.out_merge_metrics = f"{out_base}/metrics_assignment_merge/dt={dt}"
+    args.state_path = (args.state_path or f"{out_base}/_state/assignment_key_index").rstrip("/")
+    args.run_metrics = run_metrics.RunMetrics("10_build_assignments", dt, args.engine)
 
     # -----------------------------
-    # 5) Print a short operator-friendly summary
+    # 1) Canonicalize + write outputs
+    # -----------------------------
+    try:
+        if args.engine == "duckdb":
+            with args.run_metrics.stage("canonicalize"):
+                stats = run_duckdb(dt, in_path, out_canonical, out_metrics)
+        else:
+            stats = run_spark(args, in_path, out_canonical, out_metrics)
+    finally:
+        if not args.no_run_metrics:
+            args.run_metrics.write(args.run_metrics_path)
+
+    # -----------------------------
+    # 2) Print a short operator-friendly summary
     # -----------------------------
     print("✅ Built canonical assignments (Silver)")
     print(f"dt: {dt}")
+    print(f"engine: {args.engine}" + (f" ({args.mode})" if args.engine == "spark" else ""))
     print(f"input:  {in_path}")
     print(f"output: {out_canonical}")
-    print(f"raw_rows={total_rows} unique_keys={total_keys} dup_keys={duplicate_keys_count} dup_rows_excess={duplicate_rows_excess}")
-
-    spark.stop()
+    print(
+        f"raw_rows={stats['raw_rows']} unique_keys={stats['unique_keys']} "
+        f"dup_keys={stats['duplicate_keys_count']} dup_rows_excess={stats['duplicate_rows_excess']}"
+    )
+    if args.incremental:
+        print(f"state:  {args.state_path}")
+        print(
+            f"day_keys={stats['day_keys']} new_keys={stats['new_keys']} "
+            f"changed_keys={stats['changed_keys']} unchanged_keys={stats['unchanged_keys']}"
+        )
+        print(
+            f"superseded partitions rewritten: {', '.join(stats['superseded_partitions']) or 'none'}; "
+            f"index compacted: {stats['index_compacted']}"
+        )
+    print(f"stages: {args.run_metrics.summary()}")
 
 
 if __name__ == "__main__":
@@ -9,20 +9,125 @@ Reads:
 Writes:
 - data/silver/int_experiment_exposures_deduped/dt=YYYY-MM-DD
 - data/silver/int_experiment_exposure_validation/dt=YYYY-MM-DD
+- data/silver/metrics_exposure_skew/dt=YYYY-MM-DD (spark engine, when skew detection runs)
+- data/silver/run_metrics/dt=YYYY-MM-DD (stage metrics, see run_metrics.py)
 - data/gold/fct_experiment_quality_metrics_daily/dt=YYYY-MM-DD
 
 Key guarantees:
 - exactly one row per (experiment_id, user_id) in exposure validation
 - deterministic dedupe of exposure events
 - exposure timing and variant integrity are auditable
+
+Modes:
+- single_pass (default): exposures are clustered once by (experiment_id, user_id);
+  the per-variant dedupe and the per-key stats (first exposure via a struct min,
+  event/variation counts) are aggregations on that clustering, followed by a
+  single join to assignments. One shuffle per input.
+- legacy: dedupe window, separate exposure_stats groupBy, two joins and a
+  second row_number() window for the first exposure.
+
+Skew handling (--skew_handling auto|on|off, spark engine):
+- auto skips detection (no sample pass, no metrics_exposure_skew write) when the
+  uncompressed exposure input is under --skew_min_input_mb. The default, 1024 MB, is
+  eight of spark_session's 128 MB target partitions: below it the whole shuffle is a
+  handful of tasks, so even a key holding all the rows costs at most one partition's
+  time, less than the extra sample pass
+- heavy hitters are detected from a sample of the raw exposures (--skew_sample_fraction):
+  per-key counts are scaled up and keys above --skew_threshold_rows are hot; the top
+  experiment's share of exposures is reported too. The default, 10,000 rows, is ~100
+  sampled rows at the default 1% sample, enough for an estimate within ~10% (Poisson),
+  and twice the generator's heaviest retrying users (heavy_users caps retries at 5,000
+  copies per key), so only bot-like keys qualify (the generator's hot_keys profile)
+- on the skew path (hot keys found with auto, always with on) single_pass dedupes with
+  a plain groupBy instead of clustering raw rows first, so partial aggregation collapses
+  a hot key's rows map-side and only deduped rows (<= 1 per variant) reach the shuffle;
+  the rollup and join then see at most one row per key
+- in --rolling, the raw exposure x assignment-day join is split: hot keys join a
+  broadcast of their assignment rows, the rest join normally
+- per-run stats go to metrics_exposure_skew; legacy mode keeps its windows
+
+Rolling window (--rolling, spark engine):
+- exposures can arrive up to --max_days_after_assignment days after the assignment,
+  so a dt run reads the assignment and exposure partitions in [dt - max_days, dt]
+  (explicit dt= paths; older exposure partitions are never listed or scanned)
+- a key assigned on several days of the window keeps its earliest assignment (the
+  job 10 --incremental rule), so validation stays one row per key; keys first assigned
+  before the window are dropped, so the earliest assignment does not depend on which
+  partitions the window covers. Assignments before the window are looked up in job
+  10's key index (--assignment_index) for the window's keys only: one snapshot and a
+  bounded number of deltas, never the older canonical partitions. --rolling therefore
+  needs job 10 to run with --incremental
+- each assignment day A in the window is matched with exposures of days [A, A + max_days]
+- only assignment days whose window changed (A = dt, or keys exposed on dt) are
+  recomputed; their validation and gold quality partitions are overwritten one dt
+  directory at a time
+- the deduped dt partition holds every exposure of dt, deduped as in a non-rolling run
+
+Superseded keys (spark engine, after job 10 --incremental):
+- when job 10 moves a key's canonical row earlier, it removes the old row from the
+  partition that held it and records that partition in the key index delta of dt
+  (superseded_dt, see assignment_key_index.py)
+- the dt run drops those keys from the validation partitions of their superseded days
+  and recomputes the gold quality partitions of those days, so validation keeps one
+  row per key across dt partitions. In --rolling, superseded days inside the window
+  are rewritten with the other affected days instead
+
+Late exposures (--late_exposures PATH, spark engine):
+- patches an already-built dt with a batch of late raw exposures instead of a full rerun
+- only the batch's (experiment_id, user_id) keys are revalidated, against the dt's raw
+  exposures for those keys plus the batch (the batch may or may not already be landed
+  in raw; identical rows dedupe to the same exposure_event_id)
+- the silver validation and deduped-exposure partitions swap in the new rows for those
+  keys; the gold partition recomputes only the touched (experiment_id, date_day) rows
+- each patched partition is staged under an underscore-prefixed sibling directory
+  and renamed into place once all three are written
+
+--check_equivalence additionally builds the legacy output and fails the run if
+the deduped exposures or the validation table differ from the selected mode.
+
+Layout (--layout bucketed, spark engine):
+- silver outputs are bucketed and sorted by (experiment_id, user_id) with a _layout.json
+  manifest (see silver_layout.py); bucketed canonical assignments from job 10 are read
+  as a bucketed table, so the join to the exposure rollup plans no Exchange on the
+  assignment side
+
+Surrogate keys:
+- run on encoded raw tables (key_dictionary.py, --in data/raw_encoded) to carry integer
+  experiment/user/variant keys through dedupe and joins; --key_dictionary decodes them
+  back to string ids as the silver and gold tables are written, so the dbt sources see
+  the same string ids (and accepted variant values) as a run on data/raw. Gold is
+  aggregated from the decoded validation rows. Event ids hash the keys as read, so
+  their values differ from a data/raw run's.
+- --exposure_event_id xxhash64 (spark engine) replaces the 256-bit sha2 hex id with a
+  64-bit hash of the same fields, and audits the batch for collisions (distinct ids vs
+  distinct hashed tuples) before anything is written. The audit covers the ids in a
+  --event_id_audit_rate slice of the hash space (default 1%; 1 audits every id, 0 skips).
+  Silver stores the hash as a decimal string, keeping the string event id columns.
+
+Engines:
+- spark (default): the modes above.
+- duckdb: same dedupe, validation and daily-metric logic in-process, for
+  single-node days, backfills and CI. Output schemas match the Spark engine
+  (see duckdb_engine.py).
 """
 
 import argparse
+import os
+from datetime import datetime, timedelta
 
-from pyspark.sql import SparkSession
+import assignment_key_index
+import duckdb_engine
+import key_dictionary
+import run_metrics
+import silver_layout
+import spark_session
+from pyspark import StorageLevel
+from pyspark.sql import Column, DataFrame, SparkSession
 from pyspark.sql import functions as F
 from pyspark.sql.window import Window
 
+KEY_COLS = ["experiment_id", "user_id"]
+
 
 def parse_args() -> argparse.Namespace:
     p = argparse.ArgumentParser()
@@ -32,7 +137,83 @@ def parse_args() -> argparse.Namespace:
     p.add_argument("--gold", dest="gold_path", default="data/gold", help="Base gold path (default: data/gold)")
     p.add_argument("--max_days_after_assignment", type=int, default=7, help="Max exposure window after assignment")
     p.add_argument("--pre_assignment_grace_minutes", type=int, default=5, help="Grace window before assignment")
-    return p.parse_args()
+    p.add_argument(
+        "--mode",
+        choices=["single_pass", "legacy"],
+        default="single_pass",
+        help="single_pass: one clustering shuffle + one join; legacy: windows + separate stats join",
+    )
+    p.add_argument(
+        "--check_equivalence",
+        action="store_true",
+        help="Also build the legacy output and fail if it differs from the selected mode",
+    )
+    p.add_argument("--engine", choices=["spark", "duckdb"], default="spark", help="Execution engine (default: spark)")
+    p.add_argument(
+        "--rolling",
+        action="store_true",
+        help="Revalidate every assignment day in [dt - max_days_after_assignment, dt] whose window changed (spark engine)",
+    )
+    silver_layout.add_layout_args(p)
+    run_metrics.add_run_metrics_args(p)
+    p.add_argument(
+        "--skew_handling",
+        choices=["auto", "on", "off"],
+        default="auto",
+        help="auto: take the skew path when sampled heavy hitters are found (spark engine)",
+    )
+    p.add_argument("--skew_sample_fraction", type=float, default=0.01, help="Exposure sample for heavy-hitter detection")
+    p.add_argument(
+        "--skew_min_input_mb",
+        type=float,
+        default=1024,
+        help="auto: skip detection when the uncompressed exposure input is smaller; 1024 = 8 target "
+        "partitions of 128 MB, below which skew costs at most one partition (default: 1024)",
+    )
+    p.add_argument(
+        "--skew_threshold_rows",
+        type=int,
+        default=10_000,
+        help="Estimated exposures per (experiment_id, user_id) above which a key is hot; 10000 = ~100 "
+        "sampled rows at the 1%% default sample, 2x the heavy_users retry cap (default: 10000)",
+    )
+    p.add_argument(
+        "--exposure_event_id",
+        choices=["sha2", "xxhash64"],
+        default="sha2",
+        help="sha2: 256-bit hex id; xxhash64: 64-bit id with a collision audit (spark engine)",
+    )
+    p.add_argument(
+        "--event_id_audit_rate",
+        type=float,
+        default=0.01,
+        help="Share of the xxhash64 id space checked for collisions; 0 skips, 1 checks all (default: 0.01)",
+    )
+    p.add_argument(
+        "--key_dictionary",
+        default=None,
+        help="Key dictionary root; decode integer keys to string ids in silver and gold output (spark engine)",
+    )
+    p.add_argument(
+        "--assignment_index",
+        default=None,
+        help="Job 10 --incremental key index root (default: <silver>/_state/assignment_key_index)",
+    )
+    p.add_argument(
+        "--late_exposures",
+        default=None,
+        help="Path to a batch of late raw exposures for dt; patch only the affected keys (spark engine)",
+    )
+    args = p.parse_args()
+    if args.rolling and args.engine != "spark":
+        p.error("--rolling requires --engine spark")
+    if args.late_exposures and (args.engine != "spark" or args.rolling):
+        p.error("--late_exposures requires --engine spark and cannot be combined with --rolling")
+    if args.layout == "bucketed" and args.engine != "spark":
+        p.error("--layout bucketed requires --engine spark")
+    if (args.exposure_event_id != "sha2" or args.key_dictionary) and args.engine != "spark":
+        p.error("--exposure_event_id xxhash64 and --key_dictionary require --engine spark")
+    return args
 
 
 def write_parquet(df, path: str) -> None:
@@ -45,42 +226,35 @@ def require_columns(df, expected_cols: set[str], df_name: str) -> None:
         raise ValueError(f"Missing required columns in {df_name}: {missing}")
 
 
-def main() -> None:
-    args = parse_args()
-    dt = args.dt
-    in_base = args.in_path.rstrip("/")
-    silver_base = args.silver_path.rstrip("/")
-    gold_base = args.gold_path.rstrip("/")
+EVENT_ID_COLS = ["experiment_id", "user_id", "variant_id", "exposure_time_utc", "exposure_event_type"]
 
-    spark = (
-        SparkSession.builder
-        .appName("experimentation-analytics-platform-exposure-validation")
-        .master("local[*]")
-        .getOrCreate()
-    )
-    spark.sparkContext.setLogLevel("WARN")
+# output columns holding keys of each key_dictionary entity, and exposure event ids
+DICTIONARY_COLS = {
+    "experiment": ["experiment_id"],
+    "user": ["user_id"],
+    "variant": ["variant_id", "assigned_variant_id", "first_exposure_variant_id"],
+}
+EVENT_ID_OUTPUT_COLS = ["exposure_event_id", "first_exposure_event_id"]
 
-    assignments_path = f"{silver_base}/fact_assignment_canonical/dt={dt}"
-    exposures_path = f"{in_base}/fact_exposure/dt={dt}"
 
-    assignments = spark.read.parquet(assignments_path)
-    exposures_raw = spark.read.parquet(exposures_path)
-
-    require_columns(
-        assignments,
-        {"experiment_id", "user_id", "variant_id", "assignment_time_utc", "dt"},
-        "canonical assignments",
-    )
-    require_columns(
-        exposures_raw,
-        {"experiment_id", "user_id", "variant_id", "exposure_time_utc", "exposure_event_type", "dt"},
-        "raw exposures",
+def exposure_event_id(method: str) -> Column:
+    if method == "xxhash64":
+        return F.xxhash64(*EVENT_ID_COLS)
+    return F.sha2(
+        F.concat_ws(
+            "||",
+            F.col("experiment_id"),
+            F.col("user_id"),
+            F.col("variant_id"),
+            F.col("exposure_time_utc").cast("string"),
+            F.col("exposure_event_type"),
+        ),
+        256,
     )
 
-    # -----------------------------
-    # 1) Staging: standardize exposure events
-    # -----------------------------
-    exposures = (
+
+def stage_exposures(exposures_raw: DataFrame, event_id_method: str = "sha2") -> DataFrame:
+    return (
         exposures_raw
         .select(
             "experiment_id",
@@ -90,29 +264,134 @@ def main() -> None:
             "exposure_event_type",
             "dt",
         )
-        .withColumn(
-            "exposure_event_id",
-            F.sha2(
-                F.concat_ws(
-                    "||",
-                    F.col("experiment_id"),
-                    F.col("user_id"),
-                    F.col("variant_id"),
-                    F.col("exposure_time_utc").cast("string"),
-                    F.col("exposure_event_type"),
-                ),
-                256,
-            ),
-        )
+        .withColumn("exposure_event_id", exposure_event_id(event_id_method))
         .filter(F.col("experiment_id").isNotNull())
         .filter(F.col("user_id").isNotNull())
         .filter(F.col("exposure_time_utc").isNotNull())
         .filter(F.col("variant_id").isNotNull())
     )
 
-    # -----------------------------
-    # 2) Dedupe exposures deterministically
-    # -----------------------------
+
+def detect_heavy_hitters(spark: SparkSession, exposures_raw: DataFrame, args: argparse.Namespace) -> tuple[DataFrame, dict]:
+    """
+    Sampled key frequencies of raw exposures.
+
+    Returns (hot_keys, stats): hot_keys holds the (experiment_id, user_id) pairs whose
+    estimated exposure count is at least args.skew_threshold_rows.
+    """
+    fraction = args.skew_sample_fraction
+    sample = exposures_raw.select(*KEY_COLS).sample(fraction=fraction, seed=42)
+
+    key_counts = (
+        sample.groupBy(*KEY_COLS)
+        .agg(F.count(F.lit(1)).alias("sampled_rows"))
+        .withColumn("estimated_rows", (F.col("sampled_rows") / F.lit(fraction)).cast("long"))
+        .persist(StorageLevel.MEMORY_AND_DISK)
+    )
+    hot = key_counts.filter(F.col("estimated_rows") >= F.lit(args.skew_threshold_rows))
+    hot_rows = hot.orderBy(F.desc("estimated_rows")).collect()
+
+    totals = key_counts.agg(F.sum("sampled_rows").alias("sampled_rows")).collect()[0]
+    sampled_rows = int(totals["sampled_rows"] or 0)
+    top_experiment = (
+        key_counts.groupBy("experiment_id")
+        .agg(F.sum("sampled_rows").alias("rows"))
+        .orderBy(F.desc("rows"))
+        .first()
+    )
+
+    stats = {
+        "sample_fraction": float(fraction),
+        "sampled_rows": sampled_rows,
+        "estimated_rows": int(sampled_rows / fraction),
+        "hot_keys": len(hot_rows),
+        "hot_key_estimated_rows": sum(int(r["estimated_rows"]) for r in hot_rows),
+        "top_key_estimated_rows": int(hot_rows[0]["estimated_rows"]) if hot_rows else 0,
+        "top_experiment_id": str(top_experiment["experiment_id"]) if top_experiment else None,
+        "top_experiment_share": float(top_experiment["rows"] / sampled_rows) if top_experiment else None,
+    }
+    hot_keys = spark.createDataFrame(
+        [tuple(r[c] for c in KEY_COLS) for r in hot_rows],
+        exposures_raw.select(*KEY_COLS).schema,
+    )
+    key_counts.unpersist()
+    return hot_keys, stats
+
+
+def build_skew_metrics(spark: SparkSession, dt: str, stats: dict, skew_path: bool) -> DataFrame:
+    return spark.createDataFrame(
+        [
+            (
+                dt,
+                stats["sample_fraction"],
+                stats["sampled_rows"],
+                stats["estimated_rows"],
+                stats["hot_keys"],
+                stats["hot_key_estimated_rows"],
+                stats["top_key_estimated_rows"],
+                stats["top_experiment_id"],
+                stats["top_experiment_share"],
+                skew_path,
+            )
+        ],
+        "dt string, sample_fraction double, sampled_rows long, estimated_rows long, hot_keys long, "
+        "hot_key_estimated_rows long, top_key_estimated_rows long, top_experiment_id string, "
+        "top_experiment_share double, skew_path boolean",
+    ).withColumn("generated_at_utc", F.current_timestamp())
+
+
+def plan_skew(
+    spark: SparkSession, exposures_raw: DataFrame, args: argparse.Namespace, paths: dict, input_paths: list[str]
+) -> tuple[DataFrame | None, bool]:
+    """
+    Detect heavy hitters per --skew_handling, write their stats; returns (hot_keys, skew_path).
+
+    With auto, inputs under --skew_min_input_mb (uncompressed, from the parquet footers of
+    input_paths) skip the sample pass and the stats write: no key can be hot enough to
+    matter.
+    """
+    if args.skew_handling == "off":
+        return None, False
+    if args.skew_handling == "auto":
+        input_mb = spark_session.input_stats(input_paths)["uncompressed_bytes"] / spark_session.MB
+        if input_mb < args.skew_min_input_mb:
+            return None, False
+
+    hot_keys, stats = detect_heavy_hitters(spark, exposures_raw, args)
+    skew_path = args.skew_handling == "on" or stats["hot_keys"] > 0
+    write_parquet(build_skew_metrics(spark, args.dt, stats, skew_path), paths["out_skew"])
+    args.skew_stats = stats
+    return hot_keys, skew_path
+
+
+def audit_event_id_collisions(exposures: DataFrame, rate: float) -> None:
+    """
+    Fail if two distinct exposure tuples share an exposure_event_id.
+
+    Only ids in a rate-sized slice of the hash space are checked: colliding tuples share
+    their id, so they land in the slice together and every collision in it is found.
+    """
+    if rate <= 0:
+        return
+    if rate < 1:
+        buckets = 1_000_000
+        exposures = exposures.filter(F.pmod(F.col("exposure_event_id"), F.lit(buckets)) < F.lit(int(rate * buckets)))
+    row = exposures.agg(
+        F.countDistinct("exposure_event_id").alias("ids"),
+        F.countDistinct(F.struct(*EVENT_ID_COLS)).alias("tuples"),
+    ).collect()[0]
+    collisions = row["tuples"] - row["ids"]
+    if collisions != 0:
+        raise RuntimeError(f"exposure_event_id collision audit failed: {collisions} colliding ids")
+
+
+def build_validation_legacy(assignments: DataFrame, exposures: DataFrame) -> tuple[DataFrame, DataFrame]:
+    """
+    Window-based dedupe and first-exposure selection.
+
+    Returns (exposures_deduped, first_exposure) where first_exposure is one row
+    per assignment, before validation flags are applied.
+    """
     w_dedupe = (
         Window.partitionBy("experiment_id", "user_id", "variant_id")
         .orderBy(F.col("exposure_time_utc").asc(), F.col("exposure_event_id").asc())
@@ -124,15 +403,9 @@ def main() -> None:
         .drop("rn")
     )
 
-    out_exposures = f"{silver_base}/int_experiment_exposures_deduped/dt={dt}"
-    write_parquet(exposures_deduped, out_exposures)
-
-    # -----------------------------
-    # 3) Exposure validation table
-    # -----------------------------
     exposure_stats = (
         exposures_deduped
-        .groupBy("experiment_id", "user_id")
+        .groupBy(*KEY_COLS)
         .agg(
             F.count(F.lit(1)).alias("exposure_event_count"),
             F.countDistinct("variant_id").alias("exposure_variation_count"),
@@ -141,8 +414,8 @@ def main() -> None:
 
     joined = (
         assignments.alias("a")
-        .join(exposures_deduped.alias("e"), ["experiment_id", "user_id"], "left")
-        .join(exposure_stats.alias("s"), ["experiment_id", "user_id"], "left")
+        .join(exposures_deduped.alias("e"), KEY_COLS, "left")
+        .join(exposure_stats.alias("s"), KEY_COLS, "left")
         .select(
             F.col("a.experiment_id").alias("experiment_id"),
             F.col("a.user_id").alias("user_id"),
@@ -158,7 +431,7 @@ def main() -> None:
     )
 
     w_first = (
-        Window.partitionBy("experiment_id", "user_id")
+        Window.partitionBy(*KEY_COLS)
         .orderBy(F.col("exposure_at").asc(), F.col("exposure_event_id").asc())
     )
 
@@ -173,11 +446,89 @@ def main() -> None:
         .withColumn("first_exposure_event_id", F.col("exposure_event_id"))
         .drop("exposure_at", "exposure_variant_id", "exposure_event_id")
     )
+    return exposures_deduped, first_exposure
+
+
+def dedupe_exposures(exposures: DataFrame) -> DataFrame:
+    """First event per (experiment_id, user_id, variant_id), ordered by (exposure_time_utc, exposure_event_id)."""
+    return (
+        exposures
+        .groupBy("experiment_id", "user_id", "variant_id")
+        .agg(
+            F.min(
+                F.struct("exposure_time_utc", "exposure_event_id", "exposure_event_type", "dt")
+            ).alias("e")
+        )
+        .select(
+            "experiment_id",
+            "user_id",
+            "variant_id",
+            "e.exposure_time_utc",
+            "e.exposure_event_type",
+            "e.dt",
+            "e.exposure_event_id",
+        )
+    )
+
+
+def build_validation_single_pass(
+    assignments: DataFrame, exposures: DataFrame, preaggregate: bool = False
+) -> tuple[DataFrame, DataFrame]:
+    """
+    Dedupe and per-key exposure stats on a single (experiment_id, user_id) clustering.
+
+    The explicit repartition satisfies both the (experiment_id, user_id, variant_id)
+    dedupe and the (experiment_id, user_id) rollup, so neither aggregation adds an
+    exchange, and the rollup is already partitioned for the join to assignments.
+    Struct mins use the same ordering as the legacy windows
+    (exposure_time_utc, exposure_event_id), so the selected rows are identical.
+
+    preaggregate=True (skew path) skips the repartition: the dedupe aggregates map-side
+    before its shuffle, at the cost of a second, small shuffle of deduped rows.
 
-    grace_cutoff = F.expr(f"assigned_at - INTERVAL {args.pre_assignment_grace_minutes} MINUTES")
-    window_end = F.expr(f"assigned_at + INTERVAL {args.max_days_after_assignment} DAYS")
+    Returns (exposures_deduped, first_exposure) with the legacy column layout.
+    """
+    if not preaggregate:
+        exposures = exposures.repartition(*KEY_COLS)
 
-    validation = (
+    exposures_deduped = dedupe_exposures(exposures).persist(StorageLevel.MEMORY_AND_DISK)
+
+    # Deduped rows are unique per variant, so the row count per key is also the
+    # number of distinct variations exposed.
+    exposure_keys = (
+        exposures_deduped
+        .groupBy(*KEY_COLS)
+        .agg(
+            F.count(F.lit(1)).alias("exposure_event_count"),
+            F.min(F.struct("exposure_time_utc", "exposure_event_id", "variant_id")).alias("first"),
+        )
+    )
+
+    first_exposure = (
+        assignments.alias("a")
+        .join(exposure_keys.alias("s"), KEY_COLS, "left")
+        .select(
+            F.col("a.experiment_id").alias("experiment_id"),
+            F.col("a.user_id").alias("user_id"),
+            F.col("a.variant_id").alias("assigned_variant_id"),
+            F.col("a.assignment_time_utc").alias("assigned_at"),
+            F.col("s.exposure_event_count").alias("exposure_event_count"),
+            F.col("s.exposure_event_count").alias("exposure_variation_count"),
+            F.col("a.dt").alias("dt"),
+            F.col("s.first.exposure_time_utc").isNotNull().alias("has_any_exposure"),
+            F.col("s.first.exposure_time_utc").alias("first_exposure_at"),
+            F.col("s.first.variant_id").alias("first_exposure_variant_id"),
+            F.col("s.first.exposure_event_id").alias("first_exposure_event_id"),
+        )
+    )
+    return exposures_deduped, first_exposure
+
+
+def add_validation_flags(first_exposure: DataFrame, max_days_after_assignment: int, pre_assignment_grace_minutes: int) -> DataFrame:
+    grace_cutoff = F.expr(f"assigned_at - INTERVAL {pre_assignment_grace_minutes} MINUTES")
+    window_end = F.expr(f"assigned_at + INTERVAL {max_days_after_assignment} DAYS")
+
+    return (
         first_exposure
         .withColumn(
             "exposure_delay_seconds",
@@ -234,12 +585,15 @@ def main() -> None:
         )
     )
 
-    out_validation = f"{silver_base}/int_experiment_exposure_validation/dt={dt}"
-    write_parquet(validation, out_validation)
 
-    # -----------------------------
-    # 4) Daily quality metrics
-    # -----------------------------
+def _rate(numerator: str, denominator: str) -> Column:
+    return (
+        F.when(F.col(denominator) == 0, F.lit(None).cast("double"))
+        .otherwise(F.col(numerator).cast("double") / F.col(denominator).cast("double"))
+    )
+
+
+def build_daily_quality(validation: DataFrame, dt: str) -> DataFrame:
     v = validation.withColumn("date_day", F.to_date("assigned_at"))
 
     daily = (
@@ -259,59 +613,702 @@ def main() -> None:
         )
     )
 
-    daily = (
+    return (
         daily
-        .withColumn(
-            "exposure_rate",
-            F.when(F.col("assigned_units") == 0, F.lit(None).cast("double"))
-            .otherwise(F.col("exposed_units").cast("double") / F.col("assigned_units").cast("double")),
+        .withColumn("exposure_rate", _rate("exposed_units", "assigned_units"))
+        .withColumn("valid_exposure_rate", _rate("valid_exposed_units", "assigned_units"))
+        .withColumn("mismatch_rate", _rate("variant_mismatch_units", "exposed_units"))
+        .withColumn("percent_missing_exposure", _rate("missing_exposure_units", "assigned_units"))
+        .withColumn("percent_multiple_exposures", _rate("multi_variation_units", "assigned_units"))
+        .withColumn("pre_assignment_rate", _rate("pre_assignment_units", "assigned_units"))
+        .withColumn("outside_window_rate", _rate("outside_window_units", "assigned_units"))
+        .withColumn("generated_at_utc", F.current_timestamp())
+        .withColumn("dt", F.lit(dt))
+    )
+
+
+def assert_equivalent(actual: DataFrame, expected: DataFrame, df_name: str) -> None:
+    actual_schema = [(f.name, f.dataType) for f in actual.schema.fields]
+    expected_schema = [(f.name, f.dataType) for f in expected.schema.fields]
+    if actual_schema != expected_schema:
+        raise RuntimeError(f"Equivalence check failed for {df_name}: schema {actual_schema} != {expected_schema}")
+
+    extra = actual.exceptAll(expected).count()
+    missing = expected.exceptAll(actual).count()
+    if extra != 0 or missing != 0:
+        raise RuntimeError(
+            f"Equivalence check failed for {df_name}: {extra} unexpected rows, {missing} missing rows"
         )
-        .withColumn(
-            "valid_exposure_rate",
-            F.when(F.col("assigned_units") == 0, F.lit(None).cast("double"))
-            .otherwise(F.col("valid_exposed_units").cast("double") / F.col("assigned_units").cast("double")),
+
+
+def build_validation(
+    assignments: DataFrame,
+    exposures_raw: DataFrame,
+    args: argparse.Namespace,
+    skew_path: bool = False,
+) -> tuple[DataFrame, DataFrame]:
+    """
+    Returns (exposures_deduped, validation) for the given assignments and raw exposures.
+
+    skew_path=True pre-aggregates the single_pass dedupe (see build_validation_single_pass).
+
+    Uses args.mode, args.max_days_after_assignment, args.pre_assignment_grace_minutes,
+    args.exposure_event_id and args.check_equivalence. The validation frame is persisted because it feeds
+    both the silver write and the daily quality aggregation. Both frames carry output ids (see output_ids).
+    """
+    require_columns(
+        assignments,
+        {"experiment_id", "user_id", "variant_id", "assignment_time_utc", "dt"},
+        "canonical assignments",
+    )
+    require_columns(
+        exposures_raw,
+        {"experiment_id", "user_id", "variant_id", "exposure_time_utc", "exposure_event_type", "dt"},
+        "raw exposures",
+    )
+
+    # Staging: standardize exposure events
+    exposures = stage_exposures(exposures_raw, args.exposure_event_id)
+    if args.exposure_event_id == "xxhash64":
+        audit_event_id_collisions(exposures, args.event_id_audit_rate)
+
+    # Dedupe exposures + first exposure per assignment
+    if args.mode == "legacy":
+        exposures_deduped, first_exposure = build_validation_legacy(assignments, exposures)
+    else:
+        exposures_deduped, first_exposure = build_validation_single_pass(assignments, exposures, skew_path)
+
+    spark = assignments.sparkSession
+    exposures_deduped = output_ids(spark, exposures_deduped, args)
+    validation = output_ids(
+        spark,
+        add_validation_flags(first_exposure, args.max_days_after_assignment, args.pre_assignment_grace_minutes),
+        args,
+    ).persist(StorageLevel.MEMORY_AND_DISK)
+
+    if args.check_equivalence:
+        legacy_deduped, legacy_first_exposure = build_validation_legacy(assignments, exposures)
+        legacy_deduped = output_ids(spark, legacy_deduped, args)
+        legacy_validation = output_ids(
+            spark,
+            add_validation_flags(
+                legacy_first_exposure,
+                args.max_days_after_assignment,
+                args.pre_assignment_grace_minutes,
+            ),
+            args,
         )
-        .withColumn(
-            "mismatch_rate",
-            F.when(F.col("exposed_units") == 0, F.lit(None).cast("double"))
-            .otherwise(F.col("variant_mismatch_units").cast("double") / F.col("exposed_units").cast("double")),
+        assert_equivalent(exposures_deduped, legacy_deduped, "int_experiment_exposures_deduped")
+        assert_equivalent(validation, legacy_validation, "int_experiment_exposure_validation")
+        print("✅ Equivalence check passed against legacy mode")
+
+    return exposures_deduped, validation
+
+
+def run_duckdb(args: argparse.Namespace, paths: dict) -> None:
+    """
+    DuckDB engine: window/QUALIFY formulation of the single_pass logic, with the
+    same orderings (exposure_time_utc, exposure_event_id) and output column layout.
+    """
+    con = duckdb_engine.connect()
+    duckdb_engine.register_parquet(con, paths["assignments"], "assignments")
+    duckdb_engine.register_parquet(con, paths["exposures"], "exposures_raw")
+
+    for view_name, expected_cols, df_name in [
+        ("assignments", {"experiment_id", "user_id", "variant_id", "assignment_time_utc", "dt"}, "canonical assignments"),
+        (
+            "exposures_raw",
+            {"experiment_id", "user_id", "variant_id", "exposure_time_utc", "exposure_event_type", "dt"},
+            "raw exposures",
+        ),
+    ]:
+        cols = {r[0] for r in con.execute(f"describe {view_name}").fetchall()}
+        missing = sorted(expected_cols - cols)
+        if missing:
+            raise ValueError(f"Missing required columns in {df_name}: {missing}")
+
+    exposure_ts = "cast(exposure_time_utc as timestamptz)"
+    con.execute(f"""
+        create temp table exposures_deduped as
+        with exposures as (
+            select
+                experiment_id
+                , user_id
+                , variant_id
+                , {exposure_ts} as exposure_time_utc
+                , exposure_event_type
+                , dt
+                , sha256(concat_ws(
+                    '||',
+                    experiment_id,
+                    user_id,
+                    variant_id,
+                    {duckdb_engine.spark_timestamp_string(exposure_ts)},
+                    exposure_event_type
+                  )) as exposure_event_id
+            from exposures_raw
+            where experiment_id is not null
+              and user_id is not null
+              and exposure_time_utc is not null
+              and variant_id is not null
         )
-        .withColumn(
-            "percent_missing_exposure",
-            F.when(F.col("assigned_units") == 0, F.lit(None).cast("double"))
-            .otherwise(F.col("missing_exposure_units").cast("double") / F.col("assigned_units").cast("double")),
+        select *
+        from exposures
+        qualify row_number() over (
+            partition by experiment_id, user_id, variant_id
+            order by exposure_time_utc asc, exposure_event_id asc,
+                     exposure_event_type asc nulls first, dt asc nulls first
+        ) = 1
+    """)
+
+    con.execute(f"""
+        create temp table validation as
+        with exposure_keys as (
+            select
+                experiment_id
+                , user_id
+                , count(*) over (partition by experiment_id, user_id) as exposure_event_count
+                , exposure_time_utc as first_exposure_at
+                , variant_id as first_exposure_variant_id
+                , exposure_event_id as first_exposure_event_id
+            from exposures_deduped
+            qualify row_number() over (
+                partition by experiment_id, user_id
+                order by exposure_time_utc asc, exposure_event_id asc, variant_id asc
+            ) = 1
         )
-        .withColumn(
-            "percent_multiple_exposures",
-            F.when(F.col("assigned_units") == 0, F.lit(None).cast("double"))
-            .otherwise(F.col("multi_variation_units").cast("double") / F.col("assigned_units").cast("double")),
+
+        , first_exposure as (
+            select
+                a.experiment_id
+                , a.user_id
+                , a.variant_id as assigned_variant_id
+                , cast(a.assignment_time_utc as timestamptz) as assigned_at
+                , s.exposure_event_count
+                , s.exposure_event_count as exposure_variation_count
+                , a.dt
+                , s.first_exposure_at is not null as has_any_exposure
+                , s.first_exposure_at
+                , s.first_exposure_variant_id
+                , s.first_exposure_event_id
+            from assignments a
+            left join exposure_keys s
+                on a.experiment_id = s.experiment_id
+               and a.user_id = s.user_id
         )
-        .withColumn(
-            "pre_assignment_rate",
-            F.when(F.col("assigned_units") == 0, F.lit(None).cast("double"))
-            .otherwise(F.col("pre_assignment_units").cast("double") / F.col("assigned_units").cast("double")),
+
+        , flagged as (
+            select
+                *
+                , case
+                    when has_any_exposure
+                        then cast(floor(epoch(first_exposure_at)) as bigint) - cast(floor(epoch(assigned_at)) as bigint)
+                  end as exposure_delay_seconds
+                , coalesce(
+                    has_any_exposure
+                    and first_exposure_at < assigned_at - interval '{args.pre_assignment_grace_minutes} minutes',
+                    false
+                  ) as is_pre_assignment_exposure
+                , coalesce(
+                    has_any_exposure
+                    and first_exposure_at > assigned_at + interval '{args.max_days_after_assignment} days',
+                    false
+                  ) as exposure_outside_window
+                , coalesce(
+                    has_any_exposure and first_exposure_variant_id != assigned_variant_id,
+                    false
+                  ) as is_variant_mismatch
+                , coalesce(exposure_variation_count > 1, false) as has_multiple_variations_exposed
+            from first_exposure
         )
-        .withColumn(
-            "outside_window_rate",
-            F.when(F.col("assigned_units") == 0, F.lit(None).cast("double"))
-            .otherwise(F.col("outside_window_units").cast("double") / F.col("assigned_units").cast("double")),
+
+        , validated as (
+            select
+                *
+                , has_any_exposure
+                  and not is_pre_assignment_exposure
+                  and not exposure_outside_window
+                  and not is_variant_mismatch
+                  and not has_multiple_variations_exposed as has_valid_exposure
+            from flagged
         )
-        .withColumn("generated_at_utc", F.current_timestamp())
-        .withColumn("dt", F.lit(dt))
+
+        select
+            *
+            , case
+                when has_any_exposure = false then 'no_exposure'
+                when has_multiple_variations_exposed = true then 'multi_variation_exposure'
+                when is_pre_assignment_exposure = true then 'pre_assignment_exposure'
+                when exposure_outside_window = true then 'exposure_outside_window'
+                when is_variant_mismatch = true then 'variant_mismatch'
+                when has_valid_exposure = true then 'valid'
+                else 'invalid_other'
+              end as validation_status
+        from validated
+    """)
+
+    duckdb_engine.write_parquet(
+        con,
+        """
+        select
+            experiment_id, user_id, variant_id, exposure_time_utc, exposure_event_type, dt, exposure_event_id
+        from exposures_deduped
+        """,
+        paths["out_exposures"],
     )
+    duckdb_engine.write_parquet(con, "select * from validation", paths["out_validation"])
 
-    out_quality = f"{gold_base}/fct_experiment_quality_metrics_daily/dt={dt}"
-    write_parquet(daily, out_quality)
+    rate = "case when {d} = 0 then null else cast({n} as double) / cast({d} as double) end"
+    duckdb_engine.write_parquet(
+        con,
+        f"""
+        with daily as (
+            select
+                experiment_id
+                , cast(assigned_at as date) as date_day
+                , count(*) as assigned_units
+                , cast(sum(case when has_any_exposure then 1 else 0 end) as bigint) as exposed_units
+                , cast(sum(case when has_valid_exposure then 1 else 0 end) as bigint) as valid_exposed_units
+                , cast(sum(case when not has_any_exposure then 1 else 0 end) as bigint) as missing_exposure_units
+                , cast(sum(case when is_variant_mismatch then 1 else 0 end) as bigint) as variant_mismatch_units
+                , cast(sum(case when has_multiple_variations_exposed then 1 else 0 end) as bigint) as multi_variation_units
+                , cast(sum(case when is_pre_assignment_exposure then 1 else 0 end) as bigint) as pre_assignment_units
+                , cast(sum(case when exposure_outside_window then 1 else 0 end) as bigint) as outside_window_units
+                , avg(case when has_any_exposure then exposure_delay_seconds end) as avg_exposure_delay_seconds
+            from validation
+            group by 1, 2
+        )
 
-    print("✅ Built exposure validation + quality metrics")
-    print(f"dt: {dt}")
-    print(f"assignments: {assignments_path}")
-    print(f"exposures: {exposures_path}")
-    print(f"validation: {out_validation}")
-    print(f"quality: {out_quality}")
+        select
+            *
+            , {rate.format(n="exposed_units", d="assigned_units")} as exposure_rate
+            , {rate.format(n="valid_exposed_units", d="assigned_units")} as valid_exposure_rate
+            , {rate.format(n="variant_mismatch_units", d="exposed_units")} as mismatch_rate
+            , {rate.format(n="missing_exposure_units", d="assigned_units")} as percent_missing_exposure
+            , {rate.format(n="multi_variation_units", d="assigned_units")} as percent_multiple_exposures
+            , {rate.format(n="pre_assignment_units", d="assigned_units")} as pre_assignment_rate
+            , {rate.format(n="outside_window_units", d="assigned_units")} as outside_window_rate
+            , current_timestamp as generated_at_utc
+            , '{args.dt}' as dt
+        from daily
+        """,
+        paths["out_quality"],
+    )
+    con.close()
+
+
+def window_days(dt: str, days: int) -> list[str]:
+    end = datetime.strptime(dt, "%Y-%m-%d")
+    return [(end - timedelta(days=i)).strftime("%Y-%m-%d") for i in range(days, -1, -1)]
+
+
+def table_root(path: str) -> str:
+    return path.rsplit("/dt=", 1)[0]
+
+
+def read_partitions(spark: SparkSession, root: str, days: list[str]) -> DataFrame | None:
+    """
+    Read only the dt=... directories for days (missing days are skipped).
+
+    Passing partition directories explicitly prunes at listing time and keeps the dt
+    column as stored in the files.
+    """
+    paths = [f"{root}/dt={d}" for d in days if os.path.isdir(f"{root}/dt={d}")]
+    if not paths:
+        return None
+    return spark.read.parquet(*paths)
+
+
+def earliest_assignment_per_key(assignments: DataFrame) -> DataFrame:
+    payload_cols = ["assignment_time_utc", "variant_id"] + [
+        c for c in assignments.columns if c not in KEY_COLS and c not in ("assignment_time_utc", "variant_id")
+    ]
+    return (
+        assignments.groupBy(*KEY_COLS)
+        .agg(F.min(F.struct(*payload_cols)).alias("a"))
+        .select(*KEY_COLS, "a.*")
+        .select(*assignments.columns)
+    )
+
+
+def drop_keys_assigned_before(
+    spark: SparkSession, assignments: DataFrame, index_root: str, window_start: str
+) -> DataFrame:
+    """
+    Drop window keys that already have an earlier assignment before the window.
+
+    The earliest assignment per key before window_start comes from job 10's key index
+    (semi-joined to the window's keys), so the earliest assignment per key is the one
+    over full history without re-reading older canonical partitions. A key is kept when
+    it has no earlier entry or its window row sorts first (a late-arriving earlier
+    assignment, as in job 10 --incremental).
+    """
+    known = assignment_key_index.read_index(spark, index_root, window_start, assignments.select(*KEY_COLS))
+    if known is None:
+        return assignments
+
+    known = known.select(*KEY_COLS, F.struct("assignment_time_utc", "variant_id").alias("known"))
+    return (
+        assignments.join(known, KEY_COLS, "left")
+        .filter(
+            F.col("known").isNull()
+            | (F.struct("assignment_time_utc", "variant_id") < F.col("known"))
+        )
+        .drop("known")
+    )
+
+
+def exposures_in_window(
+    assignments: DataFrame,
+    exposures_raw: DataFrame,
+    max_days_after_assignment: int,
+    hot_keys: DataFrame | None = None,
+) -> DataFrame:
+    """
+    Keep exposures whose dt falls in [assignment dt, assignment dt + max_days] for their key.
+
+    With hot_keys, their raw rows join a broadcast of their assignment rows instead of
+    being shuffled into a single join task; the other keys join as usual.
+    """
+    assignment_days = assignments.select(*KEY_COLS, F.to_date("dt").alias("assignment_day"))
+    exposure_day = F.to_date("dt")
+    in_window = (
+        (exposure_day >= F.col("assignment_day"))
+        & (exposure_day <= F.date_add(F.col("assignment_day"), max_days_after_assignment))
+    )
+
+    if hot_keys is None:
+        return exposures_raw.join(assignment_days, KEY_COLS).filter(in_window).drop("assignment_day")
+
+    hot_keys = F.broadcast(hot_keys)
+    hot = (
+        exposures_raw.join(hot_keys, KEY_COLS, "left_semi")
+        .join(F.broadcast(assignment_days.join(hot_keys, KEY_COLS, "left_semi")), KEY_COLS)
+    )
+    rest = (
+        exposures_raw.join(hot_keys, KEY_COLS, "left_anti")
+        .join(assignment_days.join(hot_keys, KEY_COLS, "left_anti"), KEY_COLS)
+    )
+    return hot.unionByName(rest).filter(in_window).drop("assignment_day")
+
+
+def output_ids(spark: SparkSession, df: DataFrame, args: argparse.Namespace) -> DataFrame:
+    """
+    df with the string ids of the silver/gold contract: integer keys decoded with
+    --key_dictionary, xxhash64 event ids cast to string. A no-op on sha2 runs over data/raw.
+    """
+    if args.exposure_event_id == "xxhash64":
+        for col in EVENT_ID_OUTPUT_COLS:
+            if col in df.columns:
+                df = df.withColumn(col, F.col(col).cast("string"))
+    if args.key_dictionary:
+        root = args.key_dictionary.rstrip("/")
+        for entity, cols in DICTIONARY_COLS.items():
+            cols = [c for c in cols if c in df.columns]
+            if cols:
+                dictionary = key_dictionary.load_dictionary(spark, root, entity)
+                for col in cols:
+                    df = key_dictionary.decode(df, entity, dictionary, col)
+    return df
+
+
+def superseded_days(spark: SparkSession, args: argparse.Namespace) -> DataFrame | None:
+    """
+    Keys job 10 --incremental moved out of earlier canonical partitions on dt, with the
+    partition they left (superseded_dt). None when dt has no index delta or no such key.
+    """
+    delta = assignment_key_index.read_delta(spark, args.assignment_index, args.dt)
+    if delta is None or "superseded_dt" not in delta.columns:
+        return None
+    superseded = delta.filter(F.col("superseded_dt").isNotNull()).select(*KEY_COLS, "superseded_dt")
+    return superseded if superseded.limit(1).count() else None
+
+
+def drop_superseded_validation(
+    spark: SparkSession, superseded: DataFrame, args: argparse.Namespace, paths: dict, skip_days: list[str]
+) -> list[str]:
+    """
+    Remove superseded keys from the validation partitions of the days they left and
+    recompute those days' gold quality. Days in skip_days were rewritten by the run.
+
+    Returns the days patched.
+    """
+    validation_root = table_root(paths["out_validation"])
+    quality_root = table_root(paths["out_quality"])
+    days = sorted(
+        r["superseded_dt"] for r in superseded.select("superseded_dt").distinct().collect()
+        if r["superseded_dt"] not in skip_days and os.path.isdir(f"{validation_root}/dt={r['superseded_dt']}")
+    )
+    for day in days:
+        path = f"{validation_root}/dt={day}"
+        keys = output_ids(spark, superseded.filter(F.col("superseded_dt") == F.lit(day)).select(*KEY_COLS), args)
+        validation = spark.read.parquet(path).join(keys, KEY_COLS, "left_anti")
+        layout = silver_layout.read_layout(path) or {"layout": "plain", "bucket_count": args.buckets}
+        staged = silver_layout.staging_path(path, "superseded")
+        silver_layout.write_table(validation, staged, layout["layout"], layout["bucket_count"])
+        silver_layout.swap_in(staged, path)
+        write_parquet(build_daily_quality(spark.read.parquet(path), day), f"{quality_root}/dt={day}")
+    return days
+
+
+def run_spark_rolling(spark: SparkSession, args: argparse.Namespace, paths: dict) -> list[str]:
+    """
+    Rolling-window validation for args.dt. Returns the assignment days rewritten.
+    """
+    days = window_days(args.dt, args.max_days_after_assignment)
+    if not assignment_key_index.exists(args.assignment_index):
+        raise ValueError(
+            f"--rolling needs job 10's key index at {args.assignment_index}; run job 10 with --incremental"
+        )
+
+    assignments = read_partitions(spark, table_root(paths["assignments"]), days)
+    if assignments is None:
+        raise ValueError(f"No canonical assignment partitions found for {days[0]}..{days[-1]}")
+    exposures_raw = read_partitions(spark, table_root(paths["exposures"]), days)
+    if exposures_raw is None:
+        exposures_raw = spark.createDataFrame(
+            [],
+            "experiment_id string, user_id string, variant_id string, "
+            "exposure_time_utc timestamp, exposure_event_type string, dt string",
+        )
+
+    recorder = args.run_metrics
+    assignments = drop_keys_assigned_before(
+        spark, earliest_assignment_per_key(assignments), args.assignment_index, days[0]
+    ).persist(StorageLevel.MEMORY_AND_DISK)
+
+    # Assignment days whose window changed: today's, any day with a key exposed today,
+    # and window days a key was superseded from (job 10 removed its canonical row there)
+    with recorder.stage("affected_days"):
+        exposed_today = exposures_raw.filter(F.col("dt") == F.lit(args.dt)).select(*KEY_COLS)
+        superseded = superseded_days(spark, args)
+        affected_days = sorted(
+            {args.dt}
+            | {
+                r["dt"]
+                for r in assignments.join(exposed_today, KEY_COLS, "left_semi").select("dt").distinct().collect()
+            }
+            | (
+                set()
+                if superseded is None
+                else {r["superseded_dt"] for r in superseded.select("superseded_dt").distinct().collect()} & set(days)
+            )
+        )
+
+    assignments = assignments.filter(F.col("dt").isin(affected_days))
+
+    with recorder.stage("skew_detection"):
+        exposure_days = [f"{table_root(paths['exposures'])}/dt={d}" for d in days]
+        hot_keys, skew_path = plan_skew(spark, exposures_raw, args, paths, exposure_days)
+
+    exposures_today = exposures_raw.filter(F.col("dt") == F.lit(args.dt))
+    exposures_raw = exposures_in_window(
+        assignments, exposures_raw, args.max_days_after_assignment, hot_keys if skew_path else None
+    )
+    with recorder.stage("dedupe"):
+        _, validation = build_validation(assignments, exposures_raw, args, skew_path)
+        # Same rows as a non-rolling run of dt: every exposure of dt, assigned in the window or not
+        exposures_deduped = output_ids(
+            spark, dedupe_exposures(stage_exposures(exposures_today, args.exposure_event_id)), args
+        )
+        silver_layout.write_table(exposures_deduped, paths["out_exposures"], args.layout, args.buckets)
+
+    validation_root = table_root(paths["out_validation"])
+    quality_root = table_root(paths["out_quality"])
+    with recorder.stage("join_validation"):
+        for day in affected_days:
+            day_validation = validation.filter(F.col("dt") == F.lit(day))
+            silver_layout.write_table(day_validation, f"{validation_root}/dt={day}", args.layout, args.buckets)
+    with recorder.stage("daily_aggregation"):
+        for day in affected_days:
+            day_validation = validation.filter(F.col("dt") == F.lit(day))
+            write_parquet(build_daily_quality(day_validation, day), f"{quality_root}/dt={day}")
+    if superseded is not None:
+        with recorder.stage("superseded_keys"):
+            affected_days = sorted(
+                affected_days + drop_superseded_validation(spark, superseded, args, paths, affected_days)
+            )
+
+    return affected_days
+
+
+def patch_rows(existing: DataFrame, patch: DataFrame, cols: list[str]) -> DataFrame:
+    """existing with every row matching patch on cols replaced by the patch rows."""
+    return (
+        existing
+        .join(patch.select(*cols).distinct(), cols, "left_anti")
+        .unionByName(patch.select(*existing.columns))
+    )
+
+
+def run_spark_late_exposures(spark: SparkSession, args: argparse.Namespace, paths: dict) -> dict:
+    """
+    Patch dt's silver validation, deduped exposures and gold quality with a late batch.
+
+    Returns patch stats (affected keys and gold groups).
+    """
+    late = spark.read.parquet(args.late_exposures)
+    require_columns(
+        late,
+        {"experiment_id", "user_id", "variant_id", "exposure_time_utc", "exposure_event_type", "dt"},
+        "late exposures",
+    )
+    late_keys = late.select(*KEY_COLS).distinct().persist(StorageLevel.MEMORY_AND_DISK)
+
+    assignments = spark.read.parquet(paths["assignments"]).join(late_keys, KEY_COLS, "left_semi")
+    exposures_raw = (
+        spark.read.parquet(paths["exposures"])
+        .select(*late.columns)
+        .join(late_keys, KEY_COLS, "left_semi")
+        .unionByName(late)
+    )
+
+    # Revalidate only the affected keys, then swap them into the built partitions
+    exposures_deduped, validation = build_validation(assignments, exposures_raw, args)
+
+    patched_validation = patch_rows(spark.read.parquet(paths["out_validation"]), validation, KEY_COLS)
+    patched_validation = patched_validation.persist(StorageLevel.MEMORY_AND_DISK)
+    patched_exposures = patch_rows(spark.read.parquet(paths["out_exposures"]), exposures_deduped, KEY_COLS)
+
+    groups = (
+        validation
+        .select("experiment_id", F.to_date("assigned_at").alias("date_day"))
+        .distinct()
+        .persist(StorageLevel.MEMORY_AND_DISK)
+    )
+    group_validation = (
+        patched_validation
+        .withColumn("date_day", F.to_date("assigned_at"))
+        .join(groups, ["experiment_id", "date_day"], "left_semi")
+        .drop("date_day")
+    )
+    patched_quality = patch_rows(
+        spark.read.parquet(paths["out_quality"]),
+        build_daily_quality(group_validation, args.dt),
+        ["experiment_id", "date_day"],
+    )
+
+    # Patched silver partitions keep the layout they were built with
+    staged = {}
+    for key, df in [
+        ("out_validation", patched_validation),
+        ("out_exposures", patched_exposures),
+        ("out_quality", patched_quality),
+    ]:
+        layout = silver_layout.read_layout(paths[key]) or {"layout": "plain", "bucket_count": args.buckets}
+        staged[key] = silver_layout.staging_path(paths[key], "patch")
+        silver_layout.write_table(df, staged[key], layout["layout"], layout["bucket_count"])
+
+    stats = {"late_rows": late.count(), "affected_keys": late_keys.count(), "patched_groups": groups.count()}
+
+    for key, path in staged.items():
+        silver_layout.swap_in(path, paths[key])
+
+    return stats
+
+
+def run_spark(args: argparse.Namespace, paths: dict) -> None:
+    if args.rolling:
+        days = window_days(args.dt, args.max_days_after_assignment)
+        inputs = [f"{table_root(paths[k])}/dt={d}" for k in ("assignments", "exposures") for d in days]
+    else:
+        inputs = [paths["assignments"], paths["exposures"]] + ([args.late_exposures] if args.late_exposures else [])
+    spark = spark_session.build_session("experimentation-analytics-platform-exposure-validation", inputs)
+    recorder = args.run_metrics
+    recorder.attach(spark)
+
+    if args.rolling:
+        args.rewritten_days = run_spark_rolling(spark, args, paths)
+        spark.stop()
+        return
+
+    if args.late_exposures:
+        with recorder.stage("late_patch"):
+            args.patch_stats = run_spark_late_exposures(spark, args, paths)
+        spark.stop()
+        return
+
+    assignments = silver_layout.read_table(spark, paths["assignments"])
+    exposures_raw = spark.read.parquet(paths["exposures"])
+
+    with recorder.stage("skew_detection"):
+        _, skew_path = plan_skew(spark, exposures_raw, args, paths, [paths["exposures"]])
+
+    # Dedupe exposures + exposure validation table (the join runs in the validation write);
+    # bucketed assignments (job 10 --layout bucketed) shuffle into the bucket count here only
+    with silver_layout.bucketed_shuffle(spark, paths["assignments"]):
+        with recorder.stage("dedupe"):
+            exposures_deduped, validation = build_validation(assignments, exposures_raw, args, skew_path)
+            silver_layout.write_table(exposures_deduped, paths["out_exposures"], args.layout, args.buckets)
+        with recorder.stage("join_validation"):
+            silver_layout.write_table(validation, paths["out_validation"], args.layout, args.buckets)
+
+    # Daily quality metrics
+    with recorder.stage("daily_aggregation"):
+        write_parquet(build_daily_quality(validation, args.dt), paths["out_quality"])
+
+    superseded = superseded_days(spark, args)
+    if superseded is not None:
+        with recorder.stage("superseded_keys"):
+            args.superseded_days = drop_superseded_validation(spark, superseded, args, paths, [args.dt])
 
     spark.stop()
 
 
+def main() -> None:
+    args = parse_args()
+    dt = args.dt
+    in_base = args.in_path.rstrip("/")
+    silver_base = args.silver_path.rstrip("/")
+    gold_base = args.gold_path.rstrip("/")
+
+    paths = {
+        "assignments": f"{silver_base}/fact_assignment_canonical/dt={dt}",
+        "exposures": f"{in_base}/fact_exposure/dt={dt}",
+        "out_exposures": f"{silver_base}/int_experiment_exposures_deduped/dt={dt}",
+        "out_validation": f"{silver_base}/int_experiment_exposure_validation/dt={dt}",
+        "out_skew": f"{silver_base}/metrics_exposure_skew/dt={dt}",
+        "out_quality": f"{gold_base}/fct_experiment_quality_metrics_daily/dt={dt}",
+    }
+
+    args.assignment_index = (args.assignment_index or f"{silver_base}/_state/assignment_key_index").rstrip("/")
+
+    args.run_metrics = run_metrics.RunMetrics("20_build_exposure_validation", dt, args.engine)
+    try:
+        if args.engine == "duckdb":
+            with args.run_metrics.stage("validate"):
+                run_duckdb(args, paths)
+        else:
+            run_spark(args, paths)
+    finally:
+        if not args.no_run_metrics:
+            args.run_metrics.write(args.run_metrics_path)
+
+    print("✅ Built exposure validation + quality metrics")
+    print(f"dt: {dt}")
+    print(f"engine: {args.engine}" + (f" ({args.mode})" if args.engine == "spark" else ""))
+    print(f"assignments: {paths['assignments']}")
+    print(f"exposures: {paths['exposures']}")
+    print(f"validation: {paths['out_validation']}")
+    print(f"quality: {paths['out_quality']}")
+    if args.rolling:
+        print(f"rewritten assignment days: {', '.join(args.rewritten_days)}")
+    if getattr(args, "superseded_days", None):
+        print(f"superseded keys removed from: {', '.join(args.superseded_days)}")
+    if getattr(args, "skew_stats", None):
+        st = args.skew_stats
+        print(
+            f"skew: hot_keys={st['hot_keys']} top_key_estimated_rows={st['top_key_estimated_rows']} "
+            f"top_experiment={st['top_experiment_id']} share={st['top_experiment_share'] or 0:.2f}"
+        )
+    print(f"stages: {args.run_metrics.summary()}")
+    if args.late_exposures:
+        print(f"late exposures: {args.late_exposures}")
+        print(
+            f"late_rows={args.patch_stats['late_rows']} affected_keys={args.patch_stats['affected_keys']} "
+            f"patched_groups={args.patch_stats['patched_groups']}"
+        )
+
+
 if __name__ == "__main__":
     main()
@@ -0,0 +1,110 @@
+"""
+Key index of earliest canonical assignments, kept by job 10 --incremental.
+
+Layout under the index root (default: data/silver/_state/assignment_key_index):
+- dt=YYYY-MM-DD: the delta of dt, the keys job 10 emitted into
+  fact_assignment_canonical/dt=YYYY-MM-DD (new keys and keys whose canonical row moved
+  earlier that day) with (assignment_time_utc, variant_id) and superseded_dt, the
+  partition their previous canonical row was removed from (null for new keys)
+- _compacted/dt=YYYY-MM-DD: a snapshot of the whole index as of the deltas <= dt, one
+  row per key, with canonical_dt (the partition holding the key's canonical row)
+
+A read as of dt uses the latest snapshot before dt plus the deltas between that snapshot
+and dt, so a run reads at most compact_after deltas however long the history is. The
+underscore prefix hides snapshots from readers of the delta partitions.
+"""
+
+import os
+import shutil
+from datetime import datetime, timedelta
+
+from pyspark.sql import DataFrame, SparkSession
+from pyspark.sql import functions as F
+
+KEY_COLS = ["experiment_id", "user_id"]
+INDEX_COLS = ["assignment_time_utc", "variant_id"]
+COMPACTED_DIR = "_compacted"
+DEFAULT_COMPACT_AFTER = 7
+
+
+def _days(path: str) -> list[str]:
+    """dt values of the dt=YYYY-MM-DD directories under path, sorted."""
+    if not os.path.isdir(path):
+        return []
+    return sorted(d[3:] for d in os.listdir(path) if d.startswith("dt=") and os.path.isdir(os.path.join(path, d)))
+
+
+def _next_day(dt: str) -> str:
+    return (datetime.strptime(dt, "%Y-%m-%d") + timedelta(days=1)).strftime("%Y-%m-%d")
+
+
+def exists(root: str) -> bool:
+    return bool(_days(root))
+
+
+def read_index(spark: SparkSession, root: str, before_dt: str, keys: DataFrame | None = None) -> DataFrame | None:
+    """
+    Earliest (assignment_time_utc, variant_id) and canonical_dt per key, from deltas before before_dt.
+
+    keys (experiment_id, user_id) restricts the read with a semi-join before the per-key
+    min. Returns None when nothing was indexed before before_dt.
+    """
+    snapshots = [d for d in _days(f"{root}/{COMPACTED_DIR}") if d < before_dt]
+    base_day = snapshots[-1] if snapshots else None
+    deltas = [d for d in _days(root) if d < before_dt and (base_day is None or d > base_day)]
+
+    frames = []
+    if base_day is not None:
+        frames.append(
+            spark.read.parquet(f"{root}/{COMPACTED_DIR}/dt={base_day}").select(*KEY_COLS, *INDEX_COLS, "canonical_dt")
+        )
+    if deltas:
+        frames.append(
+            spark.read.option("basePath", root)
+            .parquet(*[f"{root}/dt={d}" for d in deltas])
+            .select(*KEY_COLS, *INDEX_COLS, F.col("dt").cast("string").alias("canonical_dt"))
+        )
+    if not frames:
+        return None
+
+    entries = frames[0] if len(frames) == 1 else frames[0].unionByName(frames[1])
+    if keys is not None:
+        entries = entries.join(keys, KEY_COLS, "left_semi")
+    return (
+        entries.groupBy(*KEY_COLS)
+        .agg(F.min(F.struct(*INDEX_COLS, "canonical_dt")).alias("known"))
+        .select(*KEY_COLS, "known.*")
+    )
+
+
+def read_delta(spark: SparkSession, root: str, dt: str) -> DataFrame | None:
+    path = f"{root}/dt={dt}"
+    if not os.path.isdir(path):
+        return None
+    return spark.read.parquet(path)
+
+
+def write_delta(delta: DataFrame, root: str, dt: str) -> None:
+    """
+    Write dt's delta. Snapshots at or after dt folded in the delta being replaced, so they
+    are removed first; the next compaction rebuilds them.
+    """
+    for day in _days(f"{root}/{COMPACTED_DIR}"):
+        if day >= dt:
+            shutil.rmtree(f"{root}/{COMPACTED_DIR}/dt={day}")
+    delta.write.mode("overwrite").parquet(f"{root}/dt={dt}")
+
+
+def compact(spark: SparkSession, root: str, dt: str, compact_after: int) -> bool:
+    """
+    Snapshot the index as of dt once compact_after deltas have piled up since the last
+    snapshot. Returns whether a snapshot was written.
+    """
+    snapshots = [d for d in _days(f"{root}/{COMPACTED_DIR}") if d <= dt]
+    pending = [d for d in _days(root) if d <= dt and (not snapshots or d > snapshots[-1])]
+    if compact_after <= 0 or len(pending) < compact_after:
+        return False
+
+    snapshot = read_index(spark, root, _next_day(dt))
+    snapshot.repartition(*KEY_COLS).write.mode("overwrite").parquet(f"{root}/{COMPACTED_DIR}/dt={dt}")
+    return True
@@ -0,0 +1,57 @@
+"""
+DuckDB execution helpers for the single-node engine of jobs 10 and 20 (--engine duckdb).
+
+Layout and schema contract with the Spark engine:
+- inputs are read from the same data/<layer>/<table>/dt=YYYY-MM-DD directories
+- outputs are written as one parquet file per dt directory (overwrite semantics)
+- timestamps are written as UTC-adjusted TIMESTAMPTZ, which Spark reads as TimestampType
+- counts are BIGINT, rates and averages DOUBLE, flags BOOLEAN (Spark long/double/boolean)
+
+The connection runs in UTC, matching spark.sql.session.timeZone=UTC in the Spark jobs, so
+date truncation and timestamp-to-string casts agree between engines.
+"""
+
+import os
+import shutil
+
+import duckdb
+
+
+def connect() -> duckdb.DuckDBPyConnection:
+    con = duckdb.connect()
+    con.execute("SET TimeZone = 'UTC'")
+    return con
+
+
+def register_parquet(con: duckdb.DuckDBPyConnection, path: str, view_name: str) -> None:
+    """
+    Expose every parquet file under path as a temp view.
+
+    hive_partitioning is disabled because the dt value is already a column in the files.
+    """
+    glob = f"{path.rstrip('/')}/**/*.parquet"
+    con.execute(
+        f"create or replace temp view {view_name} as "
+        f"select * from read_parquet('{glob}', hive_partitioning = false)"
+    )
+
+
+def write_parquet(con: duckdb.DuckDBPyConnection, sql: str, path: str) -> None:
+    """Overwrite path with the result of sql, mirroring Spark's mode("overwrite")."""
+    if os.path.exists(path):
+        shutil.rmtree(path)
+    os.makedirs(path)
+    con.execute(f"copy ({sql}) to '{path}/part-00000.parquet' (format parquet, compression snappy)")
+    open(os.path.join(path, "_SUCCESS"), "w").close()
+
+
+def spark_timestamp_string(col: str) -> str:
+    """
+    SQL for Spark's cast(timestamp as string) in UTC: seconds precision, with the
+    fractional part appended only when non-zero and without trailing zeros.
+    """
+    return (
+        f"(strftime({col}, '%Y-%m-%d %H:%M:%S') || "
+        f"case when epoch_us({col}) % 1000000 = 0 then '' "
+        f"else rtrim('.' || lpad(cast(epoch_us({col}) % 1000000 as varchar), 6, '0'), '0') end)"
+    )
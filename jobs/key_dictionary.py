@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+Integer surrogate keys for experiment, user and variant ids.
+
+Reads:
+- data/raw/fact_assignment/dt=YYYY-MM-DD
+- data/raw/fact_exposure/dt=YYYY-MM-DD
+
+Writes:
+- data/silver/key_dictionary/<entity>/dt=YYYY-MM-DD (ids first seen on dt, with their key)
+- data/raw_encoded/fact_assignment/dt=YYYY-MM-DD
+- data/raw_encoded/fact_exposure/dt=YYYY-MM-DD
+
+Dictionaries:
+- experiment_id -> int, user_id -> bigint, variant_id -> int
+- append-only: ids not in the dictionary get keys after the global max key, in id
+  order, and are appended to the dt partition; entries are never rewritten
+- the full dictionary is read once per entity to find dt's known and new ids; the
+  encode joins then use only dt's entries
+- re-running a day finds its ids already keyed and adds nothing, so it encodes to the
+  same keys; re-running an earlier day after later ones cannot reuse their keys
+
+Encoded raw tables keep the column names (experiment_id, user_id, variant_id) with
+integer values, so jobs 10 and 20 run on them unchanged (--in data/raw_encoded): keys,
+joins, struct mins and shuffle records are integers instead of strings. Job 20 decodes
+the keys back to string ids when it writes silver and gold (--key_dictionary), so the
+dbt sources keep their string-id contract.
+"""
+
+import argparse
+import os
+
+import spark_session
+from pyspark import StorageLevel
+from pyspark.sql import DataFrame, SparkSession
+from pyspark.sql import functions as F
+
+# entity -> (id column, key type)
+ENTITIES = {
+    "experiment": ("experiment_id", "int"),
+    "user": ("user_id", "bigint"),
+    "variant": ("variant_id", "int"),
+}
+
+# dictionaries this small are broadcast when encoding/decoding
+BROADCAST_ENTITIES = {"experiment", "variant"}
+
+ENCODED_TABLES = ["fact_assignment", "fact_exposure"]
+
+
+def parse_args() -> argparse.Namespace:
+    p = argparse.ArgumentParser()
+    p.add_argument("--dt", required=True, help="Partition date, e.g. 2026-02-01")
+    p.add_argument("--in", dest="in_path", default="data/raw", help="Base raw input path (default: data/raw)")
+    p.add_argument(
+        "--out", dest="out_path", default="data/raw_encoded", help="Base encoded output path (default: data/raw_encoded)"
+    )
+    p.add_argument(
+        "--dictionary",
+        dest="dictionary_path",
+        default="data/silver/key_dictionary",
+        help="Dictionary root (default: data/silver/key_dictionary)",
+    )
+    return p.parse_args()
+
+
+def write_parquet(df, path: str) -> None:
+    df.write.mode("overwrite").parquet(path)
+
+
+def load_dictionary(spark: SparkSession, root: str, entity: str) -> DataFrame:
+    """All (id, key) pairs of entity."""
+    _, key_type = ENTITIES[entity]
+    path = f"{root}/{entity}"
+    if not os.path.isdir(path):
+        return spark.createDataFrame([], f"id string, key {key_type}")
+    return spark.read.parquet(path).select("id", F.col("key").cast(key_type).alias("key"))
+
+
+def update_dictionary(spark: SparkSession, root: str, entity: str, ids: DataFrame, dt: str) -> DataFrame:
+    """
+    Add ids not yet in the dictionary and return the (id, key) entries of ids only.
+
+    New keys are dense after the global max key, in id order, and are appended to the dt
+    partition. Ids already in any partition keep their key, so re-running a day (or an
+    earlier day after later ones) never reassigns or reuses a key.
+    The full dictionary is joined once against the batch's distinct ids; encode() then
+    joins the batch tables against this batch-sized dictionary instead of the full one.
+    """
+    _, key_type = ENTITIES[entity]
+    existing = load_dictionary(spark, root, entity)
+    max_key = existing.agg(F.max("key")).collect()[0][0] or 0
+
+    matched = (
+        ids.filter(F.col("id").isNotNull())
+        .distinct()
+        .join(existing, "id", "left")
+        .persist(StorageLevel.MEMORY_AND_DISK)
+    )
+    new_ids = matched.filter(F.col("key").isNull()).select("id").orderBy("id")
+    new_entries = spark.createDataFrame(
+        new_ids.rdd.zipWithIndex().map(lambda r: (r[0]["id"], max_key + 1 + r[1])),
+        f"id string, key {key_type}",
+    ).persist(StorageLevel.MEMORY_AND_DISK)
+    if new_entries.count():
+        new_entries.write.mode("append").parquet(f"{root}/{entity}/dt={dt}")
+
+    known = matched.filter(F.col("key").isNotNull())
+    return known.unionByName(new_entries)
+
+
+def encode(df: DataFrame, entity: str, dictionary: DataFrame) -> DataFrame:
+    """Replace the entity's id column with its integer key (nulls and unknown ids stay null)."""
+    id_col, _ = ENTITIES[entity]
+    if entity in BROADCAST_ENTITIES:
+        dictionary = F.broadcast(dictionary)
+    return (
+        df.join(dictionary.withColumnRenamed("id", id_col), id_col, "left")
+        .drop(id_col)
+        .withColumnRenamed("key", id_col)
+        .select(*df.columns)
+    )
+
+
+def decode(df: DataFrame, entity: str, dictionary: DataFrame, col: str | None = None) -> DataFrame:
+    """Inverse of encode: replace a key column of entity (default: its id column) with the string id."""
+    col = col or ENTITIES[entity][0]
+    if entity in BROADCAST_ENTITIES:
+        dictionary = F.broadcast(dictionary)
+    return (
+        df.join(dictionary.withColumnRenamed("key", col), col, "left")
+        .drop(col)
+        .withColumnRenamed("id", col)
+        .select(*df.columns)
+    )
+
+
+def main() -> None:
+    args = parse_args()
+    dt = args.dt
+    in_base = args.in_path.rstrip("/")
+    out_base = args.out_path.rstrip("/")
+    dictionary_root = args.dictionary_path.rstrip("/")
+
+    spark = spark_session.build_session(
+        "experimentation-analytics-platform-key-dictionary",
+        [f"{in_base}/{name}/dt={dt}" for name in ENCODED_TABLES],
+    )
+
+    tables = {name: spark.read.parquet(f"{in_base}/{name}/dt={dt}") for name in ENCODED_TABLES}
+
+    # -----------------------------
+    # 1) Extend dictionaries with ids first seen on dt (keeps the entries of dt's ids)
+    # -----------------------------
+    dictionaries = {}
+    for entity, (id_col, _) in ENTITIES.items():
+        ids = None
+        for df in tables.values():
+            table_ids = df.select(F.col(id_col).alias("id"))
+            ids = table_ids if ids is None else ids.unionByName(table_ids)
+        dictionaries[entity] = update_dictionary(spark, dictionary_root, entity, ids, dt)
+
+    # -----------------------------
+    # 2) Write encoded raw tables
+    # -----------------------------
+    for name, df in tables.items():
+        for entity in ENTITIES:
+            df = encode(df, entity, dictionaries[entity])
+        write_parquet(df, f"{out_base}/{name}/dt={dt}")
+
+    sizes = {entity: dictionaries[entity].count() for entity in ENTITIES}
+    spark.stop()
+
+    print("✅ Built key dictionaries + encoded raw tables")
+    print(f"dt: {dt}")
+    print(f"dictionary: {dictionary_root}")
+    print(f"encoded: {out_base}")
+    print(" ".join(f"{entity}_keys_in_dt={n}" for entity, n in sizes.items()))
+
+
+if __name__ == "__main__":
+    main()
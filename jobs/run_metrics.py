@@ -0,0 +1,229 @@
+"""
+Stage-level run metrics shared by jobs 00, 10 and 20.
+
+A job wraps each phase in a stage marker:
+
+    recorder = run_metrics.RunMetrics("10_build_assignments", dt, engine="spark")
+    recorder.attach(spark)
+    with recorder.stage("dedupe"):
+        ...
+
+Inside a marker every Spark job runs under its own job group (SparkContext.setJobGroup).
+When the marker exits, the group's jobs and stages are looked up in the application's
+status REST API (the Spark UI, /api/v1) and their task metrics are summed:
+input/output rows and bytes, shuffle read/write bytes, memory/disk spill and the peak
+executor JVM heap (null when no executor heartbeat landed during the stage). Wall time
+is measured by the marker itself, so DuckDB runs and stages without Spark work still
+get a row (with null Spark metrics).
+
+The metrics come from polling the REST API rather than a SparkListener: PySpark has no
+Python listener interface, and the status API serves the same per-stage task metrics
+summed by the listener bus. Without a UI (spark.ui.enabled=false, so no uiWebUrl) or
+when the API stops answering, a warning is printed and the rows keep wall time only.
+
+The status store is fed asynchronously by the listener bus, so the group's jobs are
+polled until every one is SUCCEEDED or FAILED (at most POLL_TIMEOUT_SECONDS; a marker
+that times out is recorded with the metrics seen so far and a warning).
+
+Spark evaluates lazily: a stage's metrics belong to the actions run inside its marker
+(writes, counts, collects), so markers sit around those actions and a stage may include
+upstream work that was not materialized earlier.
+
+write() appends one parquet file per run to <root>/dt=YYYY-MM-DD, so reruns never
+rewrite another run's rows.
+"""
+
+import argparse
+import json
+import os
+import time
+import urllib.error
+import urllib.request
+import uuid
+from contextlib import contextmanager
+from datetime import UTC, datetime
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+from pyspark.sql import SparkSession
+
+DEFAULT_ROOT = "data/silver/run_metrics"
+
+SCHEMA = pa.schema(
+    [
+        ("run_id", pa.string()),
+        ("job", pa.string()),
+        ("engine", pa.string()),
+        ("dt", pa.string()),
+        ("stage", pa.string()),
+        ("stage_order", pa.int32()),
+        ("status", pa.string()),
+        ("started_at_utc", pa.timestamp("us", tz="UTC")),
+        ("ended_at_utc", pa.timestamp("us", tz="UTC")),
+        ("wall_seconds", pa.float64()),
+        ("spark_jobs", pa.int64()),
+        ("spark_stages", pa.int64()),
+        ("tasks", pa.int64()),
+        ("executor_run_seconds", pa.float64()),
+        ("input_rows", pa.int64()),
+        ("input_bytes", pa.int64()),
+        ("output_rows", pa.int64()),
+        ("output_bytes", pa.int64()),
+        ("shuffle_read_bytes", pa.int64()),
+        ("shuffle_write_bytes", pa.int64()),
+        ("memory_spill_bytes", pa.int64()),
+        ("disk_spill_bytes", pa.int64()),
+        ("peak_executor_memory_bytes", pa.int64()),
+    ]
+)
+
+# REST stage field -> run_metrics column, summed over the stage attempts of a marker
+STAGE_SUMS = {
+    "numCompleteTasks": "tasks",
+    "inputRecords": "input_rows",
+    "inputBytes": "input_bytes",
+    "outputRecords": "output_rows",
+    "outputBytes": "output_bytes",
+    "shuffleReadBytes": "shuffle_read_bytes",
+    "shuffleWriteBytes": "shuffle_write_bytes",
+    "memoryBytesSpilled": "memory_spill_bytes",
+    "diskBytesSpilled": "disk_spill_bytes",
+}
+
+
+# the listener bus usually catches up within milliseconds of the action returning
+POLL_TIMEOUT_SECONDS = 30.0
+POLL_INTERVAL_SECONDS = 0.1
+FINISHED_JOB_STATUSES = {"SUCCEEDED", "FAILED"}
+
+
+def add_run_metrics_args(p: argparse.ArgumentParser) -> None:
+    p.add_argument(
+        "--run_metrics",
+        dest="run_metrics_path",
+        default=DEFAULT_ROOT,
+        help=f"Root of the run_metrics table (default: {DEFAULT_ROOT})",
+    )
+    p.add_argument("--no_run_metrics", action="store_true", help="Do not record stage-level run metrics")
+
+
+def _get_json(url: str):
+    with urllib.request.urlopen(url, timeout=10) as response:
+        return json.load(response)
+
+
+class RunMetrics:
+    """Collects one row per stage marker of a job run."""
+
+    def __init__(self, job: str, dt: str, engine: str = "spark"):
+        self.job = job
+        self.dt = dt
+        self.engine = engine
+        self.run_id = f"{job}-{datetime.now(UTC):%Y%m%dT%H%M%S}-{uuid.uuid4().hex[:8]}"
+        self.rows: list[dict] = []
+        self._spark = None
+        self._api = None
+
+    def attach(self, spark: SparkSession) -> None:
+        """Record Spark metrics for markers entered from now on (wall time only without a UI)."""
+        sc = spark.sparkContext
+        self._spark = spark
+        if not sc.uiWebUrl:
+            print("run_metrics: Spark UI disabled, no status API to read; recording wall time only")
+            self._api = None
+            return
+        self._api = f"{sc.uiWebUrl.rstrip('/')}/api/v1/applications/{sc.applicationId}"
+
+    @contextmanager
+    def stage(self, name: str, dt: str | None = None):
+        group = f"{self.run_id}:{len(self.rows)}:{name}"
+        sc = self._spark.sparkContext if self._spark is not None else None
+        if sc is not None:
+            sc.setJobGroup(group, f"{self.job} {name}")
+
+        started = datetime.now(UTC)
+        t0 = time.perf_counter()
+        status = "succeeded"
+        try:
+            yield
+        except BaseException:
+            status = "failed"
+            raise
+        finally:
+            wall = time.perf_counter() - t0
+            if sc is not None:
+                sc.setLocalProperty("spark.jobGroup.id", None)
+                sc.setLocalProperty("spark.job.description", None)
+            row = {
+                "run_id": self.run_id,
+                "job": self.job,
+                "engine": self.engine,
+                "dt": dt or self.dt,
+                "stage": name,
+                "stage_order": len(self.rows),
+                "status": status,
+                "started_at_utc": started,
+                "ended_at_utc": datetime.now(UTC),
+                "wall_seconds": wall,
+            }
+            row.update(self._spark_metrics(group) if sc is not None else {})
+            self.rows.append(row)
+
+    def _finished_jobs(self, group: str) -> list[dict]:
+        """The group's jobs from the status API, polled until all of them have finished."""
+        deadline = time.monotonic() + POLL_TIMEOUT_SECONDS
+        while True:
+            jobs = [j for j in _get_json(f"{self._api}/jobs") if j.get("jobGroup") == group]
+            running = [j["jobId"] for j in jobs if j.get("status") not in FINISHED_JOB_STATUSES]
+            if not running:
+                return jobs
+            if time.monotonic() >= deadline:
+                print(
+                    f"run_metrics: jobs {running} of {group} still unfinished after "
+                    f"{POLL_TIMEOUT_SECONDS:.0f}s; recording partial metrics"
+                )
+                return jobs
+            time.sleep(POLL_INTERVAL_SECONDS)
+
+    def _spark_metrics(self, group: str) -> dict:
+        if self._api is None:
+            return {}
+        try:
+            jobs = self._finished_jobs(group)
+            stage_ids = sorted({s for j in jobs for s in j.get("stageIds", [])})
+            attempts = []
+            for stage_id in stage_ids:
+                try:
+                    attempts.extend(_get_json(f"{self._api}/stages/{stage_id}"))
+                except urllib.error.HTTPError:
+                    continue  # skipped stages (reused shuffle output) have no attempt data
+        except (urllib.error.URLError, OSError, ValueError) as e:
+            print(f"run_metrics: Spark status API unavailable ({e}); recording wall time only")
+            self._api = None
+            return {}
+
+        metrics = {column: sum(a.get(field, 0) for a in attempts) for field, column in STAGE_SUMS.items()}
+        heap = [a.get("peakExecutorMetrics", {}).get("JVMHeapMemory") for a in attempts]
+        heap = [h for h in heap if h]
+        metrics.update(
+            spark_jobs=len(jobs),
+            spark_stages=len(attempts),
+            executor_run_seconds=sum(a.get("executorRunTime", 0) for a in attempts) / 1000.0,
+            peak_executor_memory_bytes=max(heap) if heap else None,
+        )
+        return metrics
+
+    def write(self, root: str) -> list[str]:
+        """Append this run's rows to <root>/dt=<dt>/<run_id>.parquet; returns the files written."""
+        paths = []
+        for dt in sorted({row["dt"] for row in self.rows}):
+            rows = [row for row in self.rows if row["dt"] == dt]
+            table = pa.Table.from_pylist(rows, schema=SCHEMA)
+            path = os.path.join(root.rstrip("/"), f"dt={dt}", f"{self.run_id}.parquet")
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            pq.write_table(table, path)
+            paths.append(path)
+        return paths
+
+    def summary(self) -> str:
+        return " ".join(f"{row['stage']}={row['wall_seconds']:.1f}s" for row in self.rows)
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+Run generate -> canonical assignments (J1) -> exposure validation (J2) in one SparkSession.
+
+Writes:
+- data/silver/fact_assignment_canonical/dt=YYYY-MM-DD
+- data/silver/metrics_assignment_quality/dt=YYYY-MM-DD
+- data/silver/int_experiment_exposures_deduped/dt=YYYY-MM-DD
+- data/silver/int_experiment_exposure_validation/dt=YYYY-MM-DD
+- data/gold/fct_experiment_quality_metrics_daily/dt=YYYY-MM-DD
+- data/raw/<table>/dt=YYYY-MM-DD (only with --write_raw)
+
+Why this runner exists:
+- Each job in jobs/ starts its own JVM and hands data to the next job through parquet.
+- Here DataFrames flow between stages in memory and only final outputs are written.
+- Handoff frames are persisted (or checkpointed with --checkpoint_dir), so upstream
+  lineage, including the hash-based generator draws, is evaluated once per run.
+
+The stage logic lives in the individual jobs; this runner only wires them together.
+"""
+
+import argparse
+import importlib
+
+import spark_session
+from pyspark import StorageLevel
+from pyspark.sql import DataFrame
+
+generate_data = importlib.import_module("00_generate_data")
+build_assignments = importlib.import_module("10_build_assignments")
+build_exposure_validation = importlib.import_module("20_build_exposure_validation")
+
+
+def parse_args() -> argparse.Namespace:
+    p = argparse.ArgumentParser()
+    p.add_argument("--dt", required=True, help="Partition date, e.g. 2026-02-01")
+    p.add_argument("--raw", dest="raw_path", default="data/raw", help="Base raw path (default: data/raw)")
+    p.add_argument("--silver", dest="silver_path", default="data/silver", help="Base silver path (default: data/silver)")
+    p.add_argument("--gold", dest="gold_path", default="data/gold", help="Base gold path (default: data/gold)")
+
+    generate_data.add_generation_args(p)
+
+    p.add_argument("--assignments_mode", choices=["single_pass", "legacy"], default="single_pass")
+    p.add_argument("--validation_mode", choices=["single_pass", "legacy"], default="single_pass")
+    p.add_argument("--max_days_after_assignment", type=int, default=7, help="Max exposure window after assignment")
+    p.add_argument("--pre_assignment_grace_minutes", type=int, default=5, help="Grace window before assignment")
+    p.add_argument(
+        "--check_equivalence",
+        action="store_true",
+        help="Also build the legacy J2 output and fail if it differs from --validation_mode",
+    )
+
+    # handoff between stages
+    p.add_argument("--write_raw", action="store_true", help="Also write the generated raw tables")
+    p.add_argument(
+        "--persist_level",
+        choices=["NONE", "MEMORY_ONLY", "MEMORY_AND_DISK", "DISK_ONLY"],
+        default="MEMORY_AND_DISK",
+        help="Storage level for frames handed from one stage to the next",
+    )
+    p.add_argument(
+        "--checkpoint_dir",
+        default=None,
+        help="If set, handoff frames are eagerly checkpointed here instead of persisted (truncates lineage)",
+    )
+    return p.parse_args()
+
+
+def handoff(df: DataFrame, args: argparse.Namespace) -> DataFrame:
+    if args.checkpoint_dir:
+        return df.checkpoint(eager=True)
+    if args.persist_level == "NONE":
+        return df
+    return df.persist(getattr(StorageLevel, args.persist_level))
+
+
+def main() -> None:
+    args = parse_args()
+    dt = args.dt
+    raw_base = args.raw_path.rstrip("/")
+    silver_base = args.silver_path.rstrip("/")
+    gold_base = args.gold_path.rstrip("/")
+
+    rows = generate_data.estimate_rows(args)
+    spark = spark_session.build_session(
+        "experimentation-analytics-platform-pipeline",
+        estimated_rows=rows,
+        estimated_bytes=rows * generate_data.BYTES_PER_ROW,
+    )
+    if args.checkpoint_dir:
+        spark.sparkContext.setCheckpointDir(args.checkpoint_dir)
+
+    # -----------------------------
+    # 1) Generate raw data (in memory)
+    # -----------------------------
+    tables = generate_data.generate(spark, args)
+
+    # fact_exposure is derived from fact_assignment; persisting assignments first
+    # lets the exposure plan reuse the cached rows instead of redrawing them.
+    fact_assignment = handoff(tables["fact_assignment"], args)
+    fact_exposure = handoff(tables["fact_exposure"], args)
+
+    if args.write_raw:
+        tables["fact_assignment"] = fact_assignment
+        tables["fact_exposure"] = fact_exposure
+        for name in generate_data.RAW_TABLES:
+            generate_data.write_parquet(tables[name], f"{raw_base}/{name}/dt={dt}")
+
+    # -----------------------------
+    # 2) J1: canonical assignments
+    # -----------------------------
+    canonical, stats = build_assignments.canonicalize(fact_assignment, args.assignments_mode)
+    canonical = handoff(canonical, args)
+
+    out_canonical = f"{silver_base}/fact_assignment_canonical/dt={dt}"
+    build_assignments.write_parquet(canonical, out_canonical)
+
+    out_metrics = f"{silver_base}/metrics_assignment_quality/dt={dt}"
+    build_assignments.write_parquet(build_assignments.build_metrics(spark, dt, stats), out_metrics)
+
+    fact_assignment.unpersist()
+
+    # -----------------------------
+    # 3) J2: exposure validation + quality metrics
+    # -----------------------------
+    validation_args = argparse.Namespace(
+        mode=args.validation_mode,
+        max_days_after_assignment=args.max_days_after_assignment,
+        pre_assignment_grace_minutes=args.pre_assignment_grace_minutes,
+        exposure_event_id="sha2",
+        check_equivalence=args.check_equivalence,
+    )
+    exposures_deduped, validation = build_exposure_validation.build_validation(
+        canonical, fact_exposure, validation_args
+    )
+
+    out_exposures = f"{silver_base}/int_experiment_exposures_deduped/dt={dt}"
+    build_exposure_validation.write_parquet(exposures_deduped, out_exposures)
+
+    out_validation = f"{silver_base}/int_experiment_exposure_validation/dt={dt}"
+    build_exposure_validation.write_parquet(validation, out_validation)
+
+    out_quality = f"{gold_base}/fct_experiment_quality_metrics_daily/dt={dt}"
+    build_exposure_validation.write_parquet(
+        build_exposure_validation.build_daily_quality(validation, dt), out_quality
+    )
+
+    print("✅ Ran pipeline in one session (generate -> J1 -> J2)")
+    print(f"dt: {dt}")
+    print(f"raw written: {args.write_raw}")
+    print(f"handoff: {'checkpoint ' + args.checkpoint_dir if args.checkpoint_dir else args.persist_level}")
+    print(f"canonical: {out_canonical}")
+    print(f"validation: {out_validation}")
+    print(f"quality: {out_quality}")
+    print(
+        f"raw_rows={stats['raw_rows']} unique_keys={stats['unique_keys']} "
+        f"dup_keys={stats['duplicate_keys_count']} dup_rows_excess={stats['duplicate_rows_excess']}"
+    )
+
+    spark.stop()
+
+
+if __name__ == "__main__":
+    main()
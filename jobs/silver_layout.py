@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""
+Bucketed, sorted layout for silver tables keyed by (experiment_id, user_id).
+
+A bucketed dt partition is written with bucketBy/sortBy on the key columns and carries
+a _layout.json manifest next to its parquet files:
+
+    {"layout": "bucketed", "bucket_columns": [...], "sort_columns": [...], "bucket_count": 64}
+
+Spark keeps bucket specs in the catalog, not in the files, so read_table() re-registers
+the partition as a bucketed table from the manifest. Inside bucketed_shuffle(), which
+sets spark.sql.shuffle.partitions to the bucket count and restores it on exit, frames
+hash-partitioned on the same keys (groupBy / repartition / join on experiment_id,
+user_id) line up with the buckets and the join plans no Exchange on the bucketed side.
+Plain partitions (no manifest) read as ordinary parquet.
+
+Bucketed files are regular parquet (bucket id in the file name), so the DuckDB engine
+and any other reader still see the same rows.
+
+Compaction (this file as a script):
+- rewrites one dt partition to files of about --target_file_mb
+- bucketed partitions are rewritten to one file per bucket
+- the rewrite is staged in an underscore-prefixed sibling directory and renamed into place
+"""
+
+import argparse
+import json
+import math
+import os
+import re
+import shutil
+from contextlib import contextmanager
+
+import spark_session
+from pyspark.sql import DataFrame, SparkSession
+
+LAYOUT_FILE = "_layout.json"
+KEY_COLS = ["experiment_id", "user_id"]
+DEFAULT_BUCKETS = 64
+
+
+def add_layout_args(p: argparse.ArgumentParser) -> None:
+    p.add_argument(
+        "--layout",
+        choices=["plain", "bucketed"],
+        default="plain",
+        help="Silver output layout: plain parquet or bucketed + sorted by (experiment_id, user_id)",
+    )
+    p.add_argument(
+        "--buckets",
+        type=int,
+        default=DEFAULT_BUCKETS,
+        help=f"Bucket count for --layout bucketed; keep it equal across silver tables (default: {DEFAULT_BUCKETS})",
+    )
+
+
+def read_layout(path: str) -> dict | None:
+    manifest = os.path.join(path, LAYOUT_FILE)
+    if not os.path.isfile(manifest):
+        return None
+    with open(manifest) as f:
+        return json.load(f)
+
+
+def _table_name(path: str) -> str:
+    return "silver_" + re.sub(r"[^0-9a-zA-Z]+", "_", os.path.abspath(path)).strip("_")
+
+
+def staging_path(path: str, label: str) -> str:
+    # underscore prefix hides the directory from Spark reads of the table root
+    root, partition = os.path.split(path.rstrip("/"))
+    return os.path.join(root, f"_{label}-{partition}")
+
+
+def swap_in(staged: str, path: str) -> None:
+    replaced = staging_path(path, "replaced")
+    if os.path.exists(replaced):
+        shutil.rmtree(replaced)
+    if os.path.exists(path):
+        os.rename(path, replaced)
+    os.rename(staged, path)
+    if os.path.exists(replaced):
+        shutil.rmtree(replaced)
+
+
+def write_table(df: DataFrame, path: str, layout: str = "plain", buckets: int = DEFAULT_BUCKETS) -> None:
+    """Overwrite path with df in the requested layout (and its manifest when bucketed)."""
+    if layout != "bucketed":
+        df.write.mode("overwrite").parquet(path)
+        return
+
+    # One task per bucket, so every bucket is a single sorted file
+    (
+        df.repartition(buckets, *KEY_COLS)
+        .write.mode("overwrite")
+        .bucketBy(buckets, *KEY_COLS)
+        .sortBy(*KEY_COLS)
+        .option("path", os.path.abspath(path))
+        .saveAsTable(_table_name(path))
+    )
+    with open(os.path.join(path, LAYOUT_FILE), "w") as f:
+        json.dump(
+            {"layout": "bucketed", "bucket_columns": KEY_COLS, "sort_columns": KEY_COLS, "bucket_count": buckets},
+            f,
+        )
+
+
+def read_table(spark: SparkSession, path: str) -> DataFrame:
+    """
+    Read a silver dt partition, as a bucketed table when it has a layout manifest.
+
+    Session conf is left alone; run the actions that should line up with the buckets
+    inside bucketed_shuffle(spark, path).
+    """
+    layout = read_layout(path)
+    if layout is None or layout.get("layout") != "bucketed":
+        return spark.read.parquet(path)
+
+    name = _table_name(path)
+    schema = spark.read.parquet(path).schema
+    columns = ", ".join(f"`{f.name}` {f.dataType.simpleString()}" for f in schema.fields)
+    spark.sql(f"drop table if exists {name}")
+    spark.sql(
+        f"create table {name} ({columns}) using parquet "
+        f"clustered by ({', '.join(layout['bucket_columns'])}) "
+        f"sorted by ({', '.join(layout['sort_columns'])}) "
+        f"into {layout['bucket_count']} buckets "
+        f"location '{os.path.abspath(path)}'"
+    )
+    return spark.table(name)
+
+
+@contextmanager
+def bucketed_shuffle(spark: SparkSession, path: str):
+    """
+    Shuffle partitions = the bucket count of path's layout while the block runs.
+
+    The previous value is restored on exit, so later stages sharing the session keep
+    their own sizing. Plain partitions leave the conf unchanged.
+    """
+    layout = read_layout(path)
+    if layout is None or layout.get("layout") != "bucketed":
+        yield
+        return
+
+    previous = spark.conf.get("spark.sql.shuffle.partitions")
+    spark.conf.set("spark.sql.shuffle.partitions", str(layout["bucket_count"]))
+    try:
+        yield
+    finally:
+        spark.conf.set("spark.sql.shuffle.partitions", previous)
+
+
+def parquet_bytes(path: str) -> int:
+    return sum(
+        os.path.getsize(os.path.join(path, name)) for name in os.listdir(path) if name.endswith(".parquet")
+    )
+
+
+def compact(spark: SparkSession, path: str, target_file_mb: int) -> dict:
+    """
+    Rewrite a dt partition to files of about target_file_mb (one per bucket when bucketed).
+
+    Returns {"files_before", "files_after", "bytes"}.
+    """
+    files_before = len([n for n in os.listdir(path) if n.endswith(".parquet")])
+    total_bytes = parquet_bytes(path)
+    layout = read_layout(path)
+    staged = staging_path(path, "compact")
+
+    df = read_table(spark, path)
+    if layout is not None and layout.get("layout") == "bucketed":
+        write_table(df, staged, "bucketed", layout["bucket_count"])
+    else:
+        n_files = max(1, math.ceil(total_bytes / (target_file_mb * 1024 * 1024)))
+        write_table(df.repartition(n_files), staged)
+
+    swap_in(staged, path)
+    files_after = len([n for n in os.listdir(path) if n.endswith(".parquet")])
+    return {"files_before": files_before, "files_after": files_after, "bytes": total_bytes}
+
+
+def parse_args() -> argparse.Namespace:
+    p = argparse.ArgumentParser()
+    p.add_argument("--path", required=True, help="dt partition to compact, e.g. data/silver/<table>/dt=2026-02-01")
+    p.add_argument("--target_file_mb", type=int, default=128, help="Target parquet file size in MB (default: 128)")
+    return p.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    path = args.path.rstrip("/")
+
+    spark = spark_session.build_session("experimentation-analytics-platform-compact-silver", [path])
+
+    stats = compact(spark, path, args.target_file_mb)
+    spark.stop()
+
+    print("✅ Compacted silver partition")
+    print(f"path: {path}")
+    print(f"layout: {(read_layout(path) or {}).get('layout', 'plain')}")
+    print(f"files: {stats['files_before']} -> {stats['files_after']} ({stats['bytes'] / 1024 / 1024:.1f} MB)")
+
+
+if __name__ == "__main__":
+    main()
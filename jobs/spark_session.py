@@ -0,0 +1,134 @@
+"""
+Shared SparkSession factory sized from the job's input.
+
+build_session() reads the parquet footers under the input paths (file sizes, row counts
+and uncompressed row-group sizes, no data pages) and picks:
+- spark.sql.shuffle.partitions: uncompressed input / TARGET_PARTITION_BYTES, at least one
+  task per core and at most MAX_SHUFFLE_PARTITIONS. Small inputs therefore start at the
+  core count, not at one partition; AQE coalescing then merges post-shuffle partitions
+  smaller than its 1 MB minimum, so a tiny shuffle still runs as a single reduce task
+- spark.sql.autoBroadcastJoinThreshold: 5% of the uncompressed input, 10 MB..100 MB
+- AQE with partition coalescing and skew-join splitting at 2x the target partition size
+- spark.driver.memory (local mode runs everything in the driver): 2x the uncompressed
+  input, 1 GB..75% of physical memory; only applies when no JVM is running yet
+
+One setting is fixed rather than sized: spark.sql.session.timeZone is SESSION_TIME_ZONE
+(UTC) for every job. Dates derived from timestamps (dt, date_day) and the
+timestamp-to-string casts inside exposure_event_id depend on the session time zone, so
+pinning it keeps outputs independent of the host's time zone and equal to the DuckDB
+engine's, whose connection also runs in UTC (duckdb_engine.py). Each job set it on its
+own session before this factory existed.
+
+Jobs without parquet input (the generator) pass an estimate instead. The chosen plan is
+printed before the session starts, so every run logs why it got its settings.
+"""
+
+import glob
+import math
+import os
+
+import pyarrow.parquet as pq
+from pyspark import SparkContext
+from pyspark.sql import SparkSession
+
+MB = 1024 * 1024
+GB = 1024 * MB
+
+TARGET_PARTITION_BYTES = 128 * MB
+MAX_SHUFFLE_PARTITIONS = 4000
+MIN_BROADCAST_BYTES = 10 * MB
+MAX_BROADCAST_BYTES = 100 * MB
+MIN_DRIVER_MEMORY_GB = 1
+SESSION_TIME_ZONE = "UTC"
+
+
+def input_stats(paths: list[str]) -> dict:
+    """Files, on-disk bytes, uncompressed bytes and rows of all parquet files under paths."""
+    stats = {"files": 0, "bytes": 0, "uncompressed_bytes": 0, "rows": 0}
+    for path in paths:
+        for f in glob.glob(os.path.join(path, "**", "*.parquet"), recursive=True):
+            if "/_" in f[len(path):]:
+                continue  # staging / hidden directories
+            metadata = pq.read_metadata(f)
+            stats["files"] += 1
+            stats["bytes"] += os.path.getsize(f)
+            stats["rows"] += metadata.num_rows
+            stats["uncompressed_bytes"] += sum(
+                metadata.row_group(i).total_byte_size for i in range(metadata.num_row_groups)
+            )
+    return stats
+
+
+def _physical_memory_bytes() -> int:
+    try:
+        return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES")
+    except (ValueError, OSError, AttributeError):
+        return 8 * GB
+
+
+def plan_session(stats: dict) -> dict:
+    """Spark conf for an input of the given size (see module docstring)."""
+    cores = os.cpu_count() or 1
+    data_bytes = stats["uncompressed_bytes"]
+
+    shuffle_partitions = min(MAX_SHUFFLE_PARTITIONS, max(cores, math.ceil(data_bytes / TARGET_PARTITION_BYTES)))
+    broadcast_bytes = min(MAX_BROADCAST_BYTES, max(MIN_BROADCAST_BYTES, data_bytes // 20))
+    max_driver_gb = max(MIN_DRIVER_MEMORY_GB, int(_physical_memory_bytes() * 0.75 // GB))
+    driver_gb = min(max_driver_gb, max(MIN_DRIVER_MEMORY_GB, math.ceil(2 * data_bytes / GB)))
+
+    return {
+        "spark.sql.shuffle.partitions": str(shuffle_partitions),
+        "spark.sql.autoBroadcastJoinThreshold": str(broadcast_bytes),
+        "spark.sql.adaptive.enabled": "true",
+        "spark.sql.adaptive.coalescePartitions.enabled": "true",
+        "spark.sql.adaptive.advisoryPartitionSizeInBytes": str(TARGET_PARTITION_BYTES),
+        "spark.sql.adaptive.skewJoin.enabled": "true",
+        "spark.sql.adaptive.skewJoin.skewedPartitionFactor": "5",
+        "spark.sql.adaptive.skewJoin.skewedPartitionThresholdInBytes": str(2 * TARGET_PARTITION_BYTES),
+        "spark.driver.memory": f"{driver_gb}g",
+    }
+
+
+def build_session(
+    app_name: str,
+    input_paths: list[str] | None = None,
+    estimated_rows: int = 0,
+    estimated_bytes: int = 0,
+) -> SparkSession:
+    """
+    Local SparkSession in SESSION_TIME_ZONE, sized from input_paths (or from the estimate when the job
+    has no parquet input). Prints the chosen plan.
+    """
+    stats = input_stats(input_paths or [])
+    if stats["files"] == 0:
+        stats = {"files": 0, "bytes": 0, "uncompressed_bytes": estimated_bytes, "rows": estimated_rows}
+
+    conf = plan_session(stats)
+    jvm_running = SparkContext._active_spark_context is not None
+
+    source = f"{stats['files']} files, {stats['bytes'] / MB:.1f} MB on disk" if stats["files"] else "estimate"
+    print(
+        f"spark plan ({app_name}): {source}, {stats['uncompressed_bytes'] / MB:.1f} MB uncompressed, "
+        f"{stats['rows']:,} rows -> "
+        f"shuffle_partitions={conf['spark.sql.shuffle.partitions']} "
+        f"broadcast_threshold={int(conf['spark.sql.autoBroadcastJoinThreshold']) // MB}MB "
+        f"driver_memory={conf['spark.driver.memory'] if not jvm_running else 'unchanged (JVM already running)'} "
+        f"aqe_skew_join=on time_zone={SESSION_TIME_ZONE}"
+    )
+
+    builder = (
+        SparkSession.builder
+        .appName(app_name)
+        .master("local[*]")
+        .config("spark.sql.session.timeZone", SESSION_TIME_ZONE)
+    )
+    for key, value in conf.items():
+        builder = builder.config(key, value)
+
+    spark = builder.getOrCreate()
+    # getOrCreate() on an existing session keeps its SQL conf; apply the runtime settings
+    for key, value in conf.items():
+        if key != "spark.driver.memory":
+            spark.conf.set(key, value)
+    spark.sparkContext.setLogLevel("WARN")
+    return spark
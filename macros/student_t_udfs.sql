@@ -0,0 +1,38 @@
+{#
+    Snowflake Python UDFs for the Student t distribution, used by the Welch t-test in
+    fct_experiment_results (Snowflake SQL has no t CDF/quantile). Same scipy functions
+    as scripts/experiment_stats.py, so both flavours report identical p-values and CIs.
+    Created by the model's pre_hook.
+#}
+
+{% macro create_student_t_two_sided_p() %}
+create or replace function {{ target.schema }}.student_t_two_sided_p(t float, df float)
+returns float
+language python
+runtime_version = '3.11'
+packages = ('scipy')
+handler = 'two_sided_p'
+returns null on null input
+as $$
+from scipy import special
+
+def two_sided_p(t, df):
+    return float(2 * special.stdtr(df, -abs(t)))
+$$
+{% endmacro %}
+
+{% macro create_student_t_ppf() %}
+create or replace function {{ target.schema }}.student_t_ppf(q float, df float)
+returns float
+language python
+runtime_version = '3.11'
+packages = ('scipy')
+handler = 'ppf'
+returns null on null input
+as $$
+from scipy import special
+
+def ppf(q, df):
+    return float(special.stdtrit(df, q))
+$$
+{% endmacro %}
@@ -1,26 +1,58 @@
-{{ config(materialized='table') }}
+{{
+    config(
+        materialized='incremental',
+        unique_key=['experiment_id', 'unit_id'],
+        incremental_strategy='merge'
+    )
+}}
 
 -- Grain: experiment_id + unit_id (one row per assignment)
 -- Join canonical assignments to exposures and compute validation flags.
 -- TODO: adjust column names to match your assignment model.
+-- Incremental runs revalidate keys assigned within the exposure window of the latest
+-- assignment plus keys with exposures in that window, using all exposures of those keys.
 
+{% if is_incremental() %}
+with changed_keys as (
+    select experiment_id, unit_id
+    from {{ ref('fct_experiment_assignments') }}
+    where assigned_at >= {{ incremental_lookback_start('assigned_at', exposure_lookback_days()) }}
+    union
+    select experiment_id, unit_id
+    from {{ ref('int_experiment_exposures_deduped') }}
+    where occurred_at >= {{ incremental_lookback_start('assigned_at', exposure_lookback_days()) }}
+)
+
+, assignments as (
+{% else %}
 with assignments as (
+{% endif %}
     select
-        experiment_id,
-        unit_id,
-        assigned_variation_id,
-        assigned_at
-    from {{ ref('fct_experiment_assignments') }}
+        a.experiment_id,
+        a.unit_id,
+        a.assigned_variation_id,
+        a.assigned_at
+    from {{ ref('fct_experiment_assignments') }} a
+    {% if is_incremental() %}
+    inner join changed_keys k
+        on a.experiment_id = k.experiment_id
+       and a.unit_id = k.unit_id
+    {% endif %}
 )
 
 , exposures as (
     select
-        experiment_id,
-        unit_id,
-        variation_id,
-        occurred_at,
-        event_id
-    from {{ ref('int_experiment_exposures_deduped') }}
+        e.experiment_id,
+        e.unit_id,
+        e.variation_id,
+        e.occurred_at,
+        e.event_id
+    from {{ ref('int_experiment_exposures_deduped') }} e
+    {% if is_incremental() %}
+    inner join changed_keys k
+        on e.experiment_id = k.experiment_id
+       and e.unit_id = k.unit_id
+    {% endif %}
 )
 
 , exposure_stats as (
@@ -1,12 +1,48 @@
-{{ config(materialized='table') }}
+{{
+    config(
+        materialized='incremental',
+        unique_key=['experiment_id', 'unit_id', 'variation_id'],
+        incremental_strategy='merge'
+    )
+}}
 
 -- Deterministic exposure dedupe: keep earliest event per (experiment_id, unit_id, variation_id).
 -- TODO: Adjust the dedupe window or key if your exposure events are noisy.
+-- Incremental runs rank the exposures of the lookback window together with the kept row
+-- of their keys, so an already-deduped earlier exposure still wins the merge.
 
 with src as (
-    select *
+    select
+        experiment_id,
+        unit_id,
+        variation_id,
+        occurred_at,
+        event_id,
+        ingested_at
     from {{ ref('stg_experiment_exposures') }}
+    {% if is_incremental() %}
+    where occurred_at >= {{ incremental_lookback_start('occurred_at', exposure_lookback_days()) }}
+    {% endif %}
+)
+
+{% if is_incremental() %}
+, src_with_kept as (
+    select * from src
+    union all
+    select
+        t.experiment_id,
+        t.unit_id,
+        t.variation_id,
+        t.occurred_at,
+        t.event_id,
+        t.ingested_at
+    from {{ this }} t
+    inner join (select distinct experiment_id, unit_id, variation_id from src) k
+        on t.experiment_id = k.experiment_id
+       and t.unit_id = k.unit_id
+       and t.variation_id = k.variation_id
 )
+{% endif %}
 
 , ranked as (
     select
@@ -24,7 +60,7 @@ with src as (
                 ingested_at asc,
                 event_id asc
         ) as rn
-    from src
+    from {% if is_incremental() %}src_with_kept{% else %}src{% endif %}
 )
 
 select
@@ -1,4 +1,17 @@
-{{ config(materialized='table') }}
+{{
+    config(
+        materialized='incremental',
+        unique_key=['experiment_id', 'unit_id', 'metric_id'],
+        incremental_strategy='merge',
+        on_schema_change='append_new_columns'
+    )
+}}
+
+-- A second as-of join finds the unit's latest conversion before first exposure: converting
+-- within exp_cuped_pre_period_days before exposure is the CUPED covariate (did_convert_pre).
+-- Incremental runs rebuild cohort rows first exposed within the exposure + conversion
+-- windows of the latest exposure; older outcomes can no longer change, and conversions
+-- are read from that start minus the pre-period only.
 
 with cohort as (
     select
@@ -9,6 +22,9 @@ with cohort as (
         , has_post_assignment_exposure
     from {{ ref('fct_experiment_cohort') }}
     where has_post_assignment_exposure = true
+    {% if is_incremental() %}
+      and first_exposure_at >= {{ incremental_lookback_start('exposure_at', conversion_lookback_days()) }}
+    {% endif %}
 )
 
 , conversions as (
@@ -16,24 +32,29 @@ with cohort as (
         unit_id
         , occurred_at
     from {{ ref('stg_conversion_events') }}
+    {% if is_incremental() %}
+    -- rebuilt cohort rows only look back as far as their pre-period
+    where occurred_at >= {{ incremental_lookback_start('exposure_at', conversion_lookback_days() + var('exp_cuped_pre_period_days', 14) | int) }}
+    {% endif %}
 )
 
-, joined as (
+, first_conversion as (
+    -- as-of join: the unit's earliest conversion at or after first exposure, so each
+    -- cohort row matches one event instead of fanning out over the unit's history
     select
         c.experiment_id
         , c.unit_id
         , c.assigned_variation_id as variation_id
         , c.first_exposure_at as exposure_at
-        , conv.occurred_at as conversion_at
+        , conv.occurred_at as first_conversion_at
+        , pre.occurred_at as last_pre_conversion_at
     from cohort c
-    left join conversions conv
+    asof join conversions conv
+        match_condition (c.first_exposure_at <= conv.occurred_at)
         on c.unit_id = conv.unit_id
-       and conv.occurred_at >= c.first_exposure_at
-       and conv.occurred_at < dateadd(
-            'day',
-            {{ var('exp_conversion_window_days', 7) }},
-            c.first_exposure_at
-        )
+    asof join conversions pre
+        match_condition (c.first_exposure_at > pre.occurred_at)
+        on c.unit_id = pre.unit_id
 )
 
 , rolled as (
@@ -42,8 +63,27 @@ with cohort as (
         , unit_id
         , variation_id
         , exposure_at
-        , min(conversion_at) as converted_at
-    from joined
+        , min(
+            case
+                when first_conversion_at < dateadd(
+                    'day',
+                    {{ var('exp_conversion_window_days', 7) }},
+                    exposure_at
+                )
+                    then first_conversion_at
+            end
+        ) as converted_at
+        , max(
+            case
+                when last_pre_conversion_at >= dateadd(
+                    'day',
+                    -{{ var('exp_cuped_pre_period_days', 14) }},
+                    exposure_at
+                )
+                    then last_pre_conversion_at
+            end
+        ) as pre_converted_at
+    from first_conversion
     group by 1,2,3,4
 )
 
@@ -56,4 +96,5 @@ select
     , {{ var('exp_conversion_window_days', 7) }} as window_days
     , case when converted_at is not null then true else false end as did_convert
     , converted_at
+    , case when pre_converted_at is not null then true else false end as did_convert_pre
 from rolled
@@ -0,0 +1,76 @@
+{{
+    config(
+        materialized='incremental',
+        unique_key=['experiment_id', 'unit_id', 'metric_id'],
+        incremental_strategy='merge',
+        on_schema_change='append_new_columns'
+    )
+}}
+
+-- Revenue of conversions within the window after first exposure, per experiment/unit;
+-- 0 for units without conversions, so the metric is defined for the whole cohort.
+-- The join reaches back exp_cuped_pre_period_days before first exposure: revenue in that
+-- pre-period (revenue_pre) is the CUPED covariate, read in the same pass.
+-- Incremental runs rebuild cohort rows first exposed within the exposure + conversion
+-- windows of the latest exposure; older outcomes can no longer change, and conversions
+-- are read from that start minus the pre-period only.
+
+with cohort as (
+    select
+        experiment_id
+        , unit_id
+        , assigned_variation_id
+        , first_exposure_at
+    from {{ ref('fct_experiment_cohort') }}
+    where has_post_assignment_exposure = true
+    {% if is_incremental() %}
+      and first_exposure_at >= {{ incremental_lookback_start('exposure_at', conversion_lookback_days()) }}
+    {% endif %}
+)
+
+, conversions as (
+    select
+        unit_id
+        , occurred_at
+        , coalesce(revenue, 0) as revenue
+    from {{ ref('stg_conversion_events') }}
+    {% if is_incremental() %}
+    -- rebuilt cohort rows only look back as far as their pre-period
+    where occurred_at >= {{ incremental_lookback_start('exposure_at', conversion_lookback_days() + var('exp_cuped_pre_period_days', 14) | int) }}
+    {% endif %}
+)
+
+, rolled as (
+    select
+        c.experiment_id
+        , c.unit_id
+        , c.assigned_variation_id as variation_id
+        , c.first_exposure_at as exposure_at
+        , coalesce(sum(case when conv.occurred_at >= c.first_exposure_at then conv.revenue end), 0) as revenue
+        , coalesce(sum(case when conv.occurred_at < c.first_exposure_at then conv.revenue end), 0) as revenue_pre
+    from cohort c
+    left join conversions conv
+        on c.unit_id = conv.unit_id
+       and conv.occurred_at >= dateadd(
+            'day',
+            -{{ var('exp_cuped_pre_period_days', 14) }},
+            c.first_exposure_at
+        )
+       and conv.occurred_at < dateadd(
+            'day',
+            {{ var('exp_conversion_window_days', 7) }},
+            c.first_exposure_at
+        )
+    group by 1,2,3,4
+)
+
+select
+    experiment_id
+    , unit_id
+    , variation_id
+    , exposure_at
+    , '{{ var("exp_revenue_metric_id", "revenue_7d") }}' as metric_id
+    , {{ var('exp_conversion_window_days', 7) }} as window_days
+    , revenue
+    , revenue_pre
+from rolled
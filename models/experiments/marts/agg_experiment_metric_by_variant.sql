@@ -1,26 +1,102 @@
 {{ config(materialized='table') }}
 
+-- Merges the daily cube; exp_results_start_date / exp_results_end_date (optional)
+-- restrict the exposure days included. Day accumulators combine with Chan's formula
+-- M2 = sum(M2_d) + sum(n_d * (mean_d - mean)^2), and the value/covariate co-moment
+-- C = sum(C_d) + sum(n_d * (mean_d - mean) * (mean_pre_d - mean_pre)), without another
+-- pass over units.
+
+with cube as (
+    select
+        experiment_id
+        , metric_id
+        , metric_type
+        , variation_id
+        , n_users
+        , sum_value
+        , m2_value
+        , sum_pre_value
+        , m2_pre_value
+        , comoment_value_pre
+    from {{ ref('agg_experiment_metric_daily') }}
+    where 1 = 1
+    {% if var('exp_results_start_date', none) %}
+      and date_day >= '{{ var("exp_results_start_date") }}'::date
+    {% endif %}
+    {% if var('exp_results_end_date', none) %}
+      and date_day <= '{{ var("exp_results_end_date") }}'::date
+    {% endif %}
+)
+
+, totals as (
+    select
+        experiment_id
+        , metric_id
+        , metric_type
+        , variation_id
+        , sum(n_users) as n_users
+        , sum(sum_value) as sum_value
+        , sum(sum_pre_value) as sum_pre_value
+    from cube
+    group by 1,2,3,4
+)
+
+, merged as (
+    select
+        t.experiment_id
+        , t.metric_id
+        , t.metric_type
+        , t.variation_id
+        , t.n_users
+        , t.sum_value
+        , t.sum_pre_value
+        , sum(
+            c.m2_value
+            + c.n_users * power(c.sum_value / c.n_users - t.sum_value / t.n_users, 2)
+        ) as m2_value
+        , sum(
+            c.m2_pre_value
+            + c.n_users * power(c.sum_pre_value / c.n_users - t.sum_pre_value / t.n_users, 2)
+        ) as m2_pre_value
+        , sum(
+            c.comoment_value_pre
+            + c.n_users
+            * (c.sum_value / c.n_users - t.sum_value / t.n_users)
+            * (c.sum_pre_value / c.n_users - t.sum_pre_value / t.n_users)
+        ) as comoment_value_pre
+    from totals t
+    inner join cube c
+        on t.experiment_id = c.experiment_id
+       and t.metric_id = c.metric_id
+       and t.variation_id = c.variation_id
+    group by 1,2,3,4,5,6,7
+)
+
 select
     experiment_id
     , metric_id
+    , metric_type
     , variation_id
 
-    , count(*) as n_users
-    , sum(case when did_convert = true then 1 else 0 end) as conversions
-    , (
-        sum(case when did_convert = true then 1 else 0 end)
-        / nullif(count(*), 0)
-    )::float as conversion_rate
-    , (
-        (
-            sum(case when did_convert = true then 1 else 0 end)
-            / nullif(count(*), 0)
-        )::float
-        * (1 - (
-            sum(case when did_convert = true then 1 else 0 end)
-            / nullif(count(*), 0)
-        )::float)
-    ) / nullif(count(*), 0) as var_p
-
-from {{ ref('int_experiment_metric_outcomes__conversion') }}
-group by 1,2,3
+    , n_users
+
+    -- binary metrics
+    , case when metric_type = 'binary' then sum_value::int end as conversions
+    , case when metric_type = 'binary' then (sum_value / nullif(n_users, 0))::float end as conversion_rate
+    , case
+        when metric_type = 'binary' then (
+            (sum_value / nullif(n_users, 0))::float
+            * (1 - (sum_value / nullif(n_users, 0))::float)
+        ) / nullif(n_users, 0)
+      end as var_p
+
+    -- all metrics: mean and sample variance of the unit-level value
+    , (sum_value / nullif(n_users, 0))::float as mean_value
+    , (m2_value / nullif(n_users - 1, 0))::float as variance_value
+
+    -- pre-exposure covariate (CUPED): mean, sample variance, sample covariance with the value
+    , (sum_pre_value / nullif(n_users, 0))::float as mean_pre_value
+    , (m2_pre_value / nullif(n_users - 1, 0))::float as variance_pre_value
+    , (comoment_value_pre / nullif(n_users - 1, 0))::float as covariance_value_pre
+
+from merged
@@ -0,0 +1,66 @@
+{{
+    config(
+        materialized='incremental',
+        unique_key=['experiment_id', 'metric_id', 'variation_id', 'date_day'],
+        incremental_strategy='merge',
+        on_schema_change='sync_all_columns'
+    )
+}}
+
+-- Daily mergeable moments per experiment x metric x variation x exposure day: count, sum
+-- and M2 (sum of squared deviations from the day's mean) of the unit-level metric value.
+-- Counts and sums add up across days; M2s combine with Chan's parallel formula
+-- (agg_experiment_metric_by_variant), so results for any date range come from cube rows
+-- instead of a scan over units.
+-- The same moments of the pre-exposure covariate (sum, M2) and the co-moment of value
+-- and covariate feed CUPED.
+-- Incremental runs rebuild the days whose outcomes can still change (see incremental_lookback.sql).
+
+with outcomes as (
+    select
+        experiment_id
+        , metric_id
+        , 'binary' as metric_type
+        , variation_id
+        , date_trunc('day', exposure_at)::date as date_day
+        , case when did_convert = true then 1 else 0 end::float as metric_value
+        , case when did_convert_pre = true then 1 else 0 end::float as pre_value
+    from {{ ref('int_experiment_metric_outcomes__conversion') }}
+    {% if is_incremental() %}
+    where date_trunc('day', exposure_at)::date
+        >= {{ incremental_lookback_start('date_day', conversion_lookback_days()) }}
+    {% endif %}
+
+    union all
+
+    select
+        experiment_id
+        , metric_id
+        , 'continuous' as metric_type
+        , variation_id
+        , date_trunc('day', exposure_at)::date as date_day
+        , revenue::float as metric_value
+        , revenue_pre::float as pre_value
+    from {{ ref('int_experiment_metric_outcomes__revenue') }}
+    {% if is_incremental() %}
+    where date_trunc('day', exposure_at)::date
+        >= {{ incremental_lookback_start('date_day', conversion_lookback_days()) }}
+    {% endif %}
+)
+
+select
+    experiment_id
+    , metric_id
+    , metric_type
+    , variation_id
+    , date_day
+    , count(*) as n_users
+    , sum(metric_value) as sum_value
+    -- n * var_pop instead of sum(x^2) - sum(x)^2 / n, which cancels for large values
+    , var_pop(metric_value) * count(*) as m2_value
+    , sum(pre_value) as sum_pre_value
+    , var_pop(pre_value) * count(*) as m2_pre_value
+    -- sum((value - mean) * (pre_value - mean_pre))
+    , covar_pop(metric_value, pre_value) * count(*) as comoment_value_pre
+from outcomes
+group by 1,2,3,4,5
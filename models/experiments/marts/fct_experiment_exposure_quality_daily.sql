@@ -1,7 +1,14 @@
-{{ config(materialized='table') }}
+{{
+    config(
+        materialized='incremental',
+        unique_key=['experiment_id', 'date_day'],
+        incremental_strategy='merge'
+    )
+}}
 
 -- Daily exposure quality metrics per experiment.
 -- TODO: add optional breakdowns by variation if needed.
+-- Incremental runs recompute whole days from the exposure window of the latest day.
 
 with v as (
     select
@@ -9,6 +16,7 @@ with v as (
         date_trunc('day', assigned_at) as date_day,
         unit_id,
         has_any_exposure,
+        has_post_assignment_exposure,
         has_valid_exposure,
         is_variant_mismatch,
         has_multiple_variations_exposed,
@@ -16,6 +24,9 @@ with v as (
         exposure_outside_window,
         exposure_delay_seconds
     from {{ ref('int_experiment_exposure_validation') }}
+    {% if is_incremental() %}
+    where date_trunc('day', assigned_at) >= {{ incremental_lookback_start('date_day', exposure_lookback_days()) }}
+    {% endif %}
 )
 
 select
@@ -1,13 +1,32 @@
-{{ config(materialized='table') }}
+{{
+    config(
+        materialized='table',
+        pre_hook=["{{ create_student_t_two_sided_p() }}", "{{ create_student_t_ppf() }}"]
+    )
+}}
+
+-- Same definitions as scripts/experiment_stats.py (the DuckDB flavour's UDFs):
+-- binary metrics: pooled z-test with an exact normal p-value, Wald 95% CI with the
+--   unpooled standard error
+-- continuous metrics: Welch t-test (Welch-Satterthwaite df) and t-based 95% CI of the
+--   mean difference, from the Chan-merged means/variances of agg_experiment_metric_by_variant
+-- CUPED (all metrics, cuped_* columns): Welch t-test of value - theta * (covariate - mean),
+--   theta pooled within arms; adjusted means/variances follow from the per-arm moments
 
 with base as (
     select
         experiment_id
         , metric_id
+        , metric_type
         , variation_id
         , n_users
         , conversions
         , conversion_rate
+        , mean_value
+        , variance_value
+        , mean_pre_value
+        , variance_pre_value
+        , covariance_value_pre
     from {{ ref('agg_experiment_metric_by_variant') }}
 )
 
@@ -18,137 +37,197 @@ with base as (
         , n_users as control_n_users
         , conversions as control_conversions
         , conversion_rate as control_conversion_rate
+        , mean_value as control_mean_value
+        , variance_value as control_variance_value
+        , mean_pre_value as control_mean_pre_value
+        , variance_pre_value as control_variance_pre_value
+        , covariance_value_pre as control_covariance_value_pre
     from base
     where variation_id = '{{ var("exp_control_variation_id", "control") }}'
 )
 
-select
-    b.experiment_id
-    , b.metric_id
-    , b.variation_id
-    , b.n_users
-    , b.conversions
-    , b.conversion_rate
-
-    , c.control_n_users
-    , c.control_conversions
-    , c.control_conversion_rate
-
-    , (b.conversion_rate - c.control_conversion_rate) as uplift_abs
-    , (b.conversion_rate / nullif(c.control_conversion_rate, 0)) - 1 as uplift_rel
-
-    -- pooled proportion z-test
-    , (
-        (b.conversions + c.control_conversions)
-        / nullif(b.n_users + c.control_n_users, 0)
-    ) as pooled_p
-    , sqrt(
-        (
-            (
-                (b.conversions + c.control_conversions)
-                / nullif(b.n_users + c.control_n_users, 0)
-            )
-            * (1 - (
-                (b.conversions + c.control_conversions)
-                / nullif(b.n_users + c.control_n_users, 0)
-            ))
-        )
-        * (1 / nullif(b.n_users, 0) + 1 / nullif(c.control_n_users, 0))
-    ) as se
-    , (b.conversion_rate - c.control_conversion_rate)
-        / nullif(
-            sqrt(
-                (
-                    (
-                        (b.conversions + c.control_conversions)
-                        / nullif(b.n_users + c.control_n_users, 0)
-                    )
-                    * (1 - (
-                        (b.conversions + c.control_conversions)
-                        / nullif(b.n_users + c.control_n_users, 0)
-                    ))
-                )
-                * (1 / nullif(b.n_users, 0) + 1 / nullif(c.control_n_users, 0))
-            ),
-            0
-        ) as z
-
-    -- two-sided p-value using normal CDF via erf
-    , 2 * (
-        1 - (
-            0.5 * (
-                1 + erf(
-                    abs(
-                        (b.conversion_rate - c.control_conversion_rate)
-                        / nullif(
-                            sqrt(
-                                (
-                                    (
-                                        (b.conversions + c.control_conversions)
-                                        / nullif(b.n_users + c.control_n_users, 0)
-                                    )
-                                    * (1 - (
-                                        (b.conversions + c.control_conversions)
-                                        / nullif(b.n_users + c.control_n_users, 0)
-                                    ))
-                                )
-                                * (1 / nullif(b.n_users, 0) + 1 / nullif(c.control_n_users, 0))
-                            ),
-                            0
-                        )
-                    ) / sqrt(2)
-                )
-            )
-        )
-    ) as p_value_two_sided
-
-    -- 95% CI using unpooled standard error
-    , sqrt(
-        (b.conversion_rate * (1 - b.conversion_rate) / nullif(b.n_users, 0))
-        + (c.control_conversion_rate * (1 - c.control_conversion_rate) / nullif(c.control_n_users, 0))
-    ) as se_unpooled
-    , (b.conversion_rate - c.control_conversion_rate)
-        - 1.96 * sqrt(
-            (b.conversion_rate * (1 - b.conversion_rate) / nullif(b.n_users, 0))
-            + (c.control_conversion_rate * (1 - c.control_conversion_rate) / nullif(c.control_n_users, 0))
-        ) as ci_low
-    , (b.conversion_rate - c.control_conversion_rate)
-        + 1.96 * sqrt(
+, joined as (
+    select
+        b.experiment_id
+        , b.metric_id
+        , b.metric_type
+        , b.variation_id
+        , b.n_users
+        , b.conversions
+        , b.conversion_rate
+        , b.mean_value
+        , b.variance_value
+        , b.mean_pre_value
+        , b.variance_pre_value
+        , b.covariance_value_pre
+
+        , c.control_n_users
+        , c.control_conversions
+        , c.control_conversion_rate
+        , c.control_mean_value
+        , c.control_variance_value
+        , c.control_mean_pre_value
+        , c.control_variance_pre_value
+        , c.control_covariance_value_pre
+
+        -- mean_value is the conversion rate for binary metrics
+        , (b.mean_value - c.control_mean_value) as uplift_abs
+        , (b.mean_value / nullif(c.control_mean_value, 0)) - 1 as uplift_rel
+
+        -- Welch per-arm squared standard errors (continuous metrics)
+        , b.variance_value / nullif(b.n_users, 0) as se2_treatment
+        , c.control_variance_value / nullif(c.control_n_users, 0) as se2_control
+
+        -- pooled proportion z-test
+        , (
+            (b.conversions + c.control_conversions)
+            / nullif(b.n_users + c.control_n_users, 0)
+        ) as pooled_p
+
+        -- unpooled standard error for the CI
+        , sqrt(
             (b.conversion_rate * (1 - b.conversion_rate) / nullif(b.n_users, 0))
             + (c.control_conversion_rate * (1 - c.control_conversion_rate) / nullif(c.control_n_users, 0))
-        ) as ci_high
-
-    , (2 * (
-        1 - (
-            0.5 * (
-                1 + erf(
-                    abs(
-                        (b.conversion_rate - c.control_conversion_rate)
-                        / nullif(
-                            sqrt(
-                                (
-                                    (
-                                        (b.conversions + c.control_conversions)
-                                        / nullif(b.n_users + c.control_n_users, 0)
-                                    )
-                                    * (1 - (
-                                        (b.conversions + c.control_conversions)
-                                        / nullif(b.n_users + c.control_n_users, 0)
-                                    ))
-                                )
-                                * (1 / nullif(b.n_users, 0) + 1 / nullif(c.control_n_users, 0))
-                            ),
-                            0
-                        )
-                    ) / sqrt(2)
-                )
-            )
-        )
-    )) < 0.05 as is_statistically_significant_95
+        ) as se_unpooled
+    from base b
+    left join control c
+        on b.experiment_id = c.experiment_id
+       and b.metric_id = c.metric_id
+)
 
-    , current_timestamp() as computed_at
+, pooled as (
+    select
+        *
+        , sqrt(
+            (pooled_p * (1 - pooled_p))
+            * (1 / nullif(n_users, 0) + 1 / nullif(control_n_users, 0))
+        ) as se
+        , sqrt(se2_treatment + se2_control) as se_welch
+        -- Welch-Satterthwaite degrees of freedom
+        , power(se2_treatment + se2_control, 2)
+            / nullif(
+                power(se2_treatment, 2) / nullif(n_users - 1, 0)
+                + power(se2_control, 2) / nullif(control_n_users - 1, 0),
+                0
+            ) as df
+    from joined
+)
+
+, scored as (
+    select
+        *
+        , case when metric_type = 'binary' then uplift_abs / nullif(se, 0) end as z
+        , case when metric_type = 'continuous' then uplift_abs / nullif(se_welch, 0) end as t_stat
+        , case
+            -- two-sided p-value using normal CDF via erf
+            when metric_type = 'binary'
+                then 2 * (1 - (0.5 * (1 + erf(abs(uplift_abs / nullif(se, 0)) / sqrt(2)))))
+            when metric_type = 'continuous'
+                then {{ target.schema }}.student_t_two_sided_p(uplift_abs / nullif(se_welch, 0), df)
+          end as p_value_two_sided
+        , case
+            -- norm.ppf(0.975), as in scripts/experiment_stats.py
+            when metric_type = 'binary' then 1.959963984540054 * se_unpooled
+            when metric_type = 'continuous' then {{ target.schema }}.student_t_ppf(0.975, df) * se_welch
+          end as ci_half_width
+    from pooled
+)
+
+, cuped_theta as (
+    select
+        *
+        -- within-arm pooled co-moments: sum of (n - 1) * cov over arms
+        , ((n_users - 1) * covariance_value_pre + (control_n_users - 1) * control_covariance_value_pre)
+            / nullif(
+                (n_users - 1) * variance_pre_value + (control_n_users - 1) * control_variance_pre_value,
+                0
+            ) as cuped_theta
+        , (n_users * mean_pre_value + control_n_users * control_mean_pre_value)
+            / nullif(n_users + control_n_users, 0) as cuped_mean_pre
+    from scored
+)
+
+, cuped_adjusted as (
+    select
+        *
+        -- moments of value - theta * (covariate - mean(covariate)) per arm
+        , mean_value - cuped_theta * (mean_pre_value - cuped_mean_pre) as cuped_mean_value
+        , control_mean_value - cuped_theta * (control_mean_pre_value - cuped_mean_pre) as cuped_control_mean_value
+        , (
+            variance_value
+            - 2 * cuped_theta * covariance_value_pre
+            + power(cuped_theta, 2) * variance_pre_value
+        ) / nullif(n_users, 0) as cuped_se2_treatment
+        , (
+            control_variance_value
+            - 2 * cuped_theta * control_covariance_value_pre
+            + power(cuped_theta, 2) * control_variance_pre_value
+        ) / nullif(control_n_users, 0) as cuped_se2_control
+    from cuped_theta
+)
+
+, cuped_pooled as (
+    select
+        *
+        , cuped_mean_value - cuped_control_mean_value as cuped_uplift_abs
+        , sqrt(cuped_se2_treatment + cuped_se2_control) as cuped_se
+        , power(cuped_se2_treatment + cuped_se2_control, 2)
+            / nullif(
+                power(cuped_se2_treatment, 2) / nullif(n_users - 1, 0)
+                + power(cuped_se2_control, 2) / nullif(control_n_users - 1, 0),
+                0
+            ) as cuped_df
+    from cuped_adjusted
+)
+
+, cuped_scored as (
+    select
+        *
+        , cuped_uplift_abs / nullif(cuped_se, 0) as cuped_t_stat
+        , {{ target.schema }}.student_t_two_sided_p(cuped_uplift_abs / nullif(cuped_se, 0), cuped_df)
+            as cuped_p_value_two_sided
+        , {{ target.schema }}.student_t_ppf(0.975, cuped_df) * cuped_se as cuped_ci_half_width
+    from cuped_pooled
+)
+
+select
+    experiment_id
+    , metric_id
+    , metric_type
+    , variation_id
+    , n_users
+    , conversions
+    , conversion_rate
+    , mean_value
+    , control_n_users
+    , control_conversions
+    , control_conversion_rate
+    , control_mean_value
+    , uplift_abs
+    , uplift_rel
+    , pooled_p
+    , se
+    , z
+    , case when metric_type = 'continuous' then se_welch end as se_welch
+    , t_stat
+    , case when metric_type = 'continuous' then df end as df
+    , p_value_two_sided
+    , se_unpooled
+    -- 95% CI of the absolute uplift
+    , uplift_abs - ci_half_width as ci_low
+    , uplift_abs + ci_half_width as ci_high
+    , p_value_two_sided < 0.05 as is_statistically_significant_95
 
-from base b
-left join control c
-    on b.experiment_id = c.experiment_id
-   and b.metric_id = c.metric_id
+    -- optional CUPED-adjusted estimate (null without covariate variance)
+    , cuped_theta
+    , cuped_uplift_abs
+    , (cuped_mean_value / nullif(cuped_control_mean_value, 0)) - 1 as cuped_uplift_rel
+    , cuped_se
+    , cuped_t_stat
+    , cuped_df
+    , cuped_p_value_two_sided
+    , cuped_uplift_abs - cuped_ci_half_width as cuped_ci_low
+    , cuped_uplift_abs + cuped_ci_half_width as cuped_ci_high
+    , 1 - power(cuped_se, 2) / nullif(se2_treatment + se2_control, 0) as cuped_variance_reduction
+    , current_timestamp() as computed_at
+from cuped_scored
@@ -0,0 +1,224 @@
+{{
+    config(
+        materialized='table',
+        pre_hook=["{{ create_student_t_two_sided_p() }}", "{{ create_student_t_ppf() }}"]
+    )
+}}
+
+-- Cumulative results per exposure day, for every metric: running sums over
+-- agg_experiment_metric_daily give each variation's totals as of every day in one pass,
+-- so the row for day d equals fct_experiment_results built with exp_results_end_date = d
+-- (without the CUPED columns). Binary metrics get the pooled z-test, continuous ones the
+-- Welch t-test; the running M2 follows from running sums of the day accumulators:
+--   M2 = sum(M2_d) + sum(sum_d^2 / n_d) - sum^2 / n
+-- Days are those with at least one exposure in the experiment.
+
+with cube as (
+    select
+        experiment_id
+        , metric_id
+        , metric_type
+        , variation_id
+        , date_day
+        , n_users
+        , sum_value
+        , m2_value
+    from {{ ref('agg_experiment_metric_daily') }}
+)
+
+, days as (
+    select distinct
+        experiment_id
+        , metric_id
+        , metric_type
+        , date_day
+    from cube
+)
+
+, variations as (
+    select distinct
+        experiment_id
+        , metric_id
+        , variation_id
+    from cube
+)
+
+, cumulative as (
+    select
+        d.experiment_id
+        , d.metric_id
+        , d.metric_type
+        , v.variation_id
+        , d.date_day
+        , sum(coalesce(c.n_users, 0)) over (
+            partition by d.experiment_id, d.metric_id, v.variation_id
+            order by d.date_day
+            rows between unbounded preceding and current row
+        ) as n_users
+        , sum(coalesce(c.sum_value, 0)) over (
+            partition by d.experiment_id, d.metric_id, v.variation_id
+            order by d.date_day
+            rows between unbounded preceding and current row
+        ) as sum_value
+        , sum(coalesce(c.m2_value, 0)) over (
+            partition by d.experiment_id, d.metric_id, v.variation_id
+            order by d.date_day
+            rows between unbounded preceding and current row
+        ) as sum_m2_value
+        , sum(coalesce(c.sum_value * c.sum_value / nullif(c.n_users, 0), 0)) over (
+            partition by d.experiment_id, d.metric_id, v.variation_id
+            order by d.date_day
+            rows between unbounded preceding and current row
+        ) as sum_day_square_value
+    from days d
+    inner join variations v
+        on d.experiment_id = v.experiment_id
+       and d.metric_id = v.metric_id
+    left join cube c
+        on d.experiment_id = c.experiment_id
+       and d.metric_id = c.metric_id
+       and v.variation_id = c.variation_id
+       and d.date_day = c.date_day
+)
+
+, base as (
+    select
+        experiment_id
+        , metric_id
+        , metric_type
+        , variation_id
+        , date_day
+        , n_users
+        , case when metric_type = 'binary' then sum_value::int end as conversions
+        , case when metric_type = 'binary' then (sum_value / nullif(n_users, 0))::float end as conversion_rate
+        , sum_value / nullif(n_users, 0) as mean_value
+        , (sum_m2_value + sum_day_square_value - sum_value * sum_value / nullif(n_users, 0))
+            / nullif(n_users - 1, 0) as variance_value
+    from cumulative
+)
+
+, control as (
+    select
+        experiment_id
+        , metric_id
+        , date_day
+        , n_users as control_n_users
+        , conversions as control_conversions
+        , conversion_rate as control_conversion_rate
+        , mean_value as control_mean_value
+        , variance_value as control_variance_value
+    from base
+    where variation_id = '{{ var("exp_control_variation_id", "control") }}'
+)
+
+, joined as (
+    select
+        b.experiment_id
+        , b.metric_id
+        , b.metric_type
+        , b.variation_id
+        , b.date_day
+        , b.n_users
+        , b.conversions
+        , b.conversion_rate
+        , b.mean_value
+
+        , c.control_n_users
+        , c.control_conversions
+        , c.control_conversion_rate
+        , c.control_mean_value
+
+        -- mean_value is the conversion rate for binary metrics
+        , (b.mean_value - c.control_mean_value) as uplift_abs
+        , (b.mean_value / nullif(c.control_mean_value, 0)) - 1 as uplift_rel
+
+        -- Welch per-arm squared standard errors (continuous metrics)
+        , b.variance_value / nullif(b.n_users, 0) as se2_treatment
+        , c.control_variance_value / nullif(c.control_n_users, 0) as se2_control
+
+        -- pooled proportion z-test
+        , (
+            (b.conversions + c.control_conversions)
+            / nullif(b.n_users + c.control_n_users, 0)
+        ) as pooled_p
+
+        -- unpooled standard error for the CI
+        , sqrt(
+            (b.conversion_rate * (1 - b.conversion_rate) / nullif(b.n_users, 0))
+            + (c.control_conversion_rate * (1 - c.control_conversion_rate) / nullif(c.control_n_users, 0))
+        ) as se_unpooled
+    from base b
+    left join control c
+        on b.experiment_id = c.experiment_id
+       and b.metric_id = c.metric_id
+       and b.date_day = c.date_day
+)
+
+, pooled as (
+    select
+        *
+        , sqrt(
+            (pooled_p * (1 - pooled_p))
+            * (1 / nullif(n_users, 0) + 1 / nullif(control_n_users, 0))
+        ) as se
+        , sqrt(se2_treatment + se2_control) as se_welch
+        -- Welch-Satterthwaite degrees of freedom
+        , power(se2_treatment + se2_control, 2)
+            / nullif(
+                power(se2_treatment, 2) / nullif(n_users - 1, 0)
+                + power(se2_control, 2) / nullif(control_n_users - 1, 0),
+                0
+            ) as df
+    from joined
+)
+
+, scored as (
+    select
+        *
+        , case when metric_type = 'binary' then uplift_abs / nullif(se, 0) end as z
+        , case when metric_type = 'continuous' then uplift_abs / nullif(se_welch, 0) end as t_stat
+        , case
+            -- two-sided p-value using normal CDF via erf
+            when metric_type = 'binary'
+                then 2 * (1 - (0.5 * (1 + erf(abs(uplift_abs / nullif(se, 0)) / sqrt(2)))))
+            when metric_type = 'continuous'
+                then {{ target.schema }}.student_t_two_sided_p(uplift_abs / nullif(se_welch, 0), df)
+          end as p_value_two_sided
+        , case
+            -- norm.ppf(0.975), as in scripts/experiment_stats.py
+            when metric_type = 'binary' then 1.959963984540054 * se_unpooled
+            when metric_type = 'continuous' then {{ target.schema }}.student_t_ppf(0.975, df) * se_welch
+          end as ci_half_width
+    from pooled
+)
+
+select
+    experiment_id
+    , metric_id
+    , metric_type
+    , variation_id
+    , date_day
+    , n_users
+    , conversions
+    , conversion_rate
+    , mean_value
+    , control_n_users
+    , control_conversions
+    , control_conversion_rate
+    , control_mean_value
+    , uplift_abs
+    , uplift_rel
+    , pooled_p
+    , se
+    , z
+    , case when metric_type = 'continuous' then se_welch end as se_welch
+    , t_stat
+    , case when metric_type = 'continuous' then df end as df
+    , p_value_two_sided
+    , se_unpooled
+    -- 95% CI of the absolute uplift
+    , uplift_abs - ci_half_width as ci_low
+    , uplift_abs + ci_half_width as ci_high
+    , p_value_two_sided < 0.05 as is_statistically_significant_95
+    , current_timestamp() as computed_at
+from scored
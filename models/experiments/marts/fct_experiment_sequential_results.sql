@@ -0,0 +1,410 @@
+{{
+    config(
+        materialized='incremental',
+        unique_key=['experiment_id', 'metric_id', 'variation_id', 'date_day'],
+        incremental_strategy='merge',
+        on_schema_change='sync_all_columns'
+    )
+}}
+
+-- Always-valid sequential results (mSPRT) per experiment x metric x treatment variation x
+-- exposure day; same definitions as msprt() in scripts/experiment_stats.py.
+-- Each row is the state after that day's look: both arms' running (n, sum, M2), the running
+-- minimum of the mSPRT p-value (always_valid_p_value) and the intersection of the per-look
+-- confidence sets (cs_low, cs_high, a confidence sequence). The recursive CTE folds one
+-- day's cube rows into the previous state with the pairwise Chan update
+--   M2 = M2_state + M2_day + n_state * n_day / n * (mean_day - mean_state)^2
+-- so incremental runs start from the last state row before the lookback and only read the
+-- cube days that can still change (see incremental_lookback.sql).
+-- Published looks are frozen: an incremental run rewrites the running (n, sum, M2) of the
+-- days in the lookback, so late outcomes reach the next looks, but a day's test statistics
+-- are computed once, when the day is first emitted, and kept afterwards. tau is fixed at
+-- the first look where it is defined, so every look tests against the same mixture.
+
+with recursive cube as (
+    select
+        experiment_id
+        , metric_id
+        , metric_type
+        , variation_id
+        , date_day
+        , n_users
+        , sum_value
+        , m2_value
+    from {{ ref('agg_experiment_metric_daily') }}
+    {% if is_incremental() %}
+    where date_day >= {{ incremental_lookback_start('date_day', conversion_lookback_days()) }}
+    {% endif %}
+)
+
+, days as (
+    select distinct
+        experiment_id
+        , metric_id
+        , metric_type
+        , date_day
+    from cube
+)
+
+, treatments as (
+    select distinct
+        experiment_id
+        , metric_id
+        , variation_id
+    from {{ ref('agg_experiment_metric_daily') }}
+    where variation_id != '{{ var("exp_control_variation_id", "control") }}'
+)
+
+, day_rows as (
+    select
+        d.experiment_id
+        , d.metric_id
+        , d.metric_type
+        , v.variation_id
+        , d.date_day
+        , row_number() over (
+            partition by d.experiment_id, d.metric_id, v.variation_id
+            order by d.date_day
+        ) as step
+        , coalesce(c.n_users, 0) as n_control_day
+        , coalesce(c.sum_value, 0)::float as sum_control_day
+        , coalesce(c.m2_value, 0)::float as m2_control_day
+        , coalesce(t.n_users, 0) as n_treatment_day
+        , coalesce(t.sum_value, 0)::float as sum_treatment_day
+        , coalesce(t.m2_value, 0)::float as m2_treatment_day
+    from days d
+    inner join treatments v
+        on d.experiment_id = v.experiment_id
+       and d.metric_id = v.metric_id
+    left join cube c
+        on d.experiment_id = c.experiment_id
+       and d.metric_id = c.metric_id
+       and d.date_day = c.date_day
+       and c.variation_id = '{{ var("exp_control_variation_id", "control") }}'
+    left join cube t
+        on d.experiment_id = t.experiment_id
+       and d.metric_id = t.metric_id
+       and d.date_day = t.date_day
+       and t.variation_id = v.variation_id
+)
+
+, base as (
+    -- running state before the first rebuilt day
+    {% if is_incremental() %}
+    select
+        experiment_id
+        , metric_id
+        , variation_id
+        , n_control
+        , sum_control
+        , m2_control
+        , n_treatment
+        , sum_treatment
+        , m2_treatment
+    from {{ this }}
+    where date_day < {{ incremental_lookback_start('date_day', conversion_lookback_days()) }}
+    qualify row_number() over (
+        partition by experiment_id, metric_id, variation_id
+        order by date_day desc
+    ) = 1
+    {% else %}
+    select
+        null::varchar as experiment_id
+        , null::varchar as metric_id
+        , null::varchar as variation_id
+        , null::number as n_control
+        , null::float as sum_control
+        , null::float as m2_control
+        , null::number as n_treatment
+        , null::float as sum_treatment
+        , null::float as m2_treatment
+    limit 0
+    {% endif %}
+)
+
+, published as (
+    -- looks already emitted: their statistics are kept as published
+    {% if is_incremental() %}
+    select
+        experiment_id
+        , metric_id
+        , variation_id
+        , date_day
+        , mean_control
+        , mean_treatment
+        , uplift_abs
+        , se
+        , tau
+        , log_likelihood_ratio
+        , p_value
+        , always_valid_p_value
+        , cs_low
+        , cs_high
+    from {{ this }}
+    where date_day >= {{ incremental_lookback_start('date_day', conversion_lookback_days()) }}
+    {% else %}
+    select
+        null::varchar as experiment_id
+        , null::varchar as metric_id
+        , null::varchar as variation_id
+        , null::date as date_day
+        , null::float as mean_control
+        , null::float as mean_treatment
+        , null::float as uplift_abs
+        , null::float as se
+        , null::float as tau
+        , null::float as log_likelihood_ratio
+        , null::float as p_value
+        , null::float as always_valid_p_value
+        , null::float as cs_low
+        , null::float as cs_high
+    limit 0
+    {% endif %}
+)
+
+, latest as (
+    -- last published look: fixed tau, running minimum and intersection so far
+    {% if is_incremental() %}
+    select
+        experiment_id
+        , metric_id
+        , variation_id
+        , tau
+        , always_valid_p_value
+        , cs_low
+        , cs_high
+    from {{ this }}
+    qualify row_number() over (
+        partition by experiment_id, metric_id, variation_id
+        order by date_day desc
+    ) = 1
+    {% else %}
+    select
+        null::varchar as experiment_id
+        , null::varchar as metric_id
+        , null::varchar as variation_id
+        , null::float as tau
+        , null::float as always_valid_p_value
+        , null::float as cs_low
+        , null::float as cs_high
+    limit 0
+    {% endif %}
+)
+
+, state as (
+    select
+        k.experiment_id
+        , k.metric_id
+        , k.variation_id
+        , 0 as step
+        , coalesce(b.n_control, 0) as n_control
+        , coalesce(b.sum_control, 0)::float as sum_control
+        , coalesce(b.m2_control, 0)::float as m2_control
+        , coalesce(b.n_treatment, 0) as n_treatment
+        , coalesce(b.sum_treatment, 0)::float as sum_treatment
+        , coalesce(b.m2_treatment, 0)::float as m2_treatment
+    from (
+        select distinct
+            experiment_id
+            , metric_id
+            , variation_id
+        from day_rows
+    ) k
+    left join base b
+        on k.experiment_id = b.experiment_id
+       and k.metric_id = b.metric_id
+       and k.variation_id = b.variation_id
+
+    union all
+
+    select
+        s.experiment_id
+        , s.metric_id
+        , s.variation_id
+        , d.step
+        , s.n_control + d.n_control_day
+        , s.sum_control + d.sum_control_day
+        , s.m2_control + d.m2_control_day
+            + case
+                when s.n_control > 0 and d.n_control_day > 0
+                    then s.n_control * d.n_control_day / (s.n_control + d.n_control_day)::float
+                        * power(d.sum_control_day / d.n_control_day - s.sum_control / s.n_control, 2)
+                else 0
+              end
+        , s.n_treatment + d.n_treatment_day
+        , s.sum_treatment + d.sum_treatment_day
+        , s.m2_treatment + d.m2_treatment_day
+            + case
+                when s.n_treatment > 0 and d.n_treatment_day > 0
+                    then s.n_treatment * d.n_treatment_day / (s.n_treatment + d.n_treatment_day)::float
+                        * power(d.sum_treatment_day / d.n_treatment_day - s.sum_treatment / s.n_treatment, 2)
+                else 0
+              end
+    from state s
+    inner join day_rows d
+        on s.experiment_id = d.experiment_id
+       and s.metric_id = d.metric_id
+       and s.variation_id = d.variation_id
+       and d.step = s.step + 1
+)
+
+, looks as (
+    select
+        s.*
+        , d.metric_type
+        , d.date_day
+        , p.date_day is not null as is_published
+    from state s
+    inner join day_rows d
+        on s.experiment_id = d.experiment_id
+       and s.metric_id = d.metric_id
+       and s.variation_id = d.variation_id
+       and s.step = d.step
+    left join published p
+        on s.experiment_id = p.experiment_id
+       and s.metric_id = p.metric_id
+       and s.variation_id = p.variation_id
+       and d.date_day = p.date_day
+)
+
+, moments as (
+    select
+        l.*
+        , l.sum_control / nullif(l.n_control, 0) as mean_control
+        , l.sum_treatment / nullif(l.n_treatment, 0) as mean_treatment
+        -- squared standard error of the mean difference
+        , l.m2_control / nullif(l.n_control - 1, 0) / nullif(l.n_control, 0)
+            + l.m2_treatment / nullif(l.n_treatment - 1, 0) / nullif(l.n_treatment, 0) as v
+        -- mixing sd of the first look where it is defined: effect size * pooled sd per unit
+        , coalesce(
+            t.tau
+            , first_value(
+                {{ var('exp_sequential_effect_size', 0.05) }}
+                * sqrt(nullif(l.m2_control + l.m2_treatment, 0) / nullif(l.n_control + l.n_treatment - 2, 0))
+            ) ignore nulls over (
+                partition by l.experiment_id, l.metric_id, l.variation_id
+                order by l.date_day
+                rows between unbounded preceding and current row
+            )
+        ) as tau
+    from looks l
+    left join latest t
+        on l.experiment_id = t.experiment_id
+       and l.metric_id = t.metric_id
+       and l.variation_id = t.variation_id
+    where not l.is_published
+)
+
+, tested as (
+    select
+        *
+        , mean_treatment - mean_control as uplift_abs
+        , case
+            when v > 0 and tau > 0
+                then 0.5 * ln(v / (v + power(tau, 2)))
+                    + power(tau, 2) * power(mean_treatment - mean_control, 2) / (2 * v * (v + power(tau, 2)))
+          end as log_likelihood_ratio
+        -- {delta : log LR(delta) < ln(1 / alpha)}
+        , case
+            when v > 0 and tau > 0
+                then sqrt(
+                    v * (v + power(tau, 2)) / power(tau, 2)
+                    * (2 * ln(1 / {{ var('exp_sequential_alpha', 0.05) }}) + ln((v + power(tau, 2)) / v))
+                )
+          end as cs_half_width
+    from moments
+)
+
+-- days emitted by earlier runs: refreshed running state, statistics as published
+select
+    l.experiment_id
+    , l.metric_id
+    , l.metric_type
+    , l.variation_id
+    , l.date_day
+
+    -- running state
+    , l.n_control
+    , l.sum_control
+    , l.m2_control
+    , l.n_treatment
+    , l.sum_treatment
+    , l.m2_treatment
+
+    , p.mean_control
+    , p.mean_treatment
+    , p.uplift_abs
+    , p.se
+    , p.tau
+    , p.log_likelihood_ratio
+    , p.p_value
+    , p.always_valid_p_value
+    , p.cs_low
+    , p.cs_high
+    , current_timestamp() as computed_at
+from looks l
+inner join published p
+    on l.experiment_id = p.experiment_id
+   and l.metric_id = p.metric_id
+   and l.variation_id = p.variation_id
+   and l.date_day = p.date_day
+
+union all
+
+-- new looks
+select
+    l.experiment_id
+    , l.metric_id
+    , l.metric_type
+    , l.variation_id
+    , l.date_day
+
+    -- running state
+    , l.n_control
+    , l.sum_control
+    , l.m2_control
+    , l.n_treatment
+    , l.sum_treatment
+    , l.m2_treatment
+
+    , l.mean_control
+    , l.mean_treatment
+    , l.uplift_abs
+    , sqrt(l.v) as se
+    , l.tau
+    , l.log_likelihood_ratio
+
+    -- valid at this look only
+    , least(1, exp(-l.log_likelihood_ratio)) as p_value
+
+    -- always valid: running minimum / intersection over looks, carried from the last published look
+    , least(
+        coalesce(t.always_valid_p_value, 1),
+        min(coalesce(least(1, exp(-l.log_likelihood_ratio)), 1)) over (
+            partition by l.experiment_id, l.metric_id, l.variation_id
+            order by l.date_day
+            rows between unbounded preceding and current row
+        )
+    ) as always_valid_p_value
+    , greatest_ignore_nulls(
+        t.cs_low,
+        max(l.uplift_abs - l.cs_half_width) over (
+            partition by l.experiment_id, l.metric_id, l.variation_id
+            order by l.date_day
+            rows between unbounded preceding and current row
+        )
+    ) as cs_low
+    , least_ignore_nulls(
+        t.cs_high,
+        min(l.uplift_abs + l.cs_half_width) over (
+            partition by l.experiment_id, l.metric_id, l.variation_id
+            order by l.date_day
+            rows between unbounded preceding and current row
+        )
+    ) as cs_high
+    , current_timestamp() as computed_at
+from tested l
+left join latest t
+    on l.experiment_id = t.experiment_id
+   and l.metric_id = t.metric_id
+   and l.variation_id = t.variation_id
@@ -8,6 +8,7 @@ with base as (
         -- precedence: unit_id -> user_id -> account_id
         , coalesce(unit_id, user_id, account_id) as unit_id
         , event_name
+        , revenue
     from {{ ref('fct_events') }}
     where event_name = '{{ var("exp_conversion_event_name", "purchase") }}'
 )
@@ -17,6 +18,7 @@ select
     , occurred_at
     , unit_id
     , event_name
+    , revenue
 from base
 where unit_id is not null
   and occurred_at is not null
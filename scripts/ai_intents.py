@@ -2,6 +2,7 @@ SQL_TEMPLATES = {
     "did_treatment_win": """
         select
             experiment_id
+          , variation_id
           , n_control
           , cr_control
           , n_treatment
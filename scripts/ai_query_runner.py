@@ -18,6 +18,7 @@ DB_PATH = "duckdb/experimentation.duckdb"
 SQL_DID_TREATMENT_WIN = """
 select
     experiment_id
+  , variation_id
   , n_control
   , cr_control
   , n_treatment
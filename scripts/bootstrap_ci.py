@@ -0,0 +1,291 @@
+"""
+Poisson bootstrap percentile CIs for experiment metrics, streamed over user-level outcomes.
+
+The normal-approximation CIs of fct_experiment_results are poor for low conversion rates and
+heavy-tailed revenue; this engine bootstraps them without resampling users in memory.
+
+- Each user gets a Poisson(1) weight per replicate b, derived from a hash of (user_id, b, seed)
+  instead of drawn: the same user has the same weights wherever it appears, replicates are
+  reproducible, and no index over users is kept.
+- The outcome tables (int_experiment_metric_outcomes__conversion / __revenue) are read once
+  as Arrow record batches. Worker processes turn each batch into B replicate sums
+  (sum of weights, sum of weight * value) per group in vectorized blocks of users.
+- The main process adds the partial sums, so memory is O(B x groups) plus one batch per
+  worker, independent of the number of users.
+
+For each (experiment, metric, variation) the replicate mean is sum(w * y) / sum(w); the
+percentile CI is its alpha/2 and 1 - alpha/2 quantiles. Treatment rows also get the CI of
+the uplift vs control from the replicate-wise difference of means (arms are bootstrapped
+with the same replicate index, independently per user).
+
+Groups come from agg_experiment_metric_by_variant; outcomes cover all assignment days.
+
+Usage:
+    python scripts/bootstrap_ci.py --db duckdb/experimentation.duckdb
+    python scripts/bootstrap_ci.py --db duckdb/experimentation.duckdb --replicates 2000 --workers 8 --output ci.csv
+"""
+
+import argparse
+import csv
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import duckdb
+import numpy as np
+import pyarrow as pa
+from scipy import stats
+
+DB_PATH = "duckdb/experimentation.duckdb"
+ALPHA = 0.05
+
+# Poisson(1) inverse CDF as uint64 thresholds on the 64-bit hash: W = #{k : bits >= CDF(k) * 2^64};
+# P(W > 20) ~ 1e-20 is below the hash's resolution
+POISSON_THRESHOLDS = np.array(
+    [min(int(c * 2.0**64), 2**64 - 1) for c in stats.poisson.cdf(np.arange(21), 1.0)], dtype=np.uint64
+)
+# weights up to this value are counted with vectorized comparisons; the rare larger ones
+# (P(W > 5) ~ 6e-4) get a binary search
+_COMPARED = 5
+
+# user-level outcome per metric id (dbt vars exp_primary_metric_id / exp_revenue_metric_id):
+# (model, value expression)
+OUTCOMES = {
+    "conversion_7d": ("int_experiment_metric_outcomes__conversion", "cast(is_converted_7d as double)"),
+    "revenue_7d": ("int_experiment_metric_outcomes__revenue", "cast(revenue_7d as double)"),
+}
+
+_GOLDEN = np.uint64(0x9E3779B97F4A7C15)
+
+
+def _splitmix64(x: np.ndarray) -> np.ndarray:
+    """SplitMix64 finalizer on a uint64 array (wrapping arithmetic)."""
+    z = x + _GOLDEN
+    z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return z ^ (z >> np.uint64(31))
+
+
+def poisson_weights(user_hash: np.ndarray, replicates: int, seed: int = 0) -> np.ndarray:
+    """Poisson(1) weights of shape (users, replicates), a pure function of (user_hash, replicate, seed)."""
+    streams = _splitmix64(np.arange(1, replicates + 1, dtype=np.uint64) * _GOLDEN + np.uint64(seed))
+    bits = _splitmix64(user_hash.astype(np.uint64)[:, None] ^ streams[None, :])
+    w = np.zeros(bits.shape, dtype=np.uint8)
+    for threshold in POISSON_THRESHOLDS[:_COMPARED]:
+        w += bits >= threshold
+    tail = bits >= POISSON_THRESHOLDS[_COMPARED]
+    w[tail] = np.searchsorted(POISSON_THRESHOLDS, bits[tail], side="right")
+    return w.astype(np.float64)
+
+
+def replicate_sums(
+    group_id: np.ndarray,
+    user_hash: np.ndarray,
+    value: np.ndarray,
+    n_groups: int,
+    replicates: int,
+    seed: int = 0,
+    block: int = 2048,
+) -> tuple[np.ndarray, np.ndarray]:
+    """Per-group replicate sums of w and w * value for one batch; returns two (n_groups, replicates) arrays."""
+    sum_w = np.zeros((n_groups, replicates))
+    sum_wy = np.zeros((n_groups, replicates))
+    for start in range(0, len(value), block):
+        g = group_id[start : start + block]
+        y = value[start : start + block]
+        w = poisson_weights(user_hash[start : start + block], replicates, seed)
+        for k in np.unique(g):
+            rows = g == k
+            sum_w[k] += w[rows].sum(axis=0)
+            sum_wy[k] += y[rows] @ w[rows]
+    return sum_w, sum_wy
+
+
+def _replicate_sums_task(args: tuple) -> tuple[np.ndarray, np.ndarray]:
+    return replicate_sums(*args)
+
+
+def _collect(future, sum_w: np.ndarray, sum_wy: np.ndarray) -> None:
+    w, wy = future.result()
+    sum_w += w
+    sum_wy += wy
+
+
+def load_groups(con: duckdb.DuckDBPyConnection) -> dict:
+    """(experiment_id, metric_id, metric_type, variation_id) per group, in group_id order, as numpy columns."""
+    return con.execute(
+        """
+        select distinct
+            experiment_id
+            , metric_id
+            , metric_type
+            , variation_id
+        from agg_experiment_metric_by_variant
+        order by 1, 2, 4
+        """
+    ).fetchnumpy()
+
+
+def outcomes_sql(metric_ids) -> str:
+    """User-level (group_id, user_hash, value) rows; joins the registered `bootstrap_groups` relation."""
+    branches = [
+        f"""
+        select
+            experiment_id
+            , '{metric_id}' as metric_id
+            , assigned_variant_id as variation_id
+            , user_id
+            , {value} as value
+        from {model}
+        """
+        for metric_id, (model, value) in OUTCOMES.items()
+        if metric_id in metric_ids
+    ]
+    return f"""
+        select
+            g.group_id
+            , hash(o.user_id) as user_hash
+            , coalesce(o.value, 0) as value
+        from ({" union all ".join(branches)}) o
+        join bootstrap_groups g
+            on o.experiment_id = g.experiment_id
+           and o.metric_id = g.metric_id
+           and o.variation_id = g.variation_id
+    """
+
+
+def bootstrap(
+    con: duckdb.DuckDBPyConnection,
+    replicates: int = 1000,
+    seed: int = 0,
+    workers: int | None = None,
+    batch_rows: int = 1_000_000,
+    block: int = 2048,
+) -> tuple[dict, np.ndarray, np.ndarray, np.ndarray, int]:
+    """Stream the outcomes once; returns (groups, n_users, point means, replicate means (groups x B), rows)."""
+    groups = load_groups(con)
+    n_groups = len(groups["experiment_id"])
+    con.register(
+        "bootstrap_groups",
+        pa.table(
+            {
+                "group_id": np.arange(n_groups, dtype=np.int32),
+                "experiment_id": groups["experiment_id"],
+                "metric_id": groups["metric_id"],
+                "variation_id": groups["variation_id"],
+            }
+        ),
+    )
+
+    n_users = np.zeros(n_groups, dtype=np.int64)
+    sum_value = np.zeros(n_groups)
+    sum_w = np.zeros((n_groups, replicates))
+    sum_wy = np.zeros((n_groups, replicates))
+    rows = 0
+
+    workers = workers or os.cpu_count() or 1
+    reader = con.execute(outcomes_sql(set(groups["metric_id"]))).to_arrow_reader(batch_rows)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = []
+        for batch in reader:
+            group_id = batch.column("group_id").to_numpy()
+            user_hash = batch.column("user_hash").to_numpy()
+            value = batch.column("value").to_numpy(zero_copy_only=False).astype(np.float64)
+
+            n_users += np.bincount(group_id, minlength=n_groups)
+            sum_value += np.bincount(group_id, weights=value, minlength=n_groups)
+            rows += len(value)
+
+            pending.append(
+                pool.submit(
+                    _replicate_sums_task, (group_id, user_hash, value, n_groups, replicates, seed, block)
+                )
+            )
+            # bounded queue: at most two batches per worker in flight
+            while len(pending) >= 2 * workers:
+                _collect(pending.pop(0), sum_w, sum_wy)
+        for future in pending:
+            _collect(future, sum_w, sum_wy)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mean = sum_value / n_users
+        replicate_mean = sum_wy / sum_w
+    return groups, n_users, mean, replicate_mean, rows
+
+
+def percentile_ci(replicate_mean: np.ndarray, control: str, groups: dict, mean: np.ndarray, alpha: float = ALPHA) -> list[dict]:
+    """Percentile CIs of each group's mean and, for treatment groups, of the uplift vs control."""
+    q = [100 * alpha / 2, 100 * (1 - alpha / 2)]
+    ci = np.nanpercentile(replicate_mean, q, axis=1)
+
+    control_index = {
+        (e, m): i
+        for i, (e, m, v) in enumerate(zip(groups["experiment_id"], groups["metric_id"], groups["variation_id"]))
+        if v == control
+    }
+
+    out = []
+    for i in range(len(mean)):
+        row = {
+            "experiment_id": groups["experiment_id"][i],
+            "metric_id": groups["metric_id"][i],
+            "variation_id": groups["variation_id"][i],
+            "mean": mean[i],
+            "ci_low": ci[0, i],
+            "ci_high": ci[1, i],
+            "uplift_abs": None,
+            "uplift_ci_low": None,
+            "uplift_ci_high": None,
+        }
+        c = control_index.get((groups["experiment_id"][i], groups["metric_id"][i]))
+        if c is not None and c != i:
+            low, high = np.nanpercentile(replicate_mean[i] - replicate_mean[c], q)
+            row.update(uplift_abs=mean[i] - mean[c], uplift_ci_low=low, uplift_ci_high=high)
+        out.append(row)
+    return out
+
+
+def parse_args() -> argparse.Namespace:
+    p = argparse.ArgumentParser()
+    p.add_argument("--db", default=DB_PATH, help=f"DuckDB file with the dbt experiment models (default: {DB_PATH})")
+    p.add_argument("--control", default="control", help="Control variation id (default: control)")
+    p.add_argument("--replicates", type=int, default=1000, help="Bootstrap replicates B (default: 1000)")
+    p.add_argument("--alpha", type=float, default=ALPHA, help=f"1 - CI level (default: {ALPHA})")
+    p.add_argument("--seed", type=int, default=0, help="Replicate stream seed (default: 0)")
+    p.add_argument("--workers", type=int, default=0, help="Worker processes (default: CPU count)")
+    p.add_argument("--batch_rows", type=int, default=1_000_000, help="Users per streamed batch (default: 1000000)")
+    p.add_argument("--block", type=int, default=2048, help="Users per vectorized weight block (default: 2048)")
+    p.add_argument("--output", help="Optional CSV path for all rows")
+    p.add_argument("--limit", type=int, default=20, help="Rows to print (default: 20)")
+    return p.parse_args()
+
+
+def main() -> None:
+    from tabulate import tabulate
+
+    args = parse_args()
+    con = duckdb.connect(args.db, read_only=True)
+    t0 = time.perf_counter()
+    groups, n_users, mean, replicate_mean, rows = bootstrap(
+        con, args.replicates, args.seed, args.workers or None, args.batch_rows, args.block
+    )
+    result = percentile_ci(replicate_mean, args.control, groups, mean, args.alpha)
+    seconds = time.perf_counter() - t0
+    con.close()
+
+    for row, n in zip(result, n_users):
+        row["n_users"] = int(n)
+
+    fields = ["experiment_id", "metric_id", "variation_id", "n_users", "mean", "ci_low", "ci_high", "uplift_abs", "uplift_ci_low", "uplift_ci_high"]
+    print(tabulate([[row[f] for f in fields] for row in result[: args.limit]], headers=fields, tablefmt="github"))
+    if args.output:
+        with open(args.output, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=fields)
+            writer.writeheader()
+            writer.writerows({f: row[f] for f in fields} for row in result)
+
+    print(f"\n✅ {rows} user outcomes x {args.replicates} replicates in {seconds:.3f}s ({len(result)} groups)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,418 @@
+"""
+Vectorized two-sample statistics for experiment results.
+
+The tests take per-variant aggregates as arrays, one element per experiment x metric x
+treatment variation (with its control's aggregates), and return every statistic in one
+NumPy/SciPy pass.
+
+proportion_ztest() (binary metrics, from users and conversions):
+- uplift_abs, uplift_rel: difference and ratio - 1 of the conversion rates
+- se, z_score, p_value_two_sided: pooled-proportion z-test; the p-value is exact
+  (2 * Phi(-|z|) via scipy.special.ndtr), not a polynomial approximation
+- se_unpooled, ci_low, ci_high: Wald interval of the absolute uplift at 1 - alpha
+
+welch_ttest() (continuous metrics, from users, mean and sample variance):
+- uplift_abs, uplift_rel: difference and ratio - 1 of the means
+- se, t_stat, df, p_value_two_sided: Welch's unequal-variance t-test with
+  Welch-Satterthwaite degrees of freedom
+- ci_low, ci_high: interval of the mean difference at 1 - alpha (Student t quantile)
+
+The means and variances come from mergeable moments: agg_experiment_metric_daily keeps
+(count, sum, M2) per day and agg_experiment_metric_by_variant combines them with Chan's
+parallel formula, so no second pass over users is needed.
+
+cuped_ttest() (CUPED, any metric, from the per-arm moments of the metric y and its
+pre-assignment covariate x: n, means, sample variances and covariance):
+- theta: Cov(y, x) / Var(x), pooled within arms
+- the Welch fields for y - theta * (x - mean(x)), whose arm means and variances follow
+  from the moments alone (no user-level join)
+- variance_reduction: 1 - se_cuped^2 / se^2, the share of the unadjusted variance removed
+
+msprt() (sequential testing, any metric, from users, mean and sample variance at one look):
+- mixture sequential probability ratio test with a N(0, tau^2) mixture over the mean
+  difference, tau = effect_size * pooled per-user standard deviation unless a fixed tau
+  is passed (fct_experiment_sequential_results fixes it at the first look, so later looks
+  test against the same mixture)
+- log_likelihood_ratio, p_value = min(1, 1 / LR) and the confidence set
+  {delta : LR(delta) < 1 / alpha} as (cs_low, cs_high); their running minimum /
+  intersection over daily looks is an always-valid p-value / confidence sequence
+  (fct_experiment_sequential_results keeps that running state)
+
+Rows with an empty arm or a zero variance get nulls instead of inf/nan.
+models/experiments/marts/fct_experiment_results.sql (Snowflake) computes the same
+definitions in SQL.
+
+register(con) exposes the tests to DuckDB as vectorized scalar functions
+
+    proportion_ztest(n_control, conv_control, n_treatment, conv_treatment)
+        -> STRUCT(uplift_abs, uplift_rel, se, z_score, p_value_two_sided, se_unpooled, ci_low, ci_high)
+    welch_ttest(n_control, mean_control, var_control, n_treatment, mean_treatment, var_treatment)
+        -> STRUCT(uplift_abs, uplift_rel, se, t_stat, df, p_value_two_sided, ci_low, ci_high)
+    cuped_ttest(n_control, mean_control, var_control, mean_pre_control, var_pre_control, cov_control,
+                n_treatment, mean_treatment, var_treatment, mean_pre_treatment, var_pre_treatment, cov_treatment)
+        -> STRUCT(theta, uplift_abs, uplift_rel, se, t_stat, df, p_value_two_sided, ci_low, ci_high,
+                  variance_reduction)
+    msprt(n_control, mean_control, var_control, n_treatment, mean_treatment, var_treatment, effect_size, alpha, tau)
+        -> STRUCT(uplift_abs, se, tau, log_likelihood_ratio, p_value, cs_low, cs_high)
+
+which DuckDB calls once per Arrow batch, not once per row. They are scalar functions
+returning a struct rather than a table function: DuckDB's Python API only registers
+scalar UDFs (create_function), and a struct keeps every statistic of a comparison in one
+call that the models use inline, next to the row's other columns. dbt registers them on
+every connection through the dbt-duckdb plugin in experiment_stats_plugin.py (the duckdb
+outputs of profiles.yml.example and dbt/profiles.yml).
+
+Usage:
+    python scripts/experiment_stats.py --db duckdb/experimentation.duckdb
+    python scripts/experiment_stats.py --synthetic 1000000
+"""
+
+import argparse
+import time
+
+import duckdb
+import numpy as np
+import pyarrow as pa
+from scipy import special
+
+DB_PATH = "duckdb/experimentation.duckdb"
+ALPHA = 0.05
+
+ZTEST_FIELDS = ["uplift_abs", "uplift_rel", "se", "z_score", "p_value_two_sided", "se_unpooled", "ci_low", "ci_high"]
+WELCH_FIELDS = ["uplift_abs", "uplift_rel", "se", "t_stat", "df", "p_value_two_sided", "ci_low", "ci_high"]
+CUPED_FIELDS = ["theta", *WELCH_FIELDS, "variance_reduction"]
+MSPRT_FIELDS = ["uplift_abs", "se", "tau", "log_likelihood_ratio", "p_value", "cs_low", "cs_high"]
+
+
+def proportion_ztest(n_control, conv_control, n_treatment, conv_treatment, alpha: float = ALPHA) -> dict:
+    """Pooled two-proportion z-test and Wald CI for arrays of aggregates; returns {field: float64 array}."""
+    n_c = np.asarray(n_control, dtype=np.float64)
+    x_c = np.asarray(conv_control, dtype=np.float64)
+    n_t = np.asarray(n_treatment, dtype=np.float64)
+    x_t = np.asarray(conv_treatment, dtype=np.float64)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        cr_c = x_c / n_c
+        cr_t = x_t / n_t
+        uplift_abs = cr_t - cr_c
+        uplift_rel = cr_t / cr_c - 1
+
+        p_pool = (x_c + x_t) / (n_c + n_t)
+        se = np.sqrt(p_pool * (1 - p_pool) * (1 / n_c + 1 / n_t))
+        z = uplift_abs / se
+        # ndtr(-|z|) is the upper tail without the cancellation of 1 - cdf(|z|)
+        p_value = 2 * special.ndtr(-np.abs(z))
+
+        se_unpooled = np.sqrt(cr_t * (1 - cr_t) / n_t + cr_c * (1 - cr_c) / n_c)
+        z_crit = special.ndtri(1 - alpha / 2)
+
+    out = {
+        "uplift_abs": uplift_abs,
+        "uplift_rel": uplift_rel,
+        "se": se,
+        "z_score": z,
+        "p_value_two_sided": p_value,
+        "se_unpooled": se_unpooled,
+        "ci_low": uplift_abs - z_crit * se_unpooled,
+        "ci_high": uplift_abs + z_crit * se_unpooled,
+    }
+    return {k: np.where(np.isfinite(v), v, np.nan) for k, v in out.items()}
+
+
+def welch_ttest(
+    n_control, mean_control, var_control, n_treatment, mean_treatment, var_treatment, alpha: float = ALPHA
+) -> dict:
+    """Welch t-test and CI of the mean difference for arrays of (n, mean, sample variance); returns {field: float64 array}."""
+    n_c = np.asarray(n_control, dtype=np.float64)
+    m_c = np.asarray(mean_control, dtype=np.float64)
+    v_c = np.asarray(var_control, dtype=np.float64)
+    n_t = np.asarray(n_treatment, dtype=np.float64)
+    m_t = np.asarray(mean_treatment, dtype=np.float64)
+    v_t = np.asarray(var_treatment, dtype=np.float64)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        uplift_abs = m_t - m_c
+        uplift_rel = m_t / m_c - 1
+
+        se2_c = v_c / n_c
+        se2_t = v_t / n_t
+        se = np.sqrt(se2_c + se2_t)
+        t = uplift_abs / se
+        df = (se2_c + se2_t) ** 2 / (se2_c**2 / (n_c - 1) + se2_t**2 / (n_t - 1))
+        p_value = 2 * special.stdtr(df, -np.abs(t))
+        t_crit = special.stdtrit(df, 1 - alpha / 2)
+
+    out = {
+        "uplift_abs": uplift_abs,
+        "uplift_rel": uplift_rel,
+        "se": se,
+        "t_stat": t,
+        "df": df,
+        "p_value_two_sided": p_value,
+        "ci_low": uplift_abs - t_crit * se,
+        "ci_high": uplift_abs + t_crit * se,
+    }
+    return {k: np.where(np.isfinite(v), v, np.nan) for k, v in out.items()}
+
+
+def cuped_ttest(
+    n_control,
+    mean_control,
+    var_control,
+    mean_pre_control,
+    var_pre_control,
+    cov_control,
+    n_treatment,
+    mean_treatment,
+    var_treatment,
+    mean_pre_treatment,
+    var_pre_treatment,
+    cov_treatment,
+    alpha: float = ALPHA,
+) -> dict:
+    """CUPED-adjusted Welch t-test from per-arm moments of the metric and its covariate; returns {field: float64 array}."""
+    n_c, m_c, v_c, mx_c, vx_c, cxy_c = (
+        np.asarray(a, dtype=np.float64)
+        for a in (n_control, mean_control, var_control, mean_pre_control, var_pre_control, cov_control)
+    )
+    n_t, m_t, v_t, mx_t, vx_t, cxy_t = (
+        np.asarray(a, dtype=np.float64)
+        for a in (n_treatment, mean_treatment, var_treatment, mean_pre_treatment, var_pre_treatment, cov_treatment)
+    )
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        # within-arm pooled co-moments: sum of (n - 1) * cov over arms
+        theta = ((n_c - 1) * cxy_c + (n_t - 1) * cxy_t) / ((n_c - 1) * vx_c + (n_t - 1) * vx_t)
+        mx = (n_c * mx_c + n_t * mx_t) / (n_c + n_t)
+
+        # moments of y - theta * (x - mean(x)) per arm
+        adj_m_c = m_c - theta * (mx_c - mx)
+        adj_m_t = m_t - theta * (mx_t - mx)
+        adj_v_c = v_c - 2 * theta * cxy_c + theta**2 * vx_c
+        adj_v_t = v_t - 2 * theta * cxy_t + theta**2 * vx_t
+
+        out = welch_ttest(n_c, adj_m_c, adj_v_c, n_t, adj_m_t, adj_v_t, alpha=alpha)
+        out["theta"] = np.where(np.isfinite(theta), theta, np.nan)
+        reduction = 1 - out["se"] ** 2 / (v_c / n_c + v_t / n_t)
+        out["variance_reduction"] = np.where(np.isfinite(reduction), reduction, np.nan)
+    return out
+
+
+def msprt(
+    n_control,
+    mean_control,
+    var_control,
+    n_treatment,
+    mean_treatment,
+    var_treatment,
+    effect_size: float = 0.05,
+    alpha: float = ALPHA,
+    tau=np.nan,
+) -> dict:
+    """Normal-mixture mSPRT of the mean difference at one look; returns {field: float64 array}.
+
+    p_value and (cs_low, cs_high) are valid at this look only: the always-valid p-value is the
+    running minimum of p_value over looks, the confidence sequence the running intersection.
+    tau (null/NaN: estimate from this look) is the mixing standard deviation.
+    """
+    n_c = np.asarray(n_control, dtype=np.float64)
+    m_c = np.asarray(mean_control, dtype=np.float64)
+    v_c = np.asarray(var_control, dtype=np.float64)
+    n_t = np.asarray(n_treatment, dtype=np.float64)
+    m_t = np.asarray(mean_treatment, dtype=np.float64)
+    v_t = np.asarray(var_treatment, dtype=np.float64)
+    effect_size = np.asarray(effect_size, dtype=np.float64)
+    alpha = np.asarray(alpha, dtype=np.float64)
+    tau = np.asarray(tau, dtype=np.float64)
+
+    with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+        uplift_abs = m_t - m_c
+        v = v_c / n_c + v_t / n_t
+        # mixing distribution N(0, tau^2) of the effect, tau = effect_size * pooled sd per user
+        tau2 = np.where(
+            np.isnan(tau), effect_size**2 * ((n_c - 1) * v_c + (n_t - 1) * v_t) / (n_c + n_t - 2), tau**2
+        )
+        log_lr = 0.5 * np.log(v / (v + tau2)) + tau2 * uplift_abs**2 / (2 * v * (v + tau2))
+        p_value = np.minimum(1.0, np.exp(-log_lr))
+        # {delta : log LR(delta) < log(1 / alpha)}
+        half_width = np.sqrt(v * (v + tau2) / tau2 * (2 * np.log(1 / alpha) + np.log((v + tau2) / v)))
+
+    out = {
+        "uplift_abs": uplift_abs,
+        "se": np.sqrt(v),
+        "tau": np.sqrt(tau2),
+        "log_likelihood_ratio": log_lr,
+        "p_value": p_value,
+        "cs_low": uplift_abs - half_width,
+        "cs_high": uplift_abs + half_width,
+    }
+    return {k: np.where(np.isfinite(val), val, np.nan) for k, val in out.items()}
+
+
+def _struct(stats: dict, fields: list[str]) -> pa.StructArray:
+    # from_pandas=True turns NaN (null inputs, empty arms) into SQL nulls
+    return pa.StructArray.from_arrays([pa.array(stats[f], from_pandas=True) for f in fields], names=fields)
+
+
+def _numpy(*columns) -> list[np.ndarray]:
+    return [c.to_numpy(zero_copy_only=False).astype(np.float64) for c in columns]
+
+
+def _proportion_ztest_arrow(n_control, conv_control, n_treatment, conv_treatment) -> pa.StructArray:
+    return _struct(proportion_ztest(*_numpy(n_control, conv_control, n_treatment, conv_treatment)), ZTEST_FIELDS)
+
+
+def _welch_ttest_arrow(n_control, mean_control, var_control, n_treatment, mean_treatment, var_treatment) -> pa.StructArray:
+    columns = _numpy(n_control, mean_control, var_control, n_treatment, mean_treatment, var_treatment)
+    return _struct(welch_ttest(*columns), WELCH_FIELDS)
+
+
+def _cuped_ttest_arrow(
+    n_control,
+    mean_control,
+    var_control,
+    mean_pre_control,
+    var_pre_control,
+    cov_control,
+    n_treatment,
+    mean_treatment,
+    var_treatment,
+    mean_pre_treatment,
+    var_pre_treatment,
+    cov_treatment,
+) -> pa.StructArray:
+    columns = _numpy(
+        n_control,
+        mean_control,
+        var_control,
+        mean_pre_control,
+        var_pre_control,
+        cov_control,
+        n_treatment,
+        mean_treatment,
+        var_treatment,
+        mean_pre_treatment,
+        var_pre_treatment,
+        cov_treatment,
+    )
+    return _struct(cuped_ttest(*columns), CUPED_FIELDS)
+
+
+def _msprt_arrow(
+    n_control, mean_control, var_control, n_treatment, mean_treatment, var_treatment, effect_size, alpha, tau
+) -> pa.StructArray:
+    columns = _numpy(
+        n_control, mean_control, var_control, n_treatment, mean_treatment, var_treatment, effect_size, alpha, tau
+    )
+    return _struct(msprt(*columns), MSPRT_FIELDS)
+
+
+# SQL name -> (Arrow UDF, struct fields)
+UDFS = {
+    "proportion_ztest": (_proportion_ztest_arrow, ZTEST_FIELDS),
+    "welch_ttest": (_welch_ttest_arrow, WELCH_FIELDS),
+    "cuped_ttest": (_cuped_ttest_arrow, CUPED_FIELDS),
+    "msprt": (_msprt_arrow, MSPRT_FIELDS),
+}
+
+
+def register(con: duckdb.DuckDBPyConnection) -> None:
+    """Create the UDFS on con (replacing earlier registrations)."""
+    double = con.type("DOUBLE")
+    for name, (udf, fields) in UDFS.items():
+        try:
+            con.remove_function(name)
+        except (duckdb.InvalidInputException, duckdb.CatalogException):
+            pass
+        con.create_function(
+            name,
+            udf,
+            [double] * udf.__code__.co_argcount,
+            con.struct_type({f: double for f in fields}),
+            type="arrow",
+            null_handling="special",
+            side_effects=False,
+        )
+
+
+def parse_args() -> argparse.Namespace:
+    p = argparse.ArgumentParser()
+    p.add_argument("--db", default=DB_PATH, help=f"DuckDB file with agg_experiment_metric_by_variant (default: {DB_PATH})")
+    p.add_argument("--control", default="control", help="Control variation id (default: control)")
+    p.add_argument("--synthetic", type=int, default=0, help="Time the engine on N random comparisons instead of --db")
+    p.add_argument("--limit", type=int, default=20, help="Rows to print (default: 20)")
+    return p.parse_args()
+
+
+def load_comparisons(con: duckdb.DuckDBPyConnection, control: str):
+    """Binary-metric treatment rows of agg_experiment_metric_by_variant joined to their control, as numpy columns."""
+    return con.execute(
+        """
+        select
+            t.experiment_id
+            , t.variation_id
+            , c.n_users as n_control
+            , c.n_converted as conv_control
+            , t.n_users as n_treatment
+            , t.n_converted as conv_treatment
+        from agg_experiment_metric_by_variant t
+        join agg_experiment_metric_by_variant c
+            on t.experiment_id = c.experiment_id
+           and t.metric_id = c.metric_id
+           and c.variation_id = ?
+        where t.variation_id != ?
+          and t.metric_type = 'binary'
+        order by 1, 2
+        """,
+        [control, control],
+    ).fetchnumpy()
+
+
+def synthetic_comparisons(n: int) -> dict:
+    rng = np.random.default_rng(7)
+    n_control = rng.integers(1_000, 1_000_000, n)
+    n_treatment = rng.integers(1_000, 1_000_000, n)
+    rate = rng.uniform(0.01, 0.2, n)
+    return {
+        "experiment_id": np.array([f"exp_{i}" for i in range(n)]),
+        "variation_id": np.full(n, "treatment"),
+        "n_control": n_control,
+        "conv_control": rng.binomial(n_control, rate),
+        "n_treatment": n_treatment,
+        "conv_treatment": rng.binomial(n_treatment, rate * rng.uniform(0.95, 1.05, n)),
+    }
+
+
+def main() -> None:
+    # CLI only; the dbt plugin imports this module without it
+    from tabulate import tabulate
+
+    args = parse_args()
+    if args.synthetic:
+        data = synthetic_comparisons(args.synthetic)
+    else:
+        con = duckdb.connect(args.db, read_only=True)
+        data = load_comparisons(con, args.control)
+        con.close()
+
+    t0 = time.perf_counter()
+    stats = proportion_ztest(data["n_control"], data["conv_control"], data["n_treatment"], data["conv_treatment"])
+    seconds = time.perf_counter() - t0
+
+    rows = [
+        [data["experiment_id"][i], data["variation_id"][i], data["n_control"][i], data["n_treatment"][i]]
+        + [stats[f][i] for f in ["uplift_abs", "uplift_rel", "z_score", "p_value_two_sided", "ci_low", "ci_high"]]
+        for i in range(min(args.limit, len(data["experiment_id"])))
+    ]
+    print(
+        tabulate(
+            rows,
+            headers=["experiment_id", "variation_id", "n_control", "n_treatment", "uplift_abs", "uplift_rel", "z_score", "p_value", "ci_low", "ci_high"],
+            tablefmt="github",
+        )
+    )
+    print(f"\n✅ {len(data['experiment_id'])} comparisons in {seconds:.3f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,17 @@
+"""
+dbt-duckdb plugin registering the experiment_stats UDFs on every dbt connection.
+
+profiles.yml (DuckDB target):
+
+    module_paths: [scripts]
+    plugins:
+      - module: experiment_stats_plugin
+"""
+
+import experiment_stats
+from dbt.adapters.duckdb.plugins import BasePlugin
+
+
+class Plugin(BasePlugin):
+    def configure_connection(self, conn):
+        experiment_stats.register(conn)
@@ -0,0 +1,70 @@
+"""
+Shared fixtures for the job tests: a small local SparkSession and the job modules.
+
+The jobs live in jobs/ as scripts with numeric prefixes, so they are imported by
+name with importlib. Spark needs a Java runtime; without one the Spark tests skip.
+"""
+
+import argparse
+import importlib
+import os
+import shutil
+import subprocess
+import sys
+
+import pytest
+
+JOBS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "jobs")
+sys.path.insert(0, JOBS_DIR)
+
+
+def load_job(name: str):
+    """Import a job module from jobs/, e.g. load_job("20_build_exposure_validation")."""
+    return importlib.import_module(name)
+
+
+@pytest.fixture(scope="session")
+def spark():
+    pytest.importorskip("pyspark")
+    if not (os.environ.get("JAVA_HOME") or shutil.which("java")):
+        pytest.skip("Spark tests need a Java runtime (JAVA_HOME or java on PATH)")
+
+    from pyspark.sql import SparkSession
+
+    session = (
+        SparkSession.builder.master("local[2]")
+        .appName("experimentation-analytics-platform-tests")
+        .config("spark.sql.shuffle.partitions", "4")
+        .config("spark.ui.enabled", "false")
+        .getOrCreate()
+    )
+    yield session
+    session.stop()
+
+
+def generate_raw(spark, root: str, dt: str, *generation_args: str) -> None:
+    """Write job 00's fact_assignment and fact_exposure for dt under root (raw layout)."""
+    generate_data = load_job("00_generate_data")
+    p = argparse.ArgumentParser()
+    p.add_argument("--dt")
+    generate_data.add_generation_args(p)
+    args = p.parse_args(["--dt", dt, *generation_args])
+
+    tables = generate_data.generate(spark, args)
+    for name in ["fact_assignment", "fact_exposure"]:
+        generate_data.write_parquet(tables[name], f"{root}/{name}/dt={dt}")
+
+
+def run_job(script: str, *job_args: str) -> None:
+    """Run a job script in its own process, as in production."""
+    subprocess.run([sys.executable, os.path.join(JOBS_DIR, script), *job_args], check=True)
+
+
+def assert_same_rows(actual, expected, name: str) -> None:
+    """Same column names and types (nullability aside) and the same multiset of rows."""
+    actual_schema = [(f.name, f.dataType) for f in actual.schema.fields]
+    expected_schema = [(f.name, f.dataType) for f in expected.schema.fields]
+    assert actual_schema == expected_schema, f"{name}: schema differs"
+    extra = actual.exceptAll(expected).count()
+    missing = expected.exceptAll(actual).count()
+    assert (extra, missing) == (0, 0), f"{name}: {extra} unexpected rows, {missing} missing rows"
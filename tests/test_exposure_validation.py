@@ -0,0 +1,107 @@
+"""Job 20: the single_pass path matches the legacy windows on duplicate and tied exposures."""
+
+import argparse
+from datetime import datetime
+
+import pytest
+from conftest import assert_same_rows, load_job
+
+validation_job = load_job("20_build_exposure_validation")
+
+DT = "2026-02-01"
+
+ASSIGNMENTS = [
+    # experiment_id, user_id, variant_id, assignment_time_utc
+    ("exp_a", "u1", "control", datetime(2026, 2, 1, 9, 0)),
+    ("exp_a", "u2", "treatment", datetime(2026, 2, 1, 9, 0)),
+    ("exp_a", "u3", "control", datetime(2026, 2, 1, 10, 0)),
+    ("exp_a", "u4", "treatment", datetime(2026, 2, 1, 11, 0)),
+    ("exp_a", "u5", "control", datetime(2026, 2, 1, 12, 0)),
+    ("exp_b", "u1", "treatment", datetime(2026, 2, 1, 9, 30)),
+    ("exp_b", "u6", "control", datetime(2026, 2, 1, 13, 0)),
+]
+
+EXPOSURES = [
+    # experiment_id, user_id, variant_id, exposure_time_utc, exposure_event_type
+    # u1/exp_a: exact duplicate rows (same event id)
+    ("exp_a", "u1", "control", datetime(2026, 2, 1, 9, 5), "feature_rendered"),
+    ("exp_a", "u1", "control", datetime(2026, 2, 1, 9, 5), "feature_rendered"),
+    ("exp_a", "u1", "control", datetime(2026, 2, 1, 9, 40), "feature_rendered"),
+    # u2: tied first exposure time, different event types -> tie broken on event id
+    ("exp_a", "u2", "treatment", datetime(2026, 2, 1, 9, 10), "feature_rendered"),
+    ("exp_a", "u2", "treatment", datetime(2026, 2, 1, 9, 10), "page_view"),
+    # u3: two variations, tied on time across variants
+    ("exp_a", "u3", "control", datetime(2026, 2, 1, 10, 15), "feature_rendered"),
+    ("exp_a", "u3", "treatment", datetime(2026, 2, 1, 10, 15), "feature_rendered"),
+    ("exp_a", "u3", "treatment", datetime(2026, 2, 1, 10, 20), "feature_rendered"),
+    # u4: pre-assignment exposure and a later one
+    ("exp_a", "u4", "treatment", datetime(2026, 2, 1, 10, 0), "feature_rendered"),
+    ("exp_a", "u4", "treatment", datetime(2026, 2, 1, 11, 30), "feature_rendered"),
+    # u5: no exposure; exp_b/u1: variant mismatch, duplicated
+    ("exp_b", "u1", "control", datetime(2026, 2, 1, 9, 45), "feature_rendered"),
+    ("exp_b", "u1", "control", datetime(2026, 2, 1, 9, 45), "feature_rendered"),
+    # exp_b/u6: outside the window; rows with null keys are staged out
+    ("exp_b", "u6", "control", datetime(2026, 2, 10, 13, 0), "feature_rendered"),
+    ("exp_b", None, "control", datetime(2026, 2, 1, 13, 5), "feature_rendered"),
+    # exposure without an assignment: deduped, never joined
+    ("exp_b", "u9", "control", datetime(2026, 2, 1, 14, 0), "feature_rendered"),
+]
+
+
+def make_args(mode: str, event_id: str = "sha2") -> argparse.Namespace:
+    return argparse.Namespace(
+        mode=mode,
+        max_days_after_assignment=7,
+        pre_assignment_grace_minutes=5,
+        exposure_event_id=event_id,
+        event_id_audit_rate=1.0,
+        check_equivalence=False,
+        key_dictionary=None,
+    )
+
+
+@pytest.fixture(scope="module")
+def inputs(spark):
+    assignments = spark.createDataFrame(
+        [row + (DT,) for row in ASSIGNMENTS],
+        "experiment_id string, user_id string, variant_id string, assignment_time_utc timestamp, dt string",
+    )
+    exposures = spark.createDataFrame(
+        [row + (DT,) for row in EXPOSURES],
+        "experiment_id string, user_id string, variant_id string, exposure_time_utc timestamp, "
+        "exposure_event_type string, dt string",
+    )
+    return assignments, exposures
+
+
+@pytest.mark.parametrize("event_id", ["sha2", "xxhash64"])
+@pytest.mark.parametrize("skew_path", [False, True])
+def test_single_pass_matches_legacy(inputs, event_id, skew_path):
+    assignments, exposures = inputs
+    legacy_deduped, legacy_validation = validation_job.build_validation(
+        assignments, exposures, make_args("legacy", event_id)
+    )
+    deduped, validation = validation_job.build_validation(
+        assignments, exposures, make_args("single_pass", event_id), skew_path
+    )
+
+    assert_same_rows(deduped, legacy_deduped, "int_experiment_exposures_deduped")
+    assert_same_rows(validation, legacy_validation, "int_experiment_exposure_validation")
+
+
+def test_validation_statuses(inputs):
+    assignments, exposures = inputs
+    deduped, validation = validation_job.build_validation(assignments, exposures, make_args("single_pass"))
+
+    status = {(r["experiment_id"], r["user_id"]): r["validation_status"] for r in validation.collect()}
+    assert status == {
+        ("exp_a", "u1"): "valid",
+        ("exp_a", "u2"): "valid",
+        ("exp_a", "u3"): "multi_variation_exposure",
+        ("exp_a", "u4"): "pre_assignment_exposure",
+        ("exp_a", "u5"): "no_exposure",
+        ("exp_b", "u1"): "variant_mismatch",
+        ("exp_b", "u6"): "exposure_outside_window",
+    }
+    # one row per (experiment, user, variant) exposed, null keys dropped
+    assert deduped.count() == 8
@@ -0,0 +1,110 @@
+"""
+Job 10 --incremental: one canonical row per key across days, and key index compaction.
+
+Job 20 runs daily and with --rolling (the one-day window leaves 2026-02-01 outside it on
+2026-02-03, so both ways of dropping a superseded key are covered).
+"""
+
+import os
+from datetime import datetime
+
+import pytest
+from conftest import run_job
+
+DAYS = ["2026-02-01", "2026-02-02", "2026-02-03"]
+
+ASSIGNMENTS = {
+    # experiment_id, user_id, variant_id, assignment_time_utc
+    "2026-02-01": [
+        ("exp_a", "u1", "control", datetime(2026, 2, 1, 10, 0)),
+        ("exp_a", "u2", "treatment", datetime(2026, 2, 1, 11, 0)),
+    ],
+    "2026-02-02": [
+        # u1 again, later: unchanged; u3 new
+        ("exp_a", "u1", "treatment", datetime(2026, 2, 2, 9, 0)),
+        ("exp_a", "u3", "control", datetime(2026, 2, 2, 9, 0)),
+    ],
+    "2026-02-03": [
+        # a late-arriving assignment of u1 earlier than the one indexed on 2026-02-01
+        ("exp_a", "u1", "treatment", datetime(2026, 1, 31, 23, 0)),
+    ],
+}
+
+EXPOSURES = {
+    # experiment_id, user_id, variant_id, exposure_time_utc, exposure_event_type
+    "2026-02-01": [
+        ("exp_a", "u1", "control", datetime(2026, 2, 1, 10, 5), "feature_rendered"),
+        ("exp_a", "u2", "treatment", datetime(2026, 2, 1, 11, 5), "feature_rendered"),
+    ],
+    "2026-02-02": [("exp_a", "u3", "control", datetime(2026, 2, 2, 9, 5), "feature_rendered")],
+    "2026-02-03": [("exp_a", "u1", "treatment", datetime(2026, 2, 3, 8, 0), "feature_rendered")],
+}
+
+
+@pytest.fixture(
+    scope="module", params=[[], ["--rolling", "--max_days_after_assignment", "1"]], ids=["daily", "rolling"]
+)
+def outputs(spark, tmp_path_factory, request):
+    work = str(tmp_path_factory.mktemp("incremental"))
+    for dt in DAYS:
+        spark.createDataFrame(
+            [row + ("app", dt) for row in ASSIGNMENTS[dt]],
+            "experiment_id string, user_id string, variant_id string, assignment_time_utc timestamp, "
+            "assignment_source string, dt string",
+        ).write.parquet(f"{work}/raw/fact_assignment/dt={dt}")
+        spark.createDataFrame(
+            [row + (dt,) for row in EXPOSURES[dt]],
+            "experiment_id string, user_id string, variant_id string, exposure_time_utc timestamp, "
+            "exposure_event_type string, dt string",
+        ).write.parquet(f"{work}/raw/fact_exposure/dt={dt}")
+
+    for dt in DAYS:
+        common = ["--dt", dt, "--in", f"{work}/raw", "--no_run_metrics"]
+        run_job("10_build_assignments.py", *common, "--out", f"{work}/silver", "--incremental", "--compact_after", "2")
+        run_job(
+            "20_build_exposure_validation.py",
+            *common,
+            "--silver",
+            f"{work}/silver",
+            "--gold",
+            f"{work}/gold",
+            *request.param,
+        )
+    return work
+
+
+def rows_by_key(spark, path):
+    return {(r["experiment_id"], r["user_id"]): r for r in spark.read.parquet(path).collect()}
+
+
+def test_one_canonical_row_per_key(spark, outputs):
+    canonical = spark.read.parquet(f"{outputs}/silver/fact_assignment_canonical")
+    assert canonical.count() == canonical.select("experiment_id", "user_id").distinct().count() == 3
+
+    u1 = canonical.filter("user_id = 'u1'").collect()[0]
+    assert (str(u1["dt"]), u1["variant_id"]) == ("2026-02-03", "treatment")
+
+
+def test_superseded_key_leaves_validation_and_gold(spark, outputs):
+    validation = spark.read.parquet(f"{outputs}/silver/int_experiment_exposure_validation")
+    assert validation.count() == validation.select("experiment_id", "user_id").distinct().count()
+    assert {r["user_id"] for r in validation.filter("dt = '2026-02-01'").collect()} == {"u2"}
+
+    quality = spark.read.parquet(f"{outputs}/gold/fct_experiment_quality_metrics_daily/dt=2026-02-01")
+    assert sum(r["assigned_units"] for r in quality.collect()) == 1
+
+
+def test_index_compaction(spark, outputs):
+    index = f"{outputs}/silver/_state/assignment_key_index"
+    # two deltas (2026-02-01, 2026-02-02) trigger the snapshot; 2026-02-03 is pending
+    assert sorted(os.listdir(f"{index}/_compacted")) == ["dt=2026-02-02"]
+
+    snapshot = rows_by_key(spark, f"{index}/_compacted/dt=2026-02-02")
+    assert {k: r["canonical_dt"] for k, r in snapshot.items()} == {
+        ("exp_a", "u1"): "2026-02-01",
+        ("exp_a", "u2"): "2026-02-01",
+        ("exp_a", "u3"): "2026-02-02",
+    }
+
+    delta = rows_by_key(spark, f"{index}/dt=2026-02-03")
+    assert {k: r["superseded_dt"] for k, r in delta.items()} == {("exp_a", "u1"): "2026-02-01"}
@@ -0,0 +1,115 @@
+"""
+key_dictionary.py: keys stay stable across re-runs, and job 20 on encoded tables writes the
+same string-id silver and gold tables as a run on the raw tables (event id values aside).
+"""
+
+from datetime import datetime
+
+import pytest
+from conftest import assert_same_rows, generate_raw, run_job
+
+DT = "2026-02-01"
+
+OUTPUT_TABLES = [
+    ("silver", "int_experiment_exposures_deduped"),
+    ("silver", "int_experiment_exposure_validation"),
+    ("gold", "fct_experiment_quality_metrics_daily"),
+]
+
+IGNORED_COLUMNS = {"generated_at_utc"}
+EVENT_ID_COLUMNS = {"exposure_event_id", "first_exposure_event_id"}
+
+# run name -> (raw root under the work dir, extra job 20 args)
+RUNS = {
+    "raw": ("raw", []),
+    "encoded": ("raw_encoded", ["--key_dictionary", "{work}/key_dictionary"]),
+    "encoded_xxhash64": (
+        "raw_encoded",
+        ["--key_dictionary", "{work}/key_dictionary", "--exposure_event_id", "xxhash64"],
+    ),
+}
+
+
+def write_raw_day(spark, root: str, dt: str, users: list[str]) -> None:
+    spark.createDataFrame(
+        [("exp_a", u, "control", datetime(2026, 2, 1, 10, 0), "app", dt) for u in users],
+        "experiment_id string, user_id string, variant_id string, assignment_time_utc timestamp, "
+        "assignment_source string, dt string",
+    ).write.mode("overwrite").parquet(f"{root}/fact_assignment/dt={dt}")
+    spark.createDataFrame(
+        [("exp_a", u, "control", datetime(2026, 2, 1, 10, 5), "feature_rendered", dt) for u in users],
+        "experiment_id string, user_id string, variant_id string, exposure_time_utc timestamp, "
+        "exposure_event_type string, dt string",
+    ).write.mode("overwrite").parquet(f"{root}/fact_exposure/dt={dt}")
+
+
+def user_keys(spark, root: str) -> dict:
+    return {r["id"]: r["key"] for r in spark.read.parquet(f"{root}/user").collect()}
+
+
+def test_rerun_of_an_earlier_day_keeps_keys(spark, tmp_path):
+    raw, dictionary = f"{tmp_path}/raw", f"{tmp_path}/key_dictionary"
+    common = ["--in", raw, "--out", f"{tmp_path}/raw_encoded", "--dictionary", dictionary]
+    write_raw_day(spark, raw, "2026-02-01", ["u1", "u2"])
+    write_raw_day(spark, raw, "2026-02-02", ["u2", "u3"])
+    run_job("key_dictionary.py", "--dt", "2026-02-01", *common)
+    run_job("key_dictionary.py", "--dt", "2026-02-02", *common)
+    before = user_keys(spark, dictionary)
+
+    # 2026-02-01 re-run with a late user: existing keys stay, u4 gets a key after u3's
+    write_raw_day(spark, raw, "2026-02-01", ["u1", "u2", "u4"])
+    run_job("key_dictionary.py", "--dt", "2026-02-01", *common)
+    after = user_keys(spark, dictionary)
+
+    assert spark.read.parquet(f"{dictionary}/user").count() == 4
+    assert {u: after[u] for u in before} == before
+    assert after["u4"] > max(before.values())
+
+
+@pytest.fixture(scope="module")
+def outputs(spark, tmp_path_factory):
+    """One generated day through jobs 10 and 20 on raw and on encoded tables."""
+    work = str(tmp_path_factory.mktemp("key_dictionary"))
+    generate_raw(spark, f"{work}/raw", DT, "--users", "2000", "--profile", "retries")
+    run_job(
+        "key_dictionary.py",
+        "--dt",
+        DT,
+        "--in",
+        f"{work}/raw",
+        "--out",
+        f"{work}/raw_encoded",
+        "--dictionary",
+        f"{work}/key_dictionary",
+    )
+
+    for name, (raw, extra_args) in RUNS.items():
+        common = ["--dt", DT, "--in", f"{work}/{raw}", "--no_run_metrics"]
+        silver, gold = f"{work}/{name}/silver", f"{work}/{name}/gold"
+        run_job("10_build_assignments.py", *common, "--out", silver)
+        run_job(
+            "20_build_exposure_validation.py",
+            *common,
+            "--silver",
+            silver,
+            "--gold",
+            gold,
+            *[a.format(work=work) for a in extra_args],
+        )
+    return work
+
+
+@pytest.mark.parametrize("run", ["encoded", "encoded_xxhash64"])
+@pytest.mark.parametrize("layer,table", OUTPUT_TABLES)
+def test_encoded_run_writes_string_ids(spark, outputs, run, layer, table):
+    frames = {}
+    for name in ["raw", run]:
+        df = spark.read.parquet(f"{outputs}/{name}/{layer}/{table}/dt={DT}")
+        frames[name] = df.drop(*[c for c in df.columns if c in IGNORED_COLUMNS])
+
+    # same string columns; event ids hash the encoded keys, so their values differ
+    assert frames[run].schema == frames["raw"].schema
+    frames = {name: df.drop(*[c for c in df.columns if c in EVENT_ID_COLUMNS]) for name, df in frames.items()}
+
+    assert frames["raw"].count() > 0
+    assert_same_rows(frames[run], frames["raw"], table)
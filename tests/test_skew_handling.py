@@ -0,0 +1,57 @@
+"""Job 20: the skew path writes the same outputs as the normal path on hot-key data."""
+
+import pytest
+from conftest import generate_raw, run_job
+
+DT = "2026-02-01"
+
+OUTPUT_TABLES = [
+    ("silver", "int_experiment_exposures_deduped"),
+    ("silver", "int_experiment_exposure_validation"),
+    ("gold", "fct_experiment_quality_metrics_daily"),
+]
+
+IGNORED_COLUMNS = {"generated_at_utc"}
+
+# off: normal path; on: forced skew path; auto with no input floor: detection must find
+# the generator's hot keys at the default threshold and take the skew path on its own
+SKEW_RUNS = {
+    "off": ["--skew_handling", "off"],
+    "on": ["--skew_handling", "on"],
+    "auto": ["--skew_handling", "auto", "--skew_min_input_mb", "0"],
+}
+
+
+@pytest.fixture(scope="module")
+def outputs(spark, tmp_path_factory):
+    """One hot_keys day (users u_0..u_9 re-send every exposure 50,000 times), three skew settings."""
+    work = tmp_path_factory.mktemp("skew_handling")
+    raw = f"{work}/raw"
+    generate_raw(spark, raw, DT, "--users", "2000", "--profile", "hot_keys")
+
+    for name, skew_args in SKEW_RUNS.items():
+        common = ["--dt", DT, "--in", raw, "--no_run_metrics"]
+        silver, gold = f"{work}/{name}/silver", f"{work}/{name}/gold"
+        run_job("10_build_assignments.py", *common, "--out", silver)
+        run_job("20_build_exposure_validation.py", *common, "--silver", silver, "--gold", gold, *skew_args)
+    return str(work)
+
+
+def test_generator_makes_hot_keys(spark, outputs):
+    skew = spark.read.parquet(f"{outputs}/auto/silver/metrics_exposure_skew/dt={DT}").collect()[0]
+    assert skew["hot_keys"] > 0
+    assert skew["skew_path"]
+
+
+@pytest.mark.parametrize("skew_run", ["on", "auto"])
+@pytest.mark.parametrize("layer,table", OUTPUT_TABLES)
+def test_skew_path_matches_normal_path(spark, outputs, skew_run, layer, table):
+    frames = {}
+    for name in ["off", skew_run]:
+        df = spark.read.parquet(f"{outputs}/{name}/{layer}/{table}/dt={DT}")
+        frames[name] = df.drop(*[c for c in df.columns if c in IGNORED_COLUMNS])
+
+    assert frames["off"].schema == frames[skew_run].schema
+    assert frames["off"].count() > 0
+    assert frames["off"].exceptAll(frames[skew_run]).count() == 0
+    assert frames[skew_run].exceptAll(frames["off"]).count() == 0